@@ -0,0 +1,171 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from day_assignment import BalancedDayPlanner
+from distance_engine import DISTANCE_MODES
+from ingestion import read_table
+from route_optimizer import RouteOptimizer
+from schedule_export import EXPORT_FORMATS, write_journey_documents, write_schedule
+from scheduling import (DEFAULT_OFFICE_COORD, default_limit, generate_compact_schedule, prepare_outlets,
+                        salesman_totals, unassigned_outlets)
+
+# Headless batch scheduling: every outlet file of a directory is scheduled for its distributor office
+# and the journey plans are written without a Streamlit session, e.g. for the overnight regeneration
+#
+#   python batch_schedule.py outlets/ plans/ --config distributors.json --format parquet xlsx --jobs 4
+#
+# distributors.json maps distributors (by outlet file name without extension) to their office, and can
+# override the daily limit, the distance mode, the route optimiser, the working day of the balanced day
+# planner (working_hours) and the docxtpl journey-plan template (journey_template); "default" applies to
+# every other file:
+#   {"default": {"office": [-6.558031, 106.691809]},
+#    "distributors": {"rms_bekasi": {"office": [-6.558031, 106.691809], "limit": 25, "optimize": true,
+#                                    "working_hours": 8, "journey_template": "templates/journey_plan.docx"}}}
+
+OUTLET_FILE_PATTERNS = ('*.csv', '*.xlsx')
+
+
+# Function to read the distributor config, a missing file means every distributor uses the default office
+def load_config(path):
+    if path is None:
+        return {'default': {}, 'distributors': {}}
+    with open(path) as f:
+        config = json.load(f)
+    config.setdefault('default', {})
+    config.setdefault('distributors', {})
+    return config
+
+
+# Function to build one job per outlet file in input_dir with the settings of its distributor
+def build_jobs(input_dir, output_dir, config, formats, distance_mode='geodesic', optimize=False, only=None,
+               working_hours=None, journey_template=None):
+    files = sorted(path for pattern in OUTLET_FILE_PATTERNS for path in glob.glob(os.path.join(input_dir, pattern)))
+    jobs = []
+    for path in files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if only and name not in only:
+            continue
+        settings = dict(config['default'])
+        settings.update(config['distributors'].get(name, {}))
+        jobs.append({
+            'name': name,
+            'path': path,
+            'output_dir': os.path.join(output_dir, name),
+            'office': tuple(settings.get('office', DEFAULT_OFFICE_COORD)),
+            'limit': settings.get('limit'),
+            'distance_mode': settings.get('distance_mode', distance_mode),
+            'optimize': settings.get('optimize', optimize),
+            'working_hours': settings.get('working_hours', working_hours),
+            'journey_template': settings.get('journey_template', journey_template),
+            'formats': formats,
+        })
+    return jobs
+
+
+# Function to write a journey plan (CompactSchedule) in the requested formats, streamed chunk by chunk
+def export_plan(schedule, output_dir, formats, stem='journey_plan'):
+    os.makedirs(output_dir, exist_ok=True)
+    return [write_schedule(schedule, os.path.join(output_dir, f"{stem}.{export_format}"), export_format)
+            for export_format in formats]
+
+
+# Function to schedule one distributor and write its plan, per-salesman km totals, the outlets that could not
+# be scheduled and, with a template, one journey-plan document per salesman; runs in the worker processes
+# Returns a summary row; failures are reported in the row instead of stopping the other distributors
+def run_job(job):
+    start = time.perf_counter()
+    summary = {'Distributor': job['name'], 'File': job['path'], 'Status': 'ok', 'Error': '',
+               'Outlets': 0, 'Salesmen': 0, 'Km': 0.0, 'Unassigned': 0, 'Seconds': 0.0}
+    try:
+        with open(job['path'], 'rb') as f:
+            df = read_table(f.read(), os.path.basename(job['path']), source=os.path.abspath(job['path']))
+        optimizer = RouteOptimizer() if job['optimize'] else None
+        planner = BalancedDayPlanner(day_minutes=job['working_hours'] * 60) if job.get('working_hours') else None
+        # Without an explicit limit the balanced planner is bounded by the working day only
+        limit = job['limit'] or (len(df) if planner is not None else default_limit(df))
+        df = prepare_outlets(df)
+        schedule = generate_compact_schedule(df, job['office'], limit, distance_mode=job['distance_mode'], optimizer=optimizer,
+                                             planner=planner)
+        del df
+
+        export_plan(schedule, job['output_dir'], job['formats'])
+        if job.get('journey_template'):
+            write_journey_documents(schedule, job['journey_template'], os.path.join(job['output_dir'], 'journey_plans'))
+        totals = salesman_totals(schedule)
+        totals.to_csv(os.path.join(job['output_dir'], 'salesman_km.csv'), index=False)
+        unassigned = unassigned_outlets(schedule)
+        unassigned.to_csv(os.path.join(job['output_dir'], 'unassigned_outlets.csv'), index=False)
+        summary.update({'Outlets': len(schedule), 'Salesmen': len(totals), 'Km': float(totals['Km'].sum()),
+                        'Unassigned': len(unassigned)})
+    except Exception as error:
+        summary.update({'Status': 'failed', 'Error': f"{type(error).__name__}: {error}"})
+    summary['Seconds'] = time.perf_counter() - start
+    return summary
+
+
+# Function to run every job, in parallel worker processes when jobs > 1, and collect the summaries in job order
+def run_jobs(jobs, workers=1):
+    if workers <= 1 or len(jobs) <= 1:
+        summaries = []
+        for job in jobs:
+            summaries.append(run_job(job))
+            _print_summary(summaries[-1])
+        return summaries
+
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(run_job, job): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            summaries[futures[future]] = future.result()
+            _print_summary(summaries[futures[future]])
+    return [summaries[index] for index in range(len(jobs))]
+
+
+def _print_summary(summary):
+    if summary['Status'] == 'ok':
+        print(f"{summary['Distributor']}: {summary['Outlets']} visits, {summary['Salesmen']} salesmen, "
+              f"{summary['Km']:.1f} km, {summary['Unassigned']} unassigned in {summary['Seconds']:.1f} s", flush=True)
+    else:
+        print(f"{summary['Distributor']}: FAILED {summary['Error']}", file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the salesman journey plans of every distributor without Streamlit.")
+    parser.add_argument('input_dir', help="directory with one outlet file (CSV or Excel) per distributor")
+    parser.add_argument('output_dir', help="directory the plans are written to, one sub-directory per distributor")
+    parser.add_argument('--config', help="distributor config (JSON) with the office of each distributor")
+    parser.add_argument('--format', nargs='+', default=['parquet', 'csv'], choices=EXPORT_FORMATS, dest='formats')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="distributors scheduled in parallel")
+    parser.add_argument('--distance-mode', default='geodesic', choices=DISTANCE_MODES)
+    parser.add_argument('--optimize', action='store_true', help="use the route optimiser instead of the greedy plan")
+    parser.add_argument('--working-hours', type=float, help="balance the days within this working day (balanced day planner)")
+    parser.add_argument('--journey-template', help="docxtpl .docx template rendered into one journey plan per salesman")
+    parser.add_argument('--only', nargs='+', help="only schedule these distributors")
+    args = parser.parse_args(argv)
+
+    jobs = build_jobs(args.input_dir, args.output_dir, load_config(args.config), args.formats,
+                      distance_mode=args.distance_mode, optimize=args.optimize, only=args.only,
+                      working_hours=args.working_hours, journey_template=args.journey_template)
+    if not jobs:
+        print(f"No outlet files found in {args.input_dir}", file=sys.stderr)
+        return 1
+
+    summaries = run_jobs(jobs, workers=min(args.jobs, len(jobs)))
+    os.makedirs(args.output_dir, exist_ok=True)
+    pd.DataFrame(summaries).to_csv(os.path.join(args.output_dir, 'summary.csv'), index=False)
+    failed = sum(summary['Status'] != 'ok' for summary in summaries)
+    print(f"{len(summaries) - failed} of {len(summaries)} distributors scheduled, summary in "
+          f"{os.path.join(args.output_dir, 'summary.csv')}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import argparse
+import json
+import math
+import platform
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import folium
+import numpy as np
+import pandas as pd
+from polyline import encode
+
+from clustering import fit_clusters
+from day_assignment import FREQUENCY_COLUMN, BalancedDayPlanner
+from distance_engine import DISTANCE_MODES, haversine_matrix, salesman_distance_matrices
+from ingestion import read_table
+from map_layers import add_fast_markers, add_grouped_lines
+from route_cache import RouteCache
+from route_optimizer import RouteOptimizer
+from routing_client import OSRMClient, set_routing_client
+from schedule_maps import generate_folium_map
+from scheduling import DEFAULT_OFFICE_COORD, generate_scheduling, unassigned_outlets
+
+# Benchmark suite of the scheduling pipeline on seeded synthetic outlets, runs offline against a stubbed OSRM
+#
+#   python benchmark.py --sizes 1000 10000 100000 --salesmen 40 --output benchmark_results.json
+#
+# Every stage (ingest, distance, scheduling, clustering, map serialisation) is timed at every scale with its
+# peak traced memory; scheduling also records the route quality (total km). Results are written as JSON
+
+# Jabodetabek bounding box (lat, lon)
+JABODETABEK_BOUNDS = ((-6.75, 106.45), (-6.05, 107.25))
+TERRITORY_SPREAD = 0.05  # Standard deviation (degrees) of the outlets around a salesman's territory centre
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+
+
+# Function to generate n seeded synthetic outlets for `salesmen` salesmen visiting on `days` days
+# Each salesman gets a territory centre inside the Jabodetabek box and outlets normally spread around it
+def synthetic_outlets(n, salesmen=20, days=DAYS, seed=0):
+    rng = np.random.default_rng(seed)
+    (min_lat, min_lon), (max_lat, max_lon) = JABODETABEK_BOUNDS
+    centres = np.column_stack([rng.uniform(min_lat, max_lat, salesmen), rng.uniform(min_lon, max_lon, salesmen)])
+    owner = rng.integers(0, salesmen, n)
+    coords = centres[owner] + rng.normal(0, TERRITORY_SPREAD, (n, 2))
+    coords[:, 0] = coords[:, 0].clip(min_lat, max_lat)
+    coords[:, 1] = coords[:, 1].clip(min_lon, max_lon)
+    return pd.DataFrame({
+        'NAMA SALESMAN': [f"SALESMAN {index:03d}" for index in owner],
+        'NAMA TOKO': [f"TOKO {index:06d}" for index in range(n)],
+        'DAY': [days[index % len(days)] for index in range(n)],
+        'Latitude': coords[:, 0].round(6),
+        'Longitude': coords[:, 1].round(6),
+    })
+
+
+# OSRM stub: straight-line routes and tables with road distance = 1.3 x haversine
+class StubOSRMHandler(BaseHTTPRequestHandler):
+    ROAD_FACTOR = 1.3
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        params = parse_qs(query)
+        parts = path.split('/')
+        points = [(float(lat), float(lon)) for lon, lat in (pair.split(',') for pair in parts[-1].split(';'))]
+        distances = haversine_matrix(points, points) * 1000 * self.ROAD_FACTOR
+
+        if parts[1] == 'route':
+            legs = [{'distance': distances[i, i + 1], 'steps': [{'geometry': encode([points[i], points[i + 1]])}]}
+                    for i in range(len(points) - 1)]
+            body = {'code': 'Ok', 'routes': [{'geometry': encode(points), 'distance': sum(leg['distance'] for leg in legs), 'legs': legs}],
+                    'waypoints': [{'location': [lon, lat]} for lat, lon in points]}
+        else:
+            sources = [int(k) for k in params['sources'][0].split(';')] if 'sources' in params else range(len(points))
+            destinations = [int(k) for k in params['destinations'][0].split(';')] if 'destinations' in params else range(len(points))
+            body = {'code': 'Ok', 'distances': distances[np.ix_(list(sources), list(destinations))].tolist()}
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# Function to start the OSRM stub on a free local port and route the shared routing client to it (memory cache only)
+def start_stub_osrm():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOSRMHandler)
+    threading.Thread(target=server.serve_forever, name='osrm-stub', daemon=True).start()
+    set_routing_client(OSRMClient(base_url=f"http://127.0.0.1:{server.server_address[1]}", cache=RouteCache(path=None)))
+    return server
+
+
+# Function to time one stage and trace its peak memory, returns (result, record)
+def measure(stage, n, function, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'outlets': n, 'stage': stage, 'seconds': round(seconds, 4), 'peak_mb': round(peak / (1024 * 1024), 2)}
+
+
+# Function to draw every outlet with its line to the salesman's territory mean, as the main map does
+def render_outlet_map(df):
+    m = folium.Map(location=[df['Latitude'].mean(), df['Longitude'].mean()], zoom_start=10)
+    coords = df[['Latitude', 'Longitude']].to_numpy()
+    centres = df.groupby('NAMA SALESMAN', observed=True)[['Latitude', 'Longitude']].transform('mean').to_numpy()
+    salesmen = df['NAMA SALESMAN'].astype(str).to_numpy()
+    add_fast_markers(m, coords, salesmen, ['blue'] * len(df))
+    add_grouped_lines(m, coords, centres, salesmen, dict.fromkeys(salesmen, 'blue'))
+    return m.get_root().render()
+
+
+# Function to run every stage on one scale, returns the stage records
+def run_scale(n, salesmen, seed=0, distance_mode='geodesic', optimize=True, optimizer_budget=0.2):
+    df = synthetic_outlets(n, salesmen, seed=seed)
+    office = DEFAULT_OFFICE_COORD
+    limit = math.ceil(df['NAMA SALESMAN'].value_counts().max() / len(DAYS))
+    records = []
+
+    data = df.to_csv(index=False).encode()
+    df, record = measure('ingest', n, read_table, data, 'synthetic.csv', cache_dir=None)
+    records.append({**record, 'bytes': len(data)})
+
+    def distance_stage():
+        return [salesman_distance_matrices(office, group[['Latitude', 'Longitude']].to_numpy(), mode=distance_mode)
+                for _, group in df.groupby('NAMA SALESMAN', observed=True)]
+    _, record = measure('distance', n, distance_stage)
+    records.append({**record, 'distance_mode': distance_mode})
+
+    scheduling_df, record = measure('scheduling', n, generate_scheduling, df, office, limit, distance_mode=distance_mode)
+    records.append({**record, 'total_km': round(float(scheduling_df['Distance'].sum()), 3), 'limit': limit})
+
+    if optimize:
+        optimized_df, record = measure('optimized scheduling', n, generate_scheduling, df, office, limit,
+                                       distance_mode=distance_mode, optimizer=RouteOptimizer(time_budget=optimizer_budget))
+        records.append({**record, 'total_km': round(float(optimized_df['Distance'].sum()), 3),
+                        'time_budget_per_salesman': optimizer_budget})
+
+    # Balanced day planner on a weekly / twice weekly / biweekly mix, biweekly outlets plan two weeks of days
+    planned_df = df.assign(**{FREQUENCY_COLUMN: np.resize(['weekly', 'twice weekly', 'biweekly'], len(df))})
+    planned, record = measure('planned scheduling', n, generate_scheduling, planned_df, office, len(planned_df),
+                              distance_mode=distance_mode, planner=BalancedDayPlanner())
+    records.append({**record, 'visits': len(planned), 'days': int(planned['Day'].nunique()),
+                    'unassigned': len(unassigned_outlets(planned))})
+
+    model, record = measure('clustering', n, fit_clusters, df[['Latitude', 'Longitude']].to_numpy(), salesmen)
+    records.append({**record, 'engine': model.engine})
+
+    # The largest (salesman, day) map, with its routes from the OSRM stub
+    day_sizes = scheduling_df.groupby(['NAMA SALESMAN', 'Day'], sort=False).size()
+    salesman, day = day_sizes.idxmax()
+    pair = scheduling_df[(scheduling_df['NAMA SALESMAN'] == salesman) & (scheduling_df['Day'] == day)]
+    html, record = measure('schedule map', n, generate_folium_map, df.iloc[:0], pair, office[0], office[1])
+    records.append({**record, 'visits': len(pair), 'payload_bytes': len(html.encode())})
+
+    html, record = measure('outlet map', n, render_outlet_map, df)
+    records.append({**record, 'payload_bytes': len(html.encode())})
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scheduling pipeline on synthetic outlets (offline).")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help="outlet counts to benchmark")
+    parser.add_argument('--salesmen', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--distance-mode', default='geodesic', choices=DISTANCE_MODES)
+    parser.add_argument('--no-optimize', action='store_true', help="skip the route optimiser stage")
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args(argv)
+
+    server = start_stub_osrm()
+    results = []
+    try:
+        for n in args.sizes:
+            for record in run_scale(n, args.salesmen, args.seed, args.distance_mode, not args.no_optimize):
+                results.append(record)
+                extra = ", ".join(f"{key}={value}" for key, value in record.items()
+                                  if key not in ('outlets', 'stage', 'seconds', 'peak_mb'))
+                print(f"{n:>7} outlets  {record['stage']:<21} {record['seconds']:>9.3f} s  {record['peak_mb']:>8.1f} MB  {extra}",
+                      flush=True)
+    finally:
+        server.shutdown()
+
+    with open(args.output, 'w') as f:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'salesmen': args.salesmen,
+                   'seed': args.seed, 'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Region files (GeoJSON polygons, e.g. kecamatan borders) are looked up in BOUNDARY_DIR
+BOUNDARY_DIR = os.environ.get('BOUNDARY_DIR', '.')
+DEFAULT_BOUNDARY_FILE = 'kabkot_bekasi.geojson'
+DEFAULT_NAME_FIELD = 'KECAMATAN'
+DEFAULT_REGION_LABEL = 'Region'  # Label of the regions when no feature property names them
+
+# Simplified, quantised layers are also kept on disk so a cold start skips the simplification
+BOUNDARY_CACHE_DIR = os.environ.get('BOUNDARY_CACHE_DIR', os.path.join('.cache', 'boundaries'))
+COORDINATE_PRECISION = 5  # Decimals kept in the served geometry (~1 m)
+SIMPLIFY_PIXELS = 0.5  # Geometry detail below this many screen pixels is dropped
+
+# Point x edge pairs tested per point-in-polygon batch, bounds the memory of the vectorised query
+POINT_IN_POLYGON_BATCH = 4_000_000
+POINT_IN_POLYGON_BANDS = 256  # Horizontal bands per feature for the edge index
+
+
+# Function to get the simplification tolerance (degrees) for a map zoom level
+def zoom_tolerance(zoom, pixels=SIMPLIFY_PIXELS):
+    return pixels * 360.0 / (256 * 2 ** zoom)
+
+
+# Function to simplify a closed ring ((n, 2) array) with Douglas-Peucker
+# Rings that would collapse below a triangle are returned unchanged
+def simplify_ring(ring, tolerance):
+    ring = np.asarray(ring, dtype=np.float64)
+    if tolerance <= 0 or len(ring) <= 4:
+        return ring
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = ring[end] - ring[start]
+        points = ring[start + 1:end] - ring[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(points[:, 0], points[:, 1])
+        else:
+            distances = np.abs(segment[0] * points[:, 1] - segment[1] * points[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    simplified = ring[keep]
+    return simplified if len(simplified) >= 4 else ring
+
+
+# Function to list the polygons of a Polygon / MultiPolygon geometry, each a list of rings
+def _polygons(geometry):
+    if geometry is None:
+        return []
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return list(geometry['coordinates'])
+    return []
+
+
+# Function to pick the feature property that names each region
+def _detect_name_field(features):
+    properties = features[0]['properties'] if features else {}
+    if DEFAULT_NAME_FIELD in properties:
+        return DEFAULT_NAME_FIELD
+    for field, value in properties.items():
+        if isinstance(value, str):
+            return field
+    return None
+
+
+# Polygon boundary layer: GeoJSON region features with a simplified, quantised and pre-serialised copy for
+# the map, and a vectorised point-in-polygon lookup to tag outlets with their region
+class BoundaryLayer:
+    def __init__(self, features, name_field=None, source=None):
+        self.features = [feature for feature in features if _polygons(feature.get('geometry'))]
+        self.name_field = name_field or _detect_name_field(self.features)
+        self.label = self.name_field.title() if self.name_field else DEFAULT_REGION_LABEL
+        self.source = source
+        self.names = np.array([feature['properties'].get(self.name_field) for feature in self.features], dtype=object)
+
+        # Edges (x1, y1, x2, y2 in lon/lat) and bounding box of every feature, holes included (even-odd rule)
+        # Edges are also bucketed into horizontal bands, a point only needs the edges of its own band
+        self._edges = []
+        self._bounds = np.empty((len(self.features), 4))
+        self._bands = []
+        for index, feature in enumerate(self.features):
+            rings = [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in _polygons(feature['geometry']) for ring in polygon]
+            edges = np.vstack([np.hstack([ring[:-1], ring[1:]]) for ring in rings])
+            points = np.vstack(rings)
+            self._edges.append(edges)
+            self._bounds[index] = [points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()]
+
+            n_bands = max(1, min(POINT_IN_POLYGON_BANDS, len(edges) // 8))
+            height = max(self._bounds[index, 3] - self._bounds[index, 1], 1e-12) / n_bands
+            low = self._band_of(np.minimum(edges[:, 1], edges[:, 3]), index, n_bands, height)
+            high = self._band_of(np.maximum(edges[:, 1], edges[:, 3]), index, n_bands, height)
+            self._bands.append((n_bands, height, [np.flatnonzero((low <= band) & (high >= band)) for band in range(n_bands)]))
+
+    # Function to get the band index of latitudes within a feature's bounding box
+    def _band_of(self, latitudes, index, n_bands, height):
+        return np.clip(((latitudes - self._bounds[index, 1]) / height).astype(np.int64), 0, n_bands - 1)
+
+    # Function to load a layer from a GeoJSON FeatureCollection file
+    @classmethod
+    def from_file(cls, path, name_field=None):
+        with open(path) as f:
+            return cls(json.load(f)['features'], name_field=name_field, source=path)
+
+    # Function to list the extra properties worth showing in a tooltip next to the region name
+    def tooltip_fields(self):
+        properties = self.features[0]['properties'] if self.features else {}
+        return [field for field in (self.name_field, 'Shape_Area') if field in properties]
+
+    # Function to get a copy of the layer with every ring simplified to the given tolerance (degrees)
+    def simplified(self, tolerance):
+        features = []
+        for feature in self.features:
+            polygons = [[simplify_ring(ring, tolerance).tolist() for ring in polygon] for polygon in _polygons(feature['geometry'])]
+            geometry = {'type': 'MultiPolygon', 'coordinates': polygons} if len(polygons) > 1 \
+                else {'type': 'Polygon', 'coordinates': polygons[0]}
+            features.append({'type': 'Feature', 'properties': feature['properties'], 'geometry': geometry})
+        return BoundaryLayer(features, name_field=self.name_field, source=self.source)
+
+    # Function to serialise the layer as a compact GeoJSON string with coordinates rounded to `precision` decimals
+    def to_geojson(self, precision=COORDINATE_PRECISION):
+        features = []
+        for feature in self.features:
+            polygons = [[np.round(np.asarray(ring, dtype=np.float64)[:, :2], precision).tolist() for ring in polygon]
+                        for polygon in _polygons(feature['geometry'])]
+            geometry = {'type': feature['geometry']['type'],
+                        'coordinates': polygons if feature['geometry']['type'] == 'MultiPolygon' else polygons[0]}
+            features.append({'type': 'Feature', 'properties': feature['properties'], 'geometry': geometry})
+        return json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':'))
+
+    # Function to get the region name of each (latitude, longitude), None outside every region
+    # Points are pre-filtered by bounding box, then tested against all edges of the feature at once (ray casting)
+    def locate(self, latitudes, longitudes):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        regions = np.full(len(latitudes), None, dtype=object)
+        unassigned = np.ones(len(latitudes), dtype=bool)
+
+        for index, edges in enumerate(self._edges):
+            min_x, min_y, max_x, max_y = self._bounds[index]
+            candidates = np.flatnonzero(unassigned & (longitudes >= min_x) & (longitudes <= max_x)
+                                        & (latitudes >= min_y) & (latitudes <= max_y))
+            if not len(candidates):
+                continue
+            n_bands, height, band_edges = self._bands[index]
+            candidate_bands = self._band_of(latitudes[candidates], index, n_bands, height)
+            for band in np.unique(candidate_bands):
+                band_rows = candidates[candidate_bands == band]
+                x1, y1, x2, y2 = (edges[band_edges[band], k][None, :] for k in range(4))
+                batch = max(1, POINT_IN_POLYGON_BATCH // max(1, len(band_edges[band])))
+                for start in range(0, len(band_rows), batch):
+                    rows = band_rows[start:start + batch]
+                    px = longitudes[rows][:, None]
+                    py = latitudes[rows][:, None]
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        crossings = ((y1 > py) != (y2 > py)) & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+                    inside = rows[crossings.sum(axis=1) % 2 == 1]
+                    regions[inside] = self.names[index]
+                    unassigned[inside] = False
+        return regions
+
+
+# Function to list the region files available for the boundary overlay, the default file first
+def list_boundary_files(directory=BOUNDARY_DIR):
+    files = sorted(os.path.normpath(path) for path in glob.glob(os.path.join(directory, '*.geojson')))
+    default = os.path.normpath(os.path.join(directory, DEFAULT_BOUNDARY_FILE))
+    if default in files:
+        files.remove(default)
+        files.insert(0, default)
+    return files
+
+
+# Function to get the full-resolution layer of a region file, parsed once per file version
+def load_boundary_layer(path, name_field=None):
+    stat = os.stat(path)
+    return _load_boundary_layer(path, stat.st_mtime_ns, stat.st_size, name_field)
+
+
+@functools.lru_cache(maxsize=16)
+def _load_boundary_layer(path, mtime_ns, size, name_field):
+    return BoundaryLayer.from_file(path, name_field=name_field)
+
+
+# Function to get the simplified, quantised GeoJSON string of a region file for a map zoom level
+# Cached in memory and on disk, keyed by the file version, tolerance and precision
+def boundary_geojson(path, zoom=10, name_field=None, precision=COORDINATE_PRECISION):
+    stat = os.stat(path)
+    return _boundary_geojson(path, stat.st_mtime_ns, stat.st_size, zoom_tolerance(zoom), name_field, precision)
+
+
+@functools.lru_cache(maxsize=32)
+def _boundary_geojson(path, mtime_ns, size, tolerance, name_field, precision):
+    key = hashlib.sha1(repr((os.path.abspath(path), mtime_ns, size, tolerance, name_field, precision)).encode()).hexdigest()
+    cache_path = os.path.join(BOUNDARY_CACHE_DIR, f"{key}.geojson")
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return f.read()
+
+    geojson = load_boundary_layer(path, name_field).simplified(tolerance).to_geojson(precision)
+    try:
+        os.makedirs(BOUNDARY_CACHE_DIR, exist_ok=True)
+        with open(cache_path + '.tmp', 'w') as f:
+            f.write(geojson)
+        os.replace(cache_path + '.tmp', cache_path)
+    except OSError:
+        pass  # The disk copy is only an optimisation
+    return geojson
@@ -0,0 +1,217 @@
+import hashlib
+import math
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics.pairwise import haversine_distances
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Clustering engines:
+# 'kmeans'    - KMeans on raw lat/lon degrees (the original behaviour)
+# 'projected' - KMeans on equal-area projected coordinates, so distances are not distorted by longitude
+# 'minibatch' - MiniBatchKMeans on projected coordinates, for large outlet databases
+# 'auto'      - 'minibatch' from AUTO_MINIBATCH_ROWS rows up, 'kmeans' below
+CLUSTER_ENGINES = ('auto', 'kmeans', 'projected', 'minibatch')
+AUTO_MINIBATCH_ROWS = 50000
+
+# Online assignment asks for a full refit once a centroid drifted this far from its fitted position,
+# or once the outlets added online reach this fraction of the fitted outlets
+DEFAULT_DRIFT_KM = 2.0
+DEFAULT_MAX_ADDED_FRACTION = 0.1
+
+
+# Function to get a content hash of an outlet coordinate array, used to key cached models
+def coordinates_hash(coords):
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    return hashlib.sha1(coords.tobytes() + str(coords.shape).encode()).hexdigest()
+
+
+# Lambert cylindrical equal-area projection (km) around a standard parallel
+class EqualAreaProjection:
+    def __init__(self, standard_parallel):
+        self.scale = math.cos(math.radians(standard_parallel))
+
+    def forward(self, coords):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        x = EARTH_RADIUS_KM * np.radians(coords[:, 1]) * self.scale
+        y = EARTH_RADIUS_KM * np.sin(np.radians(coords[:, 0])) / self.scale
+        return np.column_stack([x, y])
+
+    def inverse(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        lon = np.degrees(points[:, 0] / (EARTH_RADIUS_KM * self.scale))
+        lat = np.degrees(np.arcsin(np.clip(points[:, 1] * self.scale / EARTH_RADIUS_KM, -1, 1)))
+        return np.column_stack([lat, lon])
+
+
+# Fitted clustering model with the KMeans interface used by main_app:
+# predict() takes [[lat, lon], ...] and cluster_centers_ are (lat, lon) degrees whatever the engine
+class ClusterModel:
+    def __init__(self, engine, estimator, projection, labels, fit_seconds):
+        self.engine = engine
+        self.estimator = estimator
+        self.projection = projection
+        self.labels_ = labels
+        self.fit_seconds = fit_seconds
+        centers = estimator.cluster_centers_
+        self.cluster_centers_ = projection.inverse(centers) if projection is not None else np.asarray(centers)
+
+    def predict(self, coords):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if self.projection is not None:
+            coords = self.projection.forward(coords)
+        return self.estimator.predict(coords)
+
+
+# Function to resolve 'auto' to a concrete engine for a number of rows
+def resolve_engine(engine, n_rows):
+    if engine not in CLUSTER_ENGINES:
+        raise ValueError(f"Unknown clustering engine '{engine}', expected one of {CLUSTER_ENGINES}")
+    if engine == 'auto':
+        return 'minibatch' if n_rows >= AUTO_MINIBATCH_ROWS else 'kmeans'
+    return engine
+
+
+# Function to cluster outlet coordinates ((n, 2) lat/lon) into n_clusters with the selected engine
+# init_centers (lat/lon, e.g. the cluster_centers_ of the previous fit) warm-starts the fit when the count matches
+def fit_clusters(coords, n_clusters, engine='auto', init_centers=None, random_state=42):
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    engine = resolve_engine(engine, len(coords))
+
+    projection = None
+    points = coords
+    if engine in ('projected', 'minibatch'):
+        projection = EqualAreaProjection(float(coords[:, 0].mean()))
+        points = projection.forward(coords)
+
+    init, n_init = 'k-means++', 'auto'
+    if init_centers is not None and len(init_centers) == n_clusters:
+        init = projection.forward(init_centers) if projection is not None else np.asarray(init_centers, dtype=np.float64)
+        n_init = 1
+
+    start = time.perf_counter()
+    if engine == 'minibatch':
+        estimator = MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=n_init, random_state=random_state,
+                                    batch_size=4096)
+    else:
+        estimator = KMeans(n_clusters=n_clusters, init=init, n_init=n_init, random_state=random_state)
+    labels = estimator.fit_predict(points)
+    return ClusterModel(engine, estimator, projection, labels, time.perf_counter() - start)
+
+
+# Online assignment of new outlets to a fitted clustering without refitting
+# Nearest centroid and nearest outlet queries go through haversine BallTrees, centroids follow the added
+# outlets as streaming means, and needs_refit() reports when the centroids drifted too far for the fit to hold
+class OnlineAssigner:
+    def __init__(self, centers, counts, outlet_coords=None, outlet_salesmen=None,
+                 drift_km=DEFAULT_DRIFT_KM, max_added_fraction=DEFAULT_MAX_ADDED_FRACTION):
+        self.centers = np.array(centers, dtype=np.float64).reshape(-1, 2)
+        self.fitted_centers = self.centers.copy()
+        self.counts = np.asarray(counts, dtype=np.int64).copy()
+        self.fitted_count = int(self.counts.sum())
+        self.added_count = 0
+        self.drift_threshold_km = drift_km
+        self.max_added_fraction = max_added_fraction
+        self._center_tree = BallTree(np.radians(self.centers), metric='haversine')
+
+        outlet_coords = np.empty((0, 2)) if outlet_coords is None else np.asarray(outlet_coords, dtype=np.float64).reshape(-1, 2)
+        self._outlet_tree = BallTree(np.radians(outlet_coords), metric='haversine') if len(outlet_coords) else None
+        self._outlet_salesmen = list(outlet_salesmen) if outlet_salesmen is not None else [None] * len(outlet_coords)
+        self._added_coords = []
+        self._added_salesmen = []
+
+    # Function to build the assigner from a fitted ClusterModel and the outlets it was fitted on
+    @classmethod
+    def from_model(cls, model, coords, salesmen=None, **kwargs):
+        counts = np.bincount(model.labels_, minlength=len(model.cluster_centers_))
+        return cls(model.cluster_centers_, counts, coords, salesmen, **kwargs)
+
+    # Function to get the nearest centroid label and its distance (km) for [[lat, lon], ...]
+    def predict(self, coords):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if len(coords) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        distances, labels = self._center_tree.query(np.radians(coords), k=1)
+        return labels[:, 0], distances[:, 0] * EARTH_RADIUS_KM
+
+    # Function to get the salesman and distance (km) of the nearest known outlet for [[lat, lon], ...]
+    def nearest_outlet(self, coords):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        best_distances = np.full(len(coords), np.inf)
+        best_salesmen = [None] * len(coords)
+        if self._outlet_tree is not None:
+            distances, indices = self._outlet_tree.query(np.radians(coords), k=1)
+            best_distances = distances[:, 0] * EARTH_RADIUS_KM
+            best_salesmen = [self._outlet_salesmen[i] for i in indices[:, 0]]
+        if self._added_coords:
+            # Outlets added online are few, compare them directly instead of rebuilding the tree
+            added = haversine_distances(np.radians(coords), np.radians(np.array(self._added_coords))) * EARTH_RADIUS_KM
+            nearest = added.argmin(axis=1)
+            for i, j in enumerate(nearest):
+                if added[i, j] < best_distances[i]:
+                    best_distances[i] = added[i, j]
+                    best_salesmen[i] = self._added_salesmen[j]
+        return best_salesmen, best_distances
+
+    # Function to add outlets online: assigns them (unless labels are given) and moves the centroids
+    # with a streaming mean, returns the labels
+    def add(self, coords, labels=None, salesmen=None):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if len(coords) == 0:
+            return np.empty(0, dtype=np.int64)
+        if labels is None:
+            labels, _ = self.predict(coords)
+        salesmen = list(salesmen) if salesmen is not None else [None] * len(coords)
+        for point, label, salesman in zip(coords, labels, salesmen):
+            self.counts[label] += 1
+            self.centers[label] += (point - self.centers[label]) / self.counts[label]
+            self._added_coords.append(point)
+            self._added_salesmen.append(salesman)
+        self.added_count += len(coords)
+        self._center_tree = BallTree(np.radians(self.centers), metric='haversine')
+        return np.asarray(labels)
+
+    # Function to get the largest distance (km) a centroid moved since the fit
+    def drift_km(self):
+        drift = haversine_distances(np.radians(self.centers), np.radians(self.fitted_centers)).diagonal()
+        return float(drift.max() * EARTH_RADIUS_KM) if len(drift) else 0.0
+
+    # Function to tell whether the online updates drifted enough to ask for a full refit
+    def needs_refit(self):
+        if self.drift_km() > self.drift_threshold_km:
+            return True
+        return self.fitted_count > 0 and self.added_count / self.fitted_count > self.max_added_fraction
+
+
+# Function to summarise each cluster in one table: its centre, the majority salesman of its outlets and the votes
+# Clusters without outlets keep their default salesman; ties go to the salesman seen first in the cluster
+def cluster_summary(labels, salesmen, centers, default_salesmen=None):
+    labels = np.asarray(labels, dtype=np.int64)
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    n_clusters = len(centers)
+    codes, names = pd.factorize(pd.Series(salesmen, dtype=object), use_na_sentinel=False)
+    names = np.asarray(names, dtype=object)
+
+    # (cluster, salesman) vote counts and the first outlet row of each pair for tie-breaking
+    votes = np.zeros((n_clusters, len(names)), dtype=np.int64)
+    np.add.at(votes, (labels, codes), 1)
+    first_seen = np.full(votes.shape, len(labels), dtype=np.int64)
+    np.minimum.at(first_seen, (labels, codes), np.arange(len(labels)))
+    winner = (votes * (len(labels) + 1) - first_seen).argmax(axis=1) if len(names) else np.zeros(n_clusters, dtype=np.int64)
+
+    outlets = votes.sum(axis=1)
+    defaults = list(default_salesmen) if default_salesmen is not None else []
+    defaults = np.array(defaults[:n_clusters] + [None] * (n_clusters - len(defaults)), dtype=object)
+    majority = names[winner] if len(names) else defaults
+    return pd.DataFrame({
+        'Cluster': np.arange(n_clusters),
+        'Latitude': centers[:, 0],
+        'Longitude': centers[:, 1],
+        'Salesman': np.where(outlets > 0, majority, defaults),
+        'Outlets': outlets,
+        'Salesman Outlets': votes[np.arange(n_clusters), winner] if len(names) else outlets,
+    })
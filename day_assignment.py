@@ -0,0 +1,340 @@
+import datetime
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from route_optimizer import improve_tour, tour_length
+
+# Optional outlet columns read by the balanced day planner, outlets without a value have no constraint
+FREQUENCY_COLUMN = 'FREQUENCY'  # weekly (default), twice weekly or biweekly
+SERVICE_COLUMN = 'SERVICE MINUTES'  # Minutes spent at the outlet
+OPEN_COLUMN = 'OPEN TIME'  # Time window of the visit, e.g. 09:00 - 15:00
+CLOSE_COLUMN = 'CLOSE TIME'
+VISIT_DAYS_COLUMN = 'VISIT DAYS'  # Days the outlet can be visited, e.g. "Monday, Thursday"
+CONSTRAINT_COLUMNS = (FREQUENCY_COLUMN, SERVICE_COLUMN, OPEN_COLUMN, CLOSE_COLUMN, VISIT_DAYS_COLUMN)
+
+# Visits per week and weeks per visit cycle of each visit frequency
+FREQUENCIES = {'weekly': (1, 1), 'twice weekly': (2, 1), 'biweekly': (1, 2)}
+FREQUENCY_ALIASES = {'': 'weekly', 'nan': 'weekly', 'bi weekly': 'biweekly', 'fortnightly': 'biweekly',
+                     'twice a week': 'twice weekly', '2x weekly': 'twice weekly'}
+
+DEFAULT_SERVICE_MINUTES = 15.0
+DEFAULT_SPEED_KMH = 25.0  # Average urban driving speed between outlets
+DEFAULT_DAY_START = '08:00'
+DEFAULT_DAY_MINUTES = 8 * 60
+# Balancing passes: a day takes at most an even share of the visits and minutes, then 10%, 25% and 50% more;
+# a last pass fills the remaining outlets up to the per-day capacity and working day
+BALANCE_SLACKS = (1.0, 1.1, 1.25, 1.5)
+
+
+# Function to read a clock time ('HH:MM', 'HH:MM:SS', hours, an Excel day fraction or a time) as minutes after midnight
+# Returns NaN when the value is missing or cannot be read
+def parse_clock(value):
+    if isinstance(value, (datetime.time, datetime.datetime)):
+        return value.hour * 60 + value.minute + value.second / 60
+    if isinstance(value, str):
+        parts = value.strip().replace('.', ':').split(':')
+        try:
+            return int(parts[0]) * 60 + (int(parts[1]) if len(parts) > 1 else 0)
+        except ValueError:
+            return math.nan
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    if 0 <= value < 1:
+        return value * 24 * 60
+    return value * 60 if 1 <= value <= 24 else math.nan
+
+
+# Function to normalise a visit frequency, unknown values are visited weekly
+def parse_frequency(value):
+    frequency = str(value).strip().lower().replace('-', ' ').replace('_', ' ')
+    frequency = FREQUENCY_ALIASES.get(frequency, frequency)
+    return frequency if frequency in FREQUENCIES else 'weekly'
+
+
+# Function to read the visit constraints of a salesman's outlets from the optional columns
+# Returns arrays in row order: service minutes, window open and close (minutes after midnight),
+# frequency names and the (n, days) matrix of days each outlet can be visited
+def outlet_constraints(group, days, service_minutes=DEFAULT_SERVICE_MINUTES):
+    n = len(group)
+    constraints = {
+        'service': np.full(n, float(service_minutes)),
+        'open': np.full(n, -np.inf),
+        'close': np.full(n, np.inf),
+        'frequency': ['weekly'] * n,
+        'allowed': np.ones((n, len(days)), dtype=bool),
+    }
+    if SERVICE_COLUMN in group.columns:
+        service = pd.to_numeric(group[SERVICE_COLUMN], errors='coerce').to_numpy(dtype=np.float64)
+        constraints['service'] = np.where(np.isnan(service), service_minutes, service)
+    for column, key in ((OPEN_COLUMN, 'open'), (CLOSE_COLUMN, 'close')):
+        if column in group.columns:
+            minutes = np.array([parse_clock(value) for value in group[column]], dtype=np.float64)
+            constraints[key] = np.where(np.isnan(minutes), constraints[key], minutes)
+    if FREQUENCY_COLUMN in group.columns:
+        constraints['frequency'] = [parse_frequency(value) for value in group[FREQUENCY_COLUMN]]
+    if VISIT_DAYS_COLUMN in group.columns:
+        day_names = [str(day).strip().lower() for day in days]
+        for row, value in enumerate(group[VISIT_DAYS_COLUMN]):
+            if isinstance(value, str) and value.strip():
+                wanted = {day.strip().lower() for day in value.replace(';', ',').split(',')}
+                constraints['allowed'][row] = [day in wanted for day in day_names]
+    return constraints
+
+
+# Balanced day planner for generate_scheduling: assigns a salesman's outlets to days so visits and the estimated
+# drive + service minutes are even across days, within the per-day visit capacity and working day, honouring
+# the visit days, time windows and visit frequencies (a biweekly outlet makes the plan cover two weeks)
+# Days are built by a capacitated k-medoids: day centres seeded by a sweep around the office, outlets placed
+# by regret (most constrained first) on the cheapest day pattern that has capacity left, centres moved to the
+# medoid of their outlets until the assignment is stable. Outlets that do not fit are reported, not dropped
+class BalancedDayPlanner:
+    def __init__(self, day_minutes=DEFAULT_DAY_MINUTES, day_start=DEFAULT_DAY_START, speed_kmh=DEFAULT_SPEED_KMH,
+                 service_minutes=DEFAULT_SERVICE_MINUTES, max_iter=10):
+        self.day_minutes = day_minutes
+        self.day_start = day_start
+        self.speed_kmh = speed_kmh
+        self.service_minutes = service_minutes
+        self.max_iter = max_iter
+
+    # Function to plan one salesman: returns [(day label, tour)] in calendar order, the unassigned outlets
+    # as [(outlet, reason)] and a per-day report of visits, km and minutes
+    # optimizer (e.g. RouteOptimizer) shortens the day tours that have no time windows within its time budget
+    def plan(self, office_distances, outlet_distance_matrix, outlet_coords, office_coord, days, limit,
+             constraints=None, optimizer=None):
+        n = len(office_distances)
+        n_days = len(days)
+        if constraints is None:
+            constraints = outlet_constraints(pd.DataFrame(index=range(n)), days, self.service_minutes)
+        D = outlet_distance_matrix
+        weeks = 2 if any(FREQUENCIES[frequency][1] == 2 for frequency in constraints['frequency']) else 1
+        n_slots = weeks * n_days
+        labels = [day if weeks == 1 else f"{day} (Week {week + 1})" for week in range(weeks) for day in days]
+        patterns = [self._patterns(constraints['frequency'][outlet], constraints['allowed'][outlet], n_days, weeks)
+                    for outlet in range(n)]
+
+        # Estimated minutes of a visit: its service time and the drive from its nearest other outlet
+        if n > 1:
+            nearest_km = np.where(np.eye(n, dtype=bool), np.inf, D).min(axis=1)
+        else:
+            nearest_km = np.asarray(office_distances, dtype=np.float64)
+        estimate = constraints['service'] + nearest_km / (self.speed_kmh / 60)
+
+        slot_visits = sum(pattern.shape[1] for pattern in patterns if len(pattern))
+        slot_minutes = sum(estimate[outlet] * pattern.shape[1] for outlet, pattern in enumerate(patterns) if len(pattern))
+        visit_caps = [min(limit, math.ceil(slot_visits / max(n_slots, 1) * slack)) for slack in BALANCE_SLACKS] + [limit]
+
+        medoids = np.tile(self._sweep_seeds(outlet_coords, office_coord, D, n_days), weeks)
+        assignment = None
+        for _ in range(self.max_iter):
+            centre_cost = D[:, medoids] if n else np.empty((0, n_slots))
+            # Minutes a day has for visits: the working day (or its even share) less the drive from the office
+            # to the day's area
+            office_minutes = office_distances[medoids] / (self.speed_kmh / 60) if n else np.zeros(n_slots)
+            hard_minutes = (self.day_minutes or np.inf) - office_minutes
+            even_share = (slot_minutes + office_minutes.sum()) / max(n_slots, 1)
+            minute_caps = [np.minimum(hard_minutes, even_share * slack - office_minutes) for slack in BALANCE_SLACKS]
+            minute_caps.append(hard_minutes)
+            new_assignment, reasons = self._assign(patterns, centre_cost, estimate, visit_caps, minute_caps, n_slots)
+            if new_assignment == assignment:
+                break
+            assignment = new_assignment
+            medoids = self._medoids(assignment, patterns, D, medoids, n_slots)
+
+        # Unplaced outlets: no allowed day pattern at all, or no visit capacity or working time left
+        unassigned = {outlet: reasons[outlet] for outlet in range(n) if assignment[outlet] is None}
+        members = self._members(assignment, patterns, n_slots)
+
+        # Route every day in time order; outlets the time windows or the working day leave out are taken off
+        # all their days and tried once on their other patterns
+        tours, dropped, retried = {}, {}, set()
+        for slot in range(n_slots):
+            tours[slot], late = self._day_tour(members[slot], office_distances, D, constraints)
+            dropped.update(late)
+        while dropped:
+            affected = set()
+            for outlet in dropped:
+                for slot in patterns[outlet][assignment[outlet]]:
+                    members[slot].remove(outlet)
+                    affected.add(slot)
+                assignment[outlet] = None
+            retry = dict(dropped)
+            dropped = {}
+            for slot in affected:
+                tours[slot], late = self._day_tour(members[slot], office_distances, D, constraints)
+                dropped.update(late)
+            for outlet, reason in retry.items():
+                if outlet in retried or not self._relocate(outlet, patterns, medoids, members, tours, assignment,
+                                                           office_distances, D, constraints, limit):
+                    unassigned[outlet] = reason
+                retried.add(outlet)
+
+        if optimizer is not None:
+            self._improve(tours, constraints, office_distances, D, optimizer)
+
+        day_tours = [(labels[slot], tours[slot]) for slot in range(n_slots) if tours[slot]]
+        day_report = {labels[slot]: {'visits': len(tours[slot]),
+                                     'km': tour_length(tours[slot], office_distances, D),
+                                     'minutes': self._tour_minutes(tours[slot], office_distances, D, constraints)}
+                      for slot in range(n_slots)}
+        return day_tours, sorted(unassigned.items()), day_report
+
+    # Function to list the day patterns (slots visited) an outlet can take, one row per pattern
+    def _patterns(self, frequency, allowed, n_days, weeks):
+        visits, cycle_weeks = FREQUENCIES[frequency]
+        allowed_days = np.flatnonzero(allowed)
+        if cycle_weeks == 2:
+            patterns = [[week * n_days + day] for week in range(weeks) for day in allowed_days]
+            width = 1
+        elif visits == 2:
+            # Twice weekly: two days well apart (at least a third of the week) when the allowed days permit
+            pairs = [(first, second) for i, first in enumerate(allowed_days) for second in allowed_days[i + 1:]]
+            spaced = [pair for pair in pairs if min(pair[1] - pair[0], n_days - pair[1] + pair[0]) >= max(1, n_days // 3)]
+            patterns = [[week * n_days + day for week in range(weeks) for day in pair] for pair in (spaced or pairs)]
+            width = 2 * weeks
+        else:
+            patterns = [[week * n_days + day for week in range(weeks)] for day in allowed_days]
+            width = weeks
+        return np.asarray(patterns, dtype=np.int64).reshape(len(patterns), width)
+
+    # Function to seed one centre per day: sweep the outlets around the office and take the medoid of each sector
+    def _sweep_seeds(self, outlet_coords, office_coord, D, n_days):
+        outlet_coords = np.asarray(outlet_coords, dtype=np.float64).reshape(-1, 2)
+        if not len(outlet_coords):
+            return np.zeros(n_days, dtype=np.int64)
+        dlat = outlet_coords[:, 0] - office_coord[0]
+        dlon = (outlet_coords[:, 1] - office_coord[1]) * math.cos(math.radians(office_coord[0]))
+        sweep = np.argsort(np.arctan2(dlat, dlon), kind='stable')
+        seeds = []
+        for sector in np.array_split(sweep, n_days):
+            seeds.append(sector[int(np.argmin(D[np.ix_(sector, sector)].sum(axis=1)))] if len(sector) else sweep[0])
+        return np.asarray(seeds, dtype=np.int64)
+
+    # Function to place every outlet on its cheapest pattern with room left, the most constrained outlets first
+    # The first passes keep the days balanced, the last pass fills the remaining outlets up to the hard capacity
+    # Returns the pattern of every outlet (None when unplaced) and the reason of the unplaced outlets
+    def _assign(self, patterns, centre_cost, estimate, visit_caps, minute_caps, n_slots):
+        n = len(patterns)
+        costs = [centre_cost[outlet][pattern].sum(axis=1) if len(pattern) else np.empty(0)
+                 for outlet, pattern in enumerate(patterns)]
+        regret = [np.partition(cost, 1)[1] - cost.min() if len(cost) > 1 else np.inf for cost in costs]
+        order = sorted(range(n), key=lambda outlet: (len(patterns[outlet]), -patterns[outlet].shape[1], -regret[outlet]))
+
+        assignment = [None] * n
+        visits = np.zeros(n_slots, dtype=np.int64)
+        minutes = np.zeros(n_slots)
+        for index, (max_visits, max_minutes) in enumerate(zip(visit_caps, minute_caps)):
+            last_pass = index == len(visit_caps) - 1
+            for outlet in order:
+                if assignment[outlet] is None and len(patterns[outlet]):
+                    # The last pass puts the outlets left over on their least loaded days
+                    if last_pass:
+                        choices = np.argsort(minutes[patterns[outlet]].max(axis=1), kind='stable')
+                    else:
+                        choices = np.argsort(costs[outlet], kind='stable')
+                    for choice in choices:
+                        slots = patterns[outlet][choice]
+                        if (visits[slots] < max_visits).all() and (minutes[slots] + estimate[outlet] <= max_minutes[slots]).all():
+                            assignment[outlet] = int(choice)
+                            visits[slots] += 1
+                            minutes[slots] += estimate[outlet]
+                            break
+
+        reasons = {}
+        for outlet in range(n):
+            if assignment[outlet] is None:
+                if not len(patterns[outlet]):
+                    reasons[outlet] = 'visit days'
+                elif (visits[patterns[outlet]] < visit_caps[-1]).all(axis=1).any():
+                    reasons[outlet] = 'working day'
+                else:
+                    reasons[outlet] = 'capacity'
+        return assignment, reasons
+
+    def _members(self, assignment, patterns, n_slots):
+        members = [[] for _ in range(n_slots)]
+        for outlet, choice in enumerate(assignment):
+            if choice is not None:
+                for slot in patterns[outlet][choice]:
+                    members[slot].append(outlet)
+        return members
+
+    # Function to move every day centre to the medoid of its outlets, empty days keep their centre
+    def _medoids(self, assignment, patterns, D, medoids, n_slots):
+        medoids = medoids.copy()
+        for slot, outlets in enumerate(self._members(assignment, patterns, n_slots)):
+            if outlets:
+                outlets = np.asarray(outlets)
+                medoids[slot] = outlets[int(np.argmin(D[np.ix_(outlets, outlets)].sum(axis=1)))]
+        return medoids
+
+    # Function to route one day from the office in time order: the next visit is the outlet whose service can
+    # start the earliest (nearest, after waiting for its window to open). Returns the tour and the outlets left
+    # out, with the reason, when no window or the working day leaves room for them
+    def _day_tour(self, outlets, office_distances, D, constraints):
+        km_per_minute = self.speed_kmh / 60
+        start = parse_clock(self.day_start)
+        end = start + (self.day_minutes or np.inf)
+        remaining = np.asarray(outlets, dtype=np.int64)
+        tour = []
+        clock = start
+        while len(remaining):
+            travel = (office_distances[remaining] if not tour else D[tour[-1], remaining]) / km_per_minute
+            begin = np.maximum(clock + travel, constraints['open'][remaining])
+            finish = begin + constraints['service'][remaining]
+            feasible = (begin <= constraints['close'][remaining]) & (finish <= end)
+            if not feasible.any():
+                late = {int(outlet): ('time window' if begin[k] > constraints['close'][outlet] else 'working day')
+                        for k, outlet in enumerate(remaining)}
+                return tour, late
+            k = int(np.argmin(np.where(feasible, begin, np.inf)))
+            tour.append(int(remaining[k]))
+            clock = finish[k]
+            remaining = np.delete(remaining, k)
+        return tour, {}
+
+    # Function to try an outlet left out of its days on its other patterns, cheapest first
+    def _relocate(self, outlet, patterns, medoids, members, tours, assignment, office_distances, D,
+                  constraints, limit):
+        costs = D[outlet][medoids][patterns[outlet]].sum(axis=1) if len(patterns[outlet]) else np.empty(0)
+        for choice in np.argsort(costs, kind='stable'):
+            slots = patterns[outlet][choice]
+            if any(len(members[slot]) >= limit for slot in slots):
+                continue
+            trial = {}
+            for slot in slots:
+                trial[slot], late = self._day_tour(members[slot] + [outlet], office_distances, D, constraints)
+                if late:
+                    break
+            else:
+                for slot in slots:
+                    members[slot].append(outlet)
+                    tours[slot] = trial[slot]
+                assignment[outlet] = int(choice)
+                return True
+        return False
+
+    # Function to shorten the day tours without time windows with the optimiser's local search
+    def _improve(self, tours, constraints, office_distances, D, optimizer):
+        deadline = time.perf_counter() + getattr(optimizer, 'time_budget', 1.0)
+        free_days = [slot for slot, tour in tours.items()
+                     if tour and np.isinf(constraints['open'][tour]).all() and np.isinf(constraints['close'][tour]).all()]
+        for index, slot in enumerate(free_days):
+            tour_deadline = time.perf_counter() + max(0.0, deadline - time.perf_counter()) / (len(free_days) - index)
+            tours[slot] = improve_tour(tours[slot], office_distances, D, tour_deadline)
+
+    # Function to get the minutes of a day tour: drive, waiting for windows and service
+    def _tour_minutes(self, tour, office_distances, D, constraints):
+        km_per_minute = self.speed_kmh / 60
+        start = parse_clock(self.day_start)
+        clock = start
+        previous = None
+        for outlet in tour:
+            travel = (office_distances[outlet] if previous is None else D[previous, outlet]) / km_per_minute
+            clock = max(clock + travel, constraints['open'][outlet]) + constraints['service'][outlet]
+            previous = outlet
+        return float(clock - start)
@@ -0,0 +1,38 @@
+import json
+import os
+
+import pandas as pd
+import streamlit as st
+
+from instrumentation import PROFILERS, RunMetrics, start_metrics_server
+
+DEBUG_PANEL_DEFAULT = os.environ.get('DEBUG_PANEL', '0') == '1'
+
+
+# Function to start the instrumentation of one page run, profiled when the previous run asked for it
+def start_run(page):
+    start_metrics_server()
+    return RunMetrics(page, profiler=st.session_state.pop('profile_next_run', None))
+
+
+# Function to close the run and show its metrics in an optional sidebar panel, with a button to profile one rerun
+def show_debug_panel(metrics):
+    metrics.finish()
+    if not st.sidebar.checkbox("🐞 Show debug panel", value=DEBUG_PANEL_DEFAULT):
+        return
+    with st.sidebar.expander("Run metrics", expanded=True):
+        st.caption(metrics.describe())
+        if metrics.stages:
+            st.dataframe(pd.DataFrame(metrics.stages).round(3), hide_index=True)
+        if metrics.counters:
+            st.json(metrics.counters)
+
+        profiler = st.selectbox("Profiler:", PROFILERS)
+        if st.button("Profile one rerun"):
+            st.session_state.profile_next_run = profiler
+            st.rerun()
+        if metrics.profile:
+            st.code(metrics.profile, language=None)
+
+        st.download_button("Download run metrics (JSON)", json.dumps(metrics.to_dict(), default=str, indent=2),
+                           file_name=f"{metrics.page}_metrics.json", mime="application/json")
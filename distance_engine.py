@@ -0,0 +1,135 @@
+import numpy as np
+from geopy.distance import geodesic
+
+from routing_client import get_routing_client
+
+# Mean earth radius (IUGG) used by the fast haversine mode
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid used by the exact geodesic mode (same ellipsoid as geopy)
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# Haversine is within ~0.6% of the geodesic distance (the worst case is north-south
+# near the equator, as in Jabodetabek), so nearest-neighbour choices only differ
+# from the geodesic mode when two candidates are closer together than this
+# relative gap; tests/test_distance_engine.py checks the bound
+HAVERSINE_TOLERANCE = 0.006
+
+DISTANCE_MODES = ('geodesic', 'haversine', 'road')
+
+
+# Function to turn a list of (lat, lon) pairs into an (n, 2) float array
+def as_coordinate_array(points):
+    points = np.asarray(points, dtype=np.float64)
+    return points.reshape(-1, 2)
+
+
+# Function to calculate a haversine distance matrix in kilometers
+def haversine_matrix(origins, destinations):
+    origins = np.radians(as_coordinate_array(origins))
+    destinations = np.radians(as_coordinate_array(destinations))
+    lat1 = origins[:, 0][:, None]
+    lon1 = origins[:, 1][:, None]
+    lat2 = destinations[:, 0][None, :]
+    lon2 = destinations[:, 1][None, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+# Function to calculate the haversine distance in kilometers between each origin and the destination in the same row
+def haversine_paired(origins, destinations):
+    origins = np.radians(as_coordinate_array(origins))
+    destinations = np.radians(as_coordinate_array(destinations))
+    a = (np.sin((destinations[:, 0] - origins[:, 0]) / 2) ** 2
+         + np.cos(origins[:, 0]) * np.cos(destinations[:, 0]) * np.sin((destinations[:, 1] - origins[:, 1]) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+# Function to calculate a geodesic (Vincenty inverse on WGS-84) distance matrix in kilometers
+def geodesic_matrix(origins, destinations, max_iter=200, tol=1e-12):
+    origins = as_coordinate_array(origins)
+    destinations = as_coordinate_array(destinations)
+    lat1 = np.radians(origins[:, 0])[:, None]
+    lon1 = np.radians(origins[:, 1])[:, None]
+    lat2 = np.radians(destinations[:, 0])[None, :]
+    lon2 = np.radians(destinations[:, 1])[None, :]
+
+    L = np.broadcast_to(lon2 - lon1, (len(origins), len(destinations)))
+    U1 = np.arctan((1 - WGS84_F) * np.tan(lat1))
+    U2 = np.arctan((1 - WGS84_F) * np.tan(lat2))
+    sin_u1, cos_u1 = np.sin(U1), np.cos(U1)
+    sin_u2, cos_u2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.sqrt((cos_u2 * sin_lam) ** 2 + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * WGS84_F * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lam - lam_prev) < tol
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        distances = WGS84_B * A * (sigma - delta_sigma) / 1000
+
+    # Vincenty does not converge for nearly antipodal points, fall back to geopy for those pairs
+    for i, j in zip(*np.nonzero(~converged | np.isnan(distances))):
+        distances[i, j] = geodesic(tuple(origins[i]), tuple(destinations[j])).kilometers
+
+    return distances
+
+
+# Function to calculate the OSRM road distance matrix in kilometers with the /table service
+# Pairs without a road route (or a failed request) fall back to the geodesic distance
+def road_matrix(origins, destinations):
+    origins = as_coordinate_array(origins)
+    destinations = as_coordinate_array(destinations)
+    sources = [tuple(point) for point in origins]
+    if np.array_equal(origins, destinations):
+        # A symmetric table needs each coordinate only once in the request
+        matrix = get_routing_client().table(sources)
+    else:
+        matrix = get_routing_client().table(sources, [tuple(point) for point in destinations])
+    missing = np.isnan(matrix)
+    if missing.any():
+        matrix[missing] = geodesic_matrix(origins, destinations)[missing]
+    return matrix
+
+
+# Function to calculate a distance matrix between two sets of coordinates
+def distance_matrix(origins, destinations=None, mode='geodesic'):
+    if destinations is None:
+        destinations = origins
+    if mode == 'road':
+        return road_matrix(origins, destinations)
+    if mode == 'haversine':
+        return haversine_matrix(origins, destinations)
+    if mode == 'geodesic':
+        return geodesic_matrix(origins, destinations)
+    raise ValueError(f"Unknown distance mode '{mode}', expected one of {DISTANCE_MODES}")
+
+
+# Function to calculate office-to-outlet distances and the outlet-to-outlet matrix of one salesman in a single batch
+def salesman_distance_matrices(office_coord, outlet_coords, mode='geodesic'):
+    outlet_coords = as_coordinate_array(outlet_coords)
+    points = np.vstack([as_coordinate_array(office_coord), outlet_coords])
+    matrix = distance_matrix(points, points, mode=mode)
+    return matrix[0, 1:], matrix[1:, 1:]
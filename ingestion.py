@@ -0,0 +1,142 @@
+import hashlib
+import importlib.util
+import io
+import os
+import time
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Declared schema of the outlet databases: numeric coordinates and categorical low-cardinality text columns
+COORDINATE_COLUMNS = ('Latitude', 'Longitude')
+CATEGORICAL_COLUMNS = ('Salesman', 'NAMA SALESMAN', 'DAY')
+DEFAULT_COORDINATE_DTYPE = 'float64'  # float32 saves memory but rounds coordinates to ~1 m
+SCHEMA_VERSION = 1  # Bump when the schema changes so cached Parquet files are re-parsed
+
+CSV_CHUNK_ROWS = 100000
+
+# Parsed uploads are kept as Parquet keyed by the file hash, so re-uploads and reruns skip parsing
+# Files read with a source (a sheet URL, a batch input path) keep only the latest version of that source
+INGEST_CACHE_DIR = os.environ.get('INGEST_CACHE_DIR', os.path.join('.cache', 'ingest'))
+
+# python-calamine reads xlsx several times faster than openpyxl, used when installed
+EXCEL_ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+
+# Function to get the content hash of an uploaded file
+def file_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+# Function to cast the declared schema columns that are present: coordinates to numbers, text columns to categories
+def apply_schema(df, coordinate_dtype=DEFAULT_COORDINATE_DTYPE):
+    for column in COORDINATE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(coordinate_dtype)
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+# Function to read a CSV in chunks, casting each chunk to the schema so the full object-dtype frame never exists
+def read_csv_chunks(source, coordinate_dtype=DEFAULT_COORDINATE_DTYPE, chunk_rows=CSV_CHUNK_ROWS):
+    chunks = [apply_schema(chunk, coordinate_dtype) for chunk in pd.read_csv(source, chunksize=chunk_rows)]
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+
+    # Chunks have their own categories, merge them into one categorical per column
+    columns = {}
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            try:
+                columns[column] = pd.Series(union_categoricals([chunk[column] for chunk in chunks], sort_categories=True))
+            except TypeError:  # Categories of different types, e.g. a chunk where the column is empty
+                columns[column] = pd.concat([chunk[column].astype(object) for chunk in chunks], ignore_index=True).astype('category')
+        else:
+            columns[column] = pd.concat([chunk[column] for chunk in chunks], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+# Function to read an Excel workbook with the fastest available engine
+def read_excel_fast(source, coordinate_dtype=DEFAULT_COORDINATE_DTYPE):
+    return apply_schema(pd.read_excel(source, engine=EXCEL_ENGINE), coordinate_dtype)
+
+
+# Function to read an uploaded CSV or Excel file (bytes) into a typed DataFrame
+# The parsed frame is cached as Parquet under the file hash; df.attrs['ingest'] reports the timing and
+# memory of every stage, and whether the parse was served from the cache
+# With a source, the cached versions of that source are prefixed by its hash and superseded versions are deleted
+def read_table(data, file_name, coordinate_dtype=DEFAULT_COORDINATE_DTYPE, cache_dir=INGEST_CACHE_DIR, source=None):
+    stages = []
+
+    start = time.perf_counter()
+    digest = file_hash(data)
+    stages.append({'stage': 'hash', 'seconds': time.perf_counter() - start, 'bytes': len(data)})
+
+    cache_path = None
+    source_prefix = None if source is None else f"{hashlib.sha1(str(source).encode()).hexdigest()[:16]}-"
+    if cache_dir and PARQUET_AVAILABLE:
+        cache_path = os.path.join(cache_dir, f"{source_prefix or ''}{digest}-{coordinate_dtype}-v{SCHEMA_VERSION}.parquet")
+        if os.path.exists(cache_path):
+            start = time.perf_counter()
+            df = pd.read_parquet(cache_path)
+            stages.append(_stage_stats('cache read', start, df))
+            return _with_report(df, file_name, digest, True, stages)
+
+    start = time.perf_counter()
+    if file_name.endswith('.csv'):
+        df = read_csv_chunks(io.BytesIO(data), coordinate_dtype)
+    else:
+        df = read_excel_fast(io.BytesIO(data), coordinate_dtype)
+    stages.append(_stage_stats('parse', start, df))
+
+    if cache_path is not None:
+        start = time.perf_counter()
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            df.to_parquet(cache_path + '.tmp', index=False)
+            os.replace(cache_path + '.tmp', cache_path)
+            stages.append({'stage': 'cache write', 'seconds': time.perf_counter() - start,
+                           'bytes': os.path.getsize(cache_path)})
+        except (OSError, ValueError, TypeError):
+            pass  # Mixed-type columns Parquet cannot store, serve the parsed frame uncached
+        else:
+            if source_prefix is not None:
+                _prune_source(cache_dir, source_prefix, cache_path)
+    return _with_report(df, file_name, digest, False, stages)
+
+
+# Delete the cached versions of a source other than keep_path
+def _prune_source(cache_dir, source_prefix, keep_path):
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(source_prefix) and name.endswith('.parquet') and path != keep_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _stage_stats(stage, start, df):
+    return {'stage': stage, 'seconds': time.perf_counter() - start, 'rows': len(df),
+            'bytes': int(df.memory_usage(deep=True).sum())}
+
+
+def _with_report(df, file_name, digest, cached, stages):
+    df.attrs['ingest'] = {'file_name': file_name, 'hash': digest, 'cached': cached, 'stages': stages}
+    return df
+
+
+# Function to format the ingest report of a frame as one line for the UI
+def ingest_summary(df):
+    report = df.attrs.get('ingest')
+    if not report:
+        return ""
+    stages = ", ".join(f"{stage['stage']} {stage['seconds']:.2f} s" for stage in report['stages'])
+    memory = df.memory_usage(deep=True).sum() / (1024 * 1024)
+    source = "Parquet cache" if report['cached'] else "parsed"
+    return f"{report['file_name']}: {len(df)} rows, {memory:.1f} MB in memory ({source}: {stages})"
@@ -0,0 +1,189 @@
+import cProfile
+import importlib.util
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Per-run instrumentation of the dashboards: stage timers, counters (HTTP calls, cache hits, rows processed)
+# and an opt-in profile of one run. Finished runs are kept in memory, appended as JSON lines to METRICS_LOG
+# when it is set, and served as JSON on http://127.0.0.1:METRICS_PORT/metrics when the port is set
+METRICS_LOG = os.environ.get('METRICS_LOG')  # e.g. .cache/metrics.jsonl
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))  # 0 disables the endpoint
+RECENT_RUNS = 100  # Finished runs kept for the endpoint
+
+# pyinstrument gives a readable call tree with little overhead, used when installed
+PROFILERS = ('cProfile', 'pyinstrument') if importlib.util.find_spec('pyinstrument') else ('cProfile',)
+PROFILE_LINES = 40  # Functions listed in a cProfile report
+
+_recent_runs = deque(maxlen=RECENT_RUNS)
+_recent_runs_lock = threading.Lock()
+_active_profilers = {}  # Thread id -> profiler of a run that was interrupted before it finished
+
+
+# Profiler of one run (cProfile or pyinstrument), stop() returns the report as text
+class RunProfiler:
+    def __init__(self, kind='cProfile'):
+        self.kind = kind
+        if kind == 'pyinstrument':
+            from pyinstrument import Profiler
+            self._profiler = Profiler()
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        # A Streamlit rerun interrupts the script, stop the profiler such a run left behind on this thread
+        leftover = _active_profilers.pop(threading.get_ident(), None)
+        if leftover is not None:
+            leftover.stop()
+        if self.kind == 'pyinstrument':
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+        _active_profilers[threading.get_ident()] = self
+
+    def stop(self):
+        _active_profilers.pop(threading.get_ident(), None)
+        if self.kind == 'pyinstrument':
+            self._profiler.stop()
+            return self._profiler.output_text(unicode=True, color=False)
+        self._profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(self._profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        return output.getvalue()
+
+
+# Metrics of one run of a page: timed stages, counters, deltas of the watched components' counters and
+# the profile report when the run was profiled
+class RunMetrics:
+    def __init__(self, page, profiler=None):
+        self.page = page
+        self.started_at = time.time()
+        self.stages = []
+        self.counters = {}
+        self.seconds = None
+        self.profile = None
+        self._start = time.perf_counter()
+        self._watched = {}
+        self._profiler = None
+        if profiler:
+            try:
+                self._profiler = RunProfiler(profiler)
+                self._profiler.start()
+            except (ImportError, ValueError) as error:  # e.g. another profiler is already active
+                self._profiler = None
+                self.profile = f"{profiler} unavailable: {error}"
+
+    # Context manager timing one stage of the run, rows is the number of rows the stage processed
+    @contextmanager
+    def stage(self, name, rows=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, start, rows)
+
+    # Function to record a stage that started at `start` (time.perf_counter()) and ends now
+    def record_stage(self, name, start, rows=None):
+        record = {'stage': name, 'seconds': time.perf_counter() - start}
+        if rows is not None:
+            record['rows'] = int(rows)
+        self.stages.append(record)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    # Function to report the change of a component's counters (any object with stats()) over the run
+    def watch(self, name, component):
+        if component is not None:
+            self._watched[name] = (component, _numeric(component.stats()))
+
+    # Function to close the run: collect the counter deltas, stop the profiler and publish the run
+    def finish(self):
+        if self.seconds is not None:
+            return self
+        self.seconds = time.perf_counter() - self._start
+        for name, (component, before) in self._watched.items():
+            after = _numeric(component.stats())
+            for key, value in after.items():
+                delta = value - before.get(key, 0)
+                if delta:
+                    self.counters[f"{name} {key}"] = delta
+        if self._profiler is not None:
+            self.profile = self._profiler.stop()
+            self._profiler = None
+        publish_run(self)
+        return self
+
+    def to_dict(self):
+        return {'page': self.page, 'started_at': self.started_at, 'seconds': self.seconds,
+                'stages': self.stages, 'counters': self.counters, 'profiled': self.profile is not None}
+
+    # Function to describe the run in one line for the UI
+    def describe(self):
+        slowest = max(self.stages, key=lambda stage: stage['seconds'], default=None)
+        text = f"{self.page}: {self.seconds or 0:.2f} s, {len(self.stages)} stages"
+        if slowest is not None:
+            text += f", slowest {slowest['stage']} ({slowest['seconds']:.2f} s)"
+        return text
+
+
+def _numeric(stats):
+    return {key: value for key, value in stats.items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+# Function to keep a finished run for the metrics endpoint and append it to the JSON log
+def publish_run(metrics):
+    record = metrics.to_dict()
+    with _recent_runs_lock:
+        _recent_runs.append(record)
+        if METRICS_LOG:
+            try:
+                os.makedirs(os.path.dirname(METRICS_LOG) or '.', exist_ok=True)
+                with open(METRICS_LOG, 'a') as f:
+                    f.write(json.dumps(record, default=str) + '\n')
+            except OSError:
+                pass  # Metrics must never break the page
+
+
+def recent_runs():
+    with _recent_runs_lock:
+        return list(_recent_runs)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        data = json.dumps({'runs': recent_runs()}, default=str).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+# Function to start the process-wide local metrics endpoint once, None when disabled or the port is taken
+def start_metrics_server(port=METRICS_PORT):
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server is None and port:
+            try:
+                _metrics_server = ThreadingHTTPServer(('127.0.0.1', port), _MetricsHandler)
+            except OSError:
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name='metrics-endpoint', daemon=True).start()
+        return _metrics_server
@@ -3,8 +3,16 @@ import pandas as pd
 import streamlit as st
 import folium
 from folium.plugins import MarkerCluster
-from sklearn.cluster import KMeans
 from PIL import Image
+import time
+import numpy as np
+from boundary_layers import DEFAULT_BOUNDARY_FILE, boundary_geojson, list_boundary_files, load_boundary_layer
+from clustering import CLUSTER_ENGINES, OnlineAssigner, cluster_summary, coordinates_hash, fit_clusters
+from debug_panel import show_debug_panel, start_run
+from ingestion import ingest_summary, read_table
+from map_layers import COLORED_MARKER_CALLBACK, add_fast_markers, add_grouped_lines, payload_size, use_high_volume
+from scheduling import frame_hash
+from territory import DEFAULT_TOLERANCE, WORKLOAD_METRICS, rebalance_territories
 
 img = Image.open('Nestle_Logo.png')
 st.set_page_config(page_title="Salesman Outlet Management Tool", page_icon=img)
@@ -13,8 +21,19 @@ def load_data():
     # Load or initialize your dataframe here
     return pd.DataFrame()
 
+# Fitted clustering models are cached across reruns and only re-fitted when the coordinates, cluster count or engine change
+@st.cache_resource(max_entries=8, show_spinner="Clustering outlets...")
+def cached_cluster_model(coords_hash, _coords, n_clusters, engine, _init_centers=None):
+    return fit_clusters(_coords, n_clusters, engine=engine, init_centers=_init_centers)
+
+# Territory proposals are cached per outlets, salesmen and settings so reruns (e.g. toggling the map) are free
+@st.cache_data(max_entries=8, show_spinner="Rebalancing territories...")
+def cached_territory_plan(data_hash, _coords, _salesmen, metric, target, tolerance):
+    return rebalance_territories(_coords, _salesmen, metric=metric, targets=target or None, tolerance=tolerance)
+
 def main():
     st.title("🌏Outlet Management Tools")
+    metrics = start_run('main_app')
     
     # Load data
     df = load_data()
@@ -22,18 +41,22 @@ def main():
     # Initialize session state
     if 'new_outlets' not in st.session_state:
         st.session_state.new_outlets = []
+    # New outlets before refit_count are part of the fitted clusters, later ones were assigned online
+    if 'refit_count' not in st.session_state:
+        st.session_state.refit_count = 0
 
     # Step 1: Allow users to upload a sales database file (Excel or CSV format)
     uploaded_file = st.file_uploader("Upload Sales Database (Excel or CSV)", type=["xlsx", "csv"])
 
     if uploaded_file is not None:
-        if uploaded_file.name.endswith('.xlsx'):
-            new_data = pd.read_excel(uploaded_file)
-        else:
-            new_data = pd.read_csv(uploaded_file)
+        # Typed read, cached as Parquet under the file hash so reruns skip parsing
+        with metrics.stage('ingest'):
+            new_data = read_table(uploaded_file.getvalue(), uploaded_file.name)
+        metrics.count('ingest cache hits', int(new_data.attrs['ingest']['cached']))
+        st.caption(ingest_summary(new_data))
 
         # Concatenate the new data with existing dataframe
-        df = pd.concat([df, new_data], ignore_index=True)
+        df = pd.concat([df, new_data], ignore_index=True) if not df.empty else new_data
 
     # Display the dropdown widget
     options = ['Density Base Map','Salesman Base Map']
@@ -42,14 +65,46 @@ def main():
 
     default_num = 7
     number = st.number_input("Enter number of cluster:",value=default_num, step=1)
+    cluster_engine = st.selectbox("Clustering engine:", CLUSTER_ENGINES)
+    boundary_path = st.selectbox("Boundary layer:", list_boundary_files() or [DEFAULT_BOUNDARY_FILE])
 
     # Step 2: Cluster the initial outlets and calculate centroids
-    if st.session_state.new_outlets:
-        new_outlets_df = pd.DataFrame(st.session_state.new_outlets)
-        df = pd.concat([df, new_outlets_df], ignore_index=True)
+    # Outlets added after the last refit are appended after the fitted rows and labelled by the online assigner
+    fitted_outlets = st.session_state.new_outlets[:st.session_state.refit_count]
+    online_outlets = st.session_state.new_outlets[st.session_state.refit_count:]
+    if fitted_outlets:
+        df = pd.concat([df, pd.DataFrame(fitted_outlets)], ignore_index=True)
+    fitted_rows = len(df)
+    if online_outlets:
+        df = pd.concat([df, pd.DataFrame(online_outlets)], ignore_index=True)
 
     # Continue with your clustering logic only if the dataframe is not empty
     if not df.empty:
+        # Territory rebalancing: propose moving boundary outlets between salesmen to even out their workloads
+        st.sidebar.markdown("## Rebalance Territories")
+        workload_metric = st.sidebar.selectbox("Balance workload on:", WORKLOAD_METRICS)
+        workload_target = st.sidebar.number_input("Target per salesman (0 = even share):", min_value=0.0, value=0.0, step=10.0)
+        tolerance = st.sidebar.number_input("Tolerance (%):", min_value=0.0, max_value=100.0, value=DEFAULT_TOLERANCE * 100, step=1.0)
+        # Ordered content hash of the outlets and their salesmen, a swap of salesmen between rows changes it
+        territory_key = (frame_hash(df[['Latitude', 'Longitude', 'Salesman']].astype({'Salesman': str})),
+                         workload_metric, workload_target, tolerance)
+        if st.sidebar.button("Propose Rebalancing"):
+            st.session_state.territory_key = territory_key
+        if st.session_state.get('territory_key') == territory_key:
+            with metrics.stage('territory rebalancing', rows=len(df)):
+                plan = cached_territory_plan(territory_key[0], df[['Latitude', 'Longitude']].to_numpy(dtype=float),
+                                             df['Salesman'].to_numpy(dtype=object), workload_metric, workload_target,
+                                             tolerance / 100)
+            st.sidebar.caption(plan.describe())
+            with st.sidebar.expander("Workload before / after"):
+                st.dataframe(plan.stats.round(1), hide_index=True)
+            diff = plan.diff(df['Outlet'] if 'Outlet' in df else None)
+            with st.sidebar.expander(f"Reassigned outlets ({len(diff)})"):
+                st.dataframe(diff, hide_index=True)
+            st.sidebar.download_button("Download Reassignments", diff.to_csv(index=False), file_name="territory_reassignments.csv", mime="text/csv")
+            if st.sidebar.checkbox("Show proposed territories on the map"):
+                df = df.assign(Salesman=plan.salesmen)
+
         # Continue with your clustering logic
         unique_salesmen = df['Salesman'].unique()
         colors = ['blue', 'green', 'red', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'darkgreen']
@@ -61,98 +116,122 @@ def main():
             #cluster_sales = 3*len(unique_salesmen)
             #cluster_sales = 17 #Number of Admn Reg. Covered by RMS
             cluster_sales = number
-        kmeans_model = KMeans(n_clusters=cluster_sales, random_state=42).fit(df[['Latitude', 'Longitude']])
-        initial_kmeans_labels = kmeans_model.predict(df[['Latitude', 'Longitude']])
-        initial_centroids = kmeans_model.cluster_centers_
-
-        initial_centroid_salesman = {tuple(centroid): salesman for centroid, salesman in zip(initial_centroids, unique_salesmen)}
-
-        # GeoJSON file path for KECAMATAN borders
-        bekasi_geojson_path = "kabkot_bekasi.geojson"
-
+        # Warm-start from the previous centroids when the data changed but the number of clusters did not
+        coords = df[['Latitude', 'Longitude']].to_numpy(dtype=float)
+        fitted_coords = coords[:fitted_rows]
+        fitted_hash = coordinates_hash(fitted_coords)
+        previous_centers = st.session_state.get('cluster_centers')
+        metrics.count('rows', len(df))
+        with metrics.stage('clustering', rows=len(fitted_coords)):
+            kmeans_model = cached_cluster_model(fitted_hash, fitted_coords, int(cluster_sales), cluster_engine, previous_centers)
+        st.session_state.cluster_centers = kmeans_model.cluster_centers_
+        st.caption(f"Clustering engine: {kmeans_model.engine} - fitted {len(fitted_coords)} outlets in {kmeans_model.fit_seconds:.3f} s")
+
+        # Rebuild the online assigner whenever the model was (re)fitted and replay the outlets added since
+        model_key = (fitted_hash, int(cluster_sales), cluster_engine)
+        if st.session_state.get('assigner_key') != model_key:
+            with metrics.stage('online assignment', rows=len(coords) - fitted_rows):
+                assigner = OnlineAssigner.from_model(kmeans_model, fitted_coords, df['Salesman'].iloc[:fitted_rows].tolist())
+                online_labels = assigner.add(coords[fitted_rows:], salesmen=df['Salesman'].iloc[fitted_rows:].tolist())
+            st.session_state.online_assigner = assigner
+            st.session_state.online_labels = list(online_labels)
+            st.session_state.assigner_key = model_key
+        assigner = st.session_state.online_assigner
+        initial_kmeans_labels = np.concatenate([kmeans_model.labels_, np.asarray(st.session_state.online_labels, dtype=np.int64)])
+        initial_centroids = assigner.centers
+
+        # Per-cluster summary: centre, most appearing salesman of its outlets and vote counts
+        # Clusters without outlets keep the salesman in the same position as before
+        with metrics.stage('cluster summary', rows=len(df)):
+            summary = cluster_summary(initial_kmeans_labels, df['Salesman'], initial_centroids, unique_salesmen)
+        st.session_state.cluster_summary = summary
+
+        # Region borders: parsed once per file, simplified for the map zoom and served pre-serialised as a single
+        # GeoJson layer; per-region toggle layers (one GeoJson element, style and tooltip per KECAMATAN) are not
+        # kept, the LayerControl toggles all borders at once
+        stage_start = time.perf_counter()
         center_lat = df['Latitude'].mean()
         center_lon = df['Longitude'].mean()
         m = folium.Map(location=[center_lat, center_lon], zoom_start=10)
 
-        # Load GeoJSON data
-        bekasi_geojson = folium.GeoJson(bekasi_geojson_path)
-
-        # Create a dictionary to store GeoJSON layers for each KECAMATAN
-        kecamatan_layers = {}
-
-        for feature in bekasi_geojson.data['features']:
-            kecamatan = feature['properties']['KECAMATAN']
-            if kecamatan not in kecamatan_layers:
-                kecamatan_layers[kecamatan] = folium.GeoJson(
-                    {
-                        "type": "FeatureCollection",
-                        "features": [feature]
-                    },
-                    name=f'Kecamatan - {kecamatan}',
-                    style_function=lambda feature: {
-                        'fillColor': 'white',
-                        'color': 'navy',
-                        'weight': 1.5
-                    },
-                    tooltip=folium.GeoJsonTooltip(fields=['KECAMATAN', 'Shape_Area'],
-                                                   aliases=['Kecamatan', 'Area'],
-                                                   labels=True,
-                                                   sticky=True)
-                ).add_to(m)
-
-        marker_cluster = MarkerCluster().add_to(m)
-
-        # Create a dictionary to store the salesman color
-        salesman_color_dict = {salesman: color for salesman, color in salesman_mapping.items()}
+        boundary_layer = load_boundary_layer(boundary_path)
+        tooltip_fields = boundary_layer.tooltip_fields()
+        folium.GeoJson(
+            boundary_geojson(boundary_path, zoom=10),
+            name=f'{boundary_layer.label} borders',
+            style_function=lambda feature: {
+                'fillColor': 'white',
+                'color': 'navy',
+                'weight': 1.5
+            },
+            tooltip=folium.GeoJsonTooltip(fields=tooltip_fields,
+                                           aliases=[{'Shape_Area': 'Area'}.get(field, field.title()) for field in tooltip_fields],
+                                           labels=True,
+                                           sticky=True)
+        ).add_to(m)
+        metrics.record_stage('boundary layer', stage_start)
+
+        # Tag every outlet with the region it lies in
+        with metrics.stage('region tagging', rows=len(df)):
+            df[boundary_layer.label] = boundary_layer.locate(df['Latitude'], df['Longitude'])
+
+        # Map every outlet to its salesman colour and centroid with array lookups
+        stage_start = time.perf_counter()
         default_color = 'gray'  # Assign a default color for outlets without a specified salesman
+        salesman_codes = np.where(df['Salesman'].notna(), pd.Index(unique_salesmen).get_indexer(df['Salesman']), -1)
+        color_lookup = np.array(colors, dtype=object)[np.arange(len(unique_salesmen)) % len(colors)]
+        outlet_colors = np.where(salesman_codes >= 0, color_lookup[salesman_codes], default_color)
+        outlet_coords = df[['Latitude', 'Longitude']].to_numpy(dtype=float)
+        outlet_centers = initial_centroids[initial_kmeans_labels]
+        popup_texts = df['Outlet'].astype(str) + " - " + df['Salesman'].astype(str)
 
-        # Create a dictionary to store the most appearing salesman for each center coordinate
-        center_salesman = {}
-
-        # Iterate through the outlets and calculate the most appearing salesman for each center coordinate
-        for i, row in df.iterrows():
-            center_coords = tuple(initial_centroids[initial_kmeans_labels[i]])  # Convert NumPy array to tuple
-            salesman_name = row['Salesman']
-            if center_coords not in center_salesman:
-                center_salesman[center_coords] = {}
-            center_salesman[center_coords][salesman_name] = center_salesman[center_coords].get(salesman_name, 0) + 1
-
-        # Assign the most appearing salesman for each center coordinate
-        for centroid, salesmen_count in center_salesman.items():
-            most_appearing_salesman = max(salesmen_count, key=salesmen_count.get)
-            initial_centroid_salesman[centroid] = most_appearing_salesman
+        # Large outlet files are drawn in high-volume mode: markers as one client-side styled payload
+        # and the outlet to centroid lines as one MultiLineString per salesman
+        high_volume = use_high_volume(len(df))
 
         # Plot the markers, polylines, and assign salesman for center coordinates
-        for i, row in df.iterrows():
-            salesman_name = row['Salesman']
-            salesman_color = salesman_color_dict.get(salesman_name, default_color)  # Use default color for missing salesman
-            popup_text = f"{row['Outlet']} - {salesman_name}"
-            folium.Marker(
-                location=[row['Latitude'], row['Longitude']],
-                popup=popup_text,
-                icon=folium.Icon(color=salesman_color)
-            ).add_to(marker_cluster)
-
-        for centroid, salesman in initial_centroid_salesman.items():
-            color = salesman_mapping[salesman]
+        if high_volume:
+            add_fast_markers(m, outlet_coords, popup_texts, outlet_colors, callback=COLORED_MARKER_CALLBACK)
+        else:
+            marker_cluster = MarkerCluster().add_to(m)
+            for location, popup_text, salesman_color in zip(outlet_coords.tolist(), popup_texts, outlet_colors):
+                folium.Marker(
+                    location=location,
+                    popup=popup_text,
+                    icon=folium.Icon(color=salesman_color)
+                ).add_to(marker_cluster)
+
+        salesman_index = {salesman: i for i, salesman in enumerate(unique_salesmen)}
+        for centroid_lat, centroid_lon, salesman in zip(summary['Latitude'], summary['Longitude'], summary['Salesman']):
+            # Clusters without outlets beyond the number of salesmen have no salesman and are not drawn
+            if salesman is None:
+                continue
+            color = salesman_mapping.get(salesman, default_color)
             folium.Marker(
-                location=centroid,
-                popup=f"Salesman - {salesman} - {unique_salesmen.tolist().index(salesman)}",
+                location=(centroid_lat, centroid_lon),
+                popup=f"Salesman - {salesman} - {salesman_index.get(salesman, '-')}",
                 icon=folium.Icon(color=color)
             ).add_to(m)
 
-        for i, row in df.iterrows():
-            outlet_coords = [row['Latitude'], row['Longitude']]
-            salesman_center_coords = initial_centroids[initial_kmeans_labels[i]]
-            salesman_color = salesman_color_dict.get(row['Salesman'], default_color)  # Use default color for missing salesman
-            folium.PolyLine([outlet_coords, salesman_center_coords], color=salesman_color, weight=3, opacity=0.5).add_to(m)
+        if high_volume:
+            salesman_groups = df['Salesman'].astype(str).to_numpy()
+            group_colors = dict(zip(salesman_groups, outlet_colors))
+            add_grouped_lines(m, outlet_coords, outlet_centers, salesman_groups, group_colors, weight=3, opacity=0.5)
+        else:
+            for location, center, salesman_color in zip(outlet_coords.tolist(), outlet_centers.tolist(), outlet_colors):
+                folium.PolyLine([location, center], color=salesman_color, weight=3, opacity=0.5).add_to(m)
 
-        # Add layer control for KECAMATAN layers
+        # Add layer control: the region borders are one layer (toggled as a whole) next to the base map
         folium.LayerControl().add_to(m)
+        metrics.record_stage('map build', stage_start, rows=len(df))
 
         # Display the map
         st.markdown(f"## Salesman Coverage Map")
-        st.components.v1.html(m._repr_html_(), width=700, height=500)
+        with metrics.stage('map serialisation'):
+            map_html = m._repr_html_()
+        metrics.count('map payload bytes', len(map_html.encode('utf-8')))
+        st.components.v1.html(map_html, width=700, height=500)
+        st.caption(f"Map payload: {payload_size(map_html)} ({'high-volume' if high_volume else 'standard'} rendering)")
 
         # Step 3: Accept new longitude, latitude, and outlet information from the user
         st.sidebar.markdown("## Add New Outlet")
@@ -160,19 +239,57 @@ def main():
         new_outlet_longitude = st.sidebar.number_input("Enter the longitude of the outlet:", format="%.4f")
         new_outlet_latitude = st.sidebar.number_input("Enter the latitude of the outlet:", format="%.4f")
 
+        # Salesman suggested for each cluster label
+        cluster_salesman = summary['Salesman'].tolist()
+
         if st.sidebar.button("Add Outlet"):
             new_outlet = {'Outlet': new_outlet_name, 'Longitude': new_outlet_longitude, 'Latitude': new_outlet_latitude}
 
-            # Determine the suggested salesman for the new outlet based on proximity
-            nearest_salesman_idx = kmeans_model.predict([[new_outlet_latitude, new_outlet_longitude]])[0]
-            suggested_salesman = initial_centroid_salesman[tuple(kmeans_model.cluster_centers_[nearest_salesman_idx])]
+            # Determine the suggested salesman for the new outlet based on proximity, without refitting
+            start = time.perf_counter()
+            nearest_salesman_idx = assigner.predict([[new_outlet_latitude, new_outlet_longitude]])[0][0]
+            suggested_salesman = cluster_salesman[nearest_salesman_idx]
+            assigner.add([[new_outlet_latitude, new_outlet_longitude]], labels=[nearest_salesman_idx], salesmen=[suggested_salesman])
+            st.session_state.last_assignment_ms = (time.perf_counter() - start) * 1000
             new_outlet['Salesman'] = suggested_salesman
 
             st.session_state.new_outlets.append(new_outlet)
+            st.session_state.online_labels.append(int(nearest_salesman_idx))
+
+            # Ask for a full refit once the online updates drifted too far from the fitted clusters
+            if assigner.needs_refit():
+                st.session_state.refit_count = len(st.session_state.new_outlets)
 
             # Refresh the page to update the map with the new outlet
             st.experimental_rerun()
 
+        # Bulk add new outlets from a CSV file (Outlet, Latitude, Longitude) through the same online assignment
+        bulk_file = st.sidebar.file_uploader("Bulk add outlets (CSV with Outlet, Latitude, Longitude)", type=["csv"])
+        if bulk_file is not None and st.sidebar.button("Assign Uploaded Outlets"):
+            bulk_outlets = pd.read_csv(bulk_file).dropna(subset=['Latitude', 'Longitude'])
+            start = time.perf_counter()
+            bulk_coords = bulk_outlets[['Latitude', 'Longitude']].to_numpy(dtype=float)
+            bulk_labels = assigner.predict(bulk_coords)[0]
+            bulk_salesmen = [cluster_salesman[label] for label in bulk_labels]
+            assigner.add(bulk_coords, labels=bulk_labels, salesmen=bulk_salesmen)
+            st.session_state.last_assignment_ms = (time.perf_counter() - start) * 1000
+
+            for outlet, latitude, longitude, salesman in zip(bulk_outlets['Outlet'], bulk_coords[:, 0], bulk_coords[:, 1], bulk_salesmen):
+                st.session_state.new_outlets.append({'Outlet': outlet, 'Longitude': longitude, 'Latitude': latitude, 'Salesman': salesman})
+            st.session_state.online_labels.extend(int(label) for label in bulk_labels)
+
+            if assigner.needs_refit():
+                st.session_state.refit_count = len(st.session_state.new_outlets)
+            st.rerun()
+
+        if 'last_assignment_ms' in st.session_state:
+            st.sidebar.caption(f"Last assignment took {st.session_state.last_assignment_ms:.1f} ms - centroid drift {assigner.drift_km():.2f} km")
+        if st.sidebar.button("Refit Clusters"):
+            st.session_state.refit_count = len(st.session_state.new_outlets)
+            st.rerun()
+
+        st.sidebar.download_button("Download Cluster Summary", summary.to_csv(index=False), file_name="cluster_summary.csv", mime="text/csv")
+
     else:
         st.warning("Please upload a sales database file.")
 
@@ -187,5 +304,7 @@ def main():
 <a href="mailto:Kemal.Ardaffa@id.nestle.com">Kemal.Ardaffa@id.nestle.com <br>
 <a href="mailto:Farah.Risha@id.nestle.com">Farah.Risha@id.nestle.com</a></p>""", unsafe_allow_html=True)
 
+    show_debug_panel(metrics)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,76 @@
+import os
+
+import folium
+import numpy as np
+from folium.plugins import FastMarkerCluster
+
+# Maps with more outlets than this switch to high-volume rendering: one FastMarkerCluster payload for the
+# markers, styled in the browser, and one MultiLineString per group for the lines
+HIGH_VOLUME_ROWS = int(os.environ.get('MAP_HIGH_VOLUME_ROWS', 2000))
+
+# Decimals kept for coordinates sent to the browser (6 decimals is ~0.1 m)
+COORDINATE_DECIMALS = 6
+
+# Client-side marker for rows [lat, lon, popup, color], the same coloured pin folium.Icon draws
+COLORED_MARKER_CALLBACK = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon({markerColor: row[3], iconColor: 'white', icon: 'info-sign', prefix: 'glyphicon'});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2]);
+    return marker;
+}"""
+
+# Client-side marker for rows [lat, lon, popup, visit order], the same numbered circle as create_visit_order_icon
+VISIT_ORDER_MARKER_CALLBACK = """
+function (row) {
+    var icon = L.divIcon({className: 'empty', html: '<div style="font-size: 12pt; color: white; background-color: #645440; '
+        + 'border-radius: 50%; width: 20px; height: 20px; line-height: 20px; text-align: center;">' + row[3] + '</div>'});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2]);
+    return marker;
+}"""
+
+
+# Function to tell whether a map with n_rows outlets should be drawn in high-volume mode
+def use_high_volume(n_rows, threshold=None):
+    return n_rows > (HIGH_VOLUME_ROWS if threshold is None else threshold)
+
+
+# Function to add every marker as one FastMarkerCluster payload
+# coords is (n, 2) lat/lon, extra holds the per-marker values the callback reads after lat/lon (popup, color, ...)
+def add_fast_markers(parent, coords, *extra, callback=COLORED_MARKER_CALLBACK, name=None):
+    coords = np.round(np.asarray(coords, dtype=np.float64).reshape(-1, 2), COORDINATE_DECIMALS).tolist()
+    columns = [np.asarray(values).tolist() for values in extra]
+    rows = [[*point, *values] for point, *values in zip(coords, *columns)]
+    return FastMarkerCluster(rows, callback=callback, name=name).add_to(parent)
+
+
+# Function to add straight lines from starts[i] to ends[i] as one MultiLineString feature per group
+# groups names the group of each line and colors maps a group to its line colour
+def add_grouped_lines(parent, starts, ends, groups, colors, weight=3, opacity=0.5, name=None):
+    starts = np.round(np.asarray(starts, dtype=np.float64).reshape(-1, 2), COORDINATE_DECIMALS)
+    ends = np.round(np.asarray(ends, dtype=np.float64).reshape(-1, 2), COORDINATE_DECIMALS)
+    # GeoJSON coordinates are [lon, lat]
+    segments = np.stack([starts[:, ::-1], ends[:, ::-1]], axis=1)
+    group_keys = np.asarray(groups, dtype=object).astype(str)
+
+    features = []
+    for group in dict.fromkeys(group_keys):
+        features.append({
+            'type': 'Feature',
+            'properties': {'group': group, 'color': colors[group]},
+            'geometry': {'type': 'MultiLineString', 'coordinates': segments[group_keys == group].tolist()},
+        })
+    return folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        name=name,
+        style_function=lambda feature: {'color': feature['properties']['color'], 'weight': weight, 'opacity': opacity},
+    ).add_to(parent)
+
+
+# Function to format the size of a rendered map so the payload of both rendering modes can be compared
+def payload_size(html):
+    size = len(html.encode('utf-8'))
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.2f} MB"
+    return f"{size / 1024:.1f} KB"
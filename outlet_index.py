@@ -0,0 +1,26 @@
+import numpy as np
+
+
+# Array-backed table of outlets: row id -> name and contiguous lat/lon arrays
+# Row ids follow the order of the source rows, so outlets sharing a name keep
+# their own row (and coordinates) instead of collapsing into the first match
+class OutletIndex:
+    def __init__(self, names, latitudes, longitudes):
+        self.names = [str(name) for name in names]
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        if not (len(self.names) == len(self.latitudes) == len(self.longitudes)):
+            raise ValueError("names, latitudes and longitudes must have the same length")
+        self.coords = np.column_stack([self.latitudes, self.longitudes])
+
+    # Function to build the index from a DataFrame holding name and coordinate columns
+    @classmethod
+    def from_frame(cls, df, name_column='NAMA TOKO', lat_column='Latitude', lon_column='Longitude'):
+        return cls(df[name_column].tolist(), df[lat_column].to_numpy(), df[lon_column].to_numpy())
+
+    def __len__(self):
+        return len(self.names)
+
+    # Function to get the (lat, lon) of a row id
+    def coordinate(self, row_id):
+        return (float(self.latitudes[row_id]), float(self.longitudes[row_id]))
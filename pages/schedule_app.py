@@ -1,353 +1,100 @@
-import streamlit as st
 import pandas as pd
-import folium
-from geopy.distance import geodesic
-import requests
-from polyline import decode
+import streamlit as st
+from day_assignment import BalancedDayPlanner
+from debug_panel import show_debug_panel, start_run
+from ingestion import ingest_summary, read_table
+from map_layers import payload_size
 from PIL import Image
-import threading
+from route_optimizer import RouteOptimizer
+from routing_client import get_routing_client
+from schedule_maps import get_map_store, load_schedule_map, start_background_render
+from scheduling import DEFAULT_OFFICE_COORD, DEFAULT_WORKERS, INCREMENTAL_MAX_CHANGED, changed_salesmen_share, default_limit, frame_hash, generate_scheduling, prepare_outlets, unassigned_outlets, update_scheduling
+from sheet_source import SheetSource, sheet_csv_url
 
 img = Image.open('Nestle_Logo.png')
 st.set_page_config(page_title="Salesman Outlet Management Tool", page_icon=img)
 
-# Function to calculate distance using geodesic distance (haversine formula)
-def calculate_distance(origin, destination):
-    return geodesic(origin, destination).kilometers
-
-def calculate_distances(origin, destination):
-    base_url = "http://router.project-osrm.org/route/v1/driving/"
-    params = f"{origin[1]},{origin[0]};{destination[1]},{destination[0]}"
-    response = requests.get(base_url + params)
-    if response.status_code == 200:
-        route_data = response.json()
-        if 'routes' in route_data and len(route_data['routes']) > 0:
-            return route_data['routes'][0]['distance'] / 1000  # Convert meters to kilometers
-    return None
-
-# Function to make API requests concurrently
-def make_api_requests(base_url, origins, destinations):
-    responses = []
-
-    # Function to make a single API request
-    def make_request(origin, destination):
-        response = requests.get(base_url + f"{origin[1]},{origin[0]};{destination[1]},{destination[0]}")
-        responses.append(response.json())
-
-    # Create threads for each API request
-    threads = []
-    for origin, destination in zip(origins, destinations):
-        thread = threading.Thread(target=make_request, args=(origin, destination))
-        threads.append(thread)
-        thread.start()
-
-    # Wait for all threads to finish
-    for thread in threads:
-        thread.join()
-
-    return responses
-
-def get_route_polyline(origin, destination):
-    base_url = "http://router.project-osrm.org/route/v1/driving/"
-    params = f"{origin[1]},{origin[0]};{destination[1]},{destination[0]}"
-    response = requests.get(base_url + params)
-    if response.status_code == 200:
-        route_data = response.json()
-        if 'routes' in route_data and len(route_data['routes']) > 0:
-            polyline = route_data['routes'][0]['geometry']
-            return decode(polyline)
-    return []
-
-# Function to generate scheduling with balanced visit orders across days
-def generate_scheduling(df, office_coord):
-    # Sort dataframe by 'NAMA SALESMAN' and 'NAMA TOKO' columns
-    df = df.sort_values(by=['NAMA SALESMAN', 'NAMA TOKO'])
-
-    # Get unique office location
-    office_location = office_coord
-
-    # Create a dictionary to store visit orders and distances
-    visit_orders = {}
-
-    # Generate visit orders for each salesman
-    for salesman, group in df.groupby('NAMA SALESMAN'):
-        visit_orders[salesman] = {}
-
-        # Initialize visit orders for each day
-        for day in group['DAY'].unique():
-            visit_orders[salesman][day] = {}
-
-        # Split outlets into days and find nearest outlet for each day
-        outlets = group['NAMA TOKO'].tolist()  # Get outlets for the current salesman
-        num_outlets = len(outlets)
-        day_counter = 0  # Initialize day counter
-        visit_order = 1  # Initialize visit order
-
-        while outlets:
-            current_day = group['DAY'].unique()[day_counter]
-
-            # Take up to limit(5) outlets for the current day
-            outlets_today = outlets[:limit]
-            outlets = outlets[limit:]
-
-            # Find nearest outlet from office and make it visit order 1
-            outlet_distances = {}
-            for outlet in outlets_today:
-                outlet_location = (round(group[group['NAMA TOKO'] == outlet]['Latitude'].iloc[0], 6), round(group[group['NAMA TOKO'] == outlet]['Longitude'].iloc[0], 6))
-                distance = calculate_distance(office_location, outlet_location)
-                outlet_distances[outlet] = distance
-
-            nearest_outlet = min(outlet_distances, key=outlet_distances.get)
-            visit_orders[salesman][current_day][1] = {'NAMA TOKO': nearest_outlet, 'Distance': outlet_distances[nearest_outlet],
-                                                       'Coordinates': (group[group['NAMA TOKO'] == nearest_outlet]['Latitude'].iloc[0],
-                                                                       group[group['NAMA TOKO'] == nearest_outlet]['Longitude'].iloc[0])}
-
-            # Remove the nearest outlet from the list of outlets
-            outlets_today.remove(nearest_outlet)
-
-            # Generate visit orders for the rest of the outlets
-            visit_order = 1  # Reset visit order for each new day
-            while outlets_today:
-                if visit_order > limit:
-                    visit_order = 1
-                    day_counter += 1
-                    if day_counter >= len(group['DAY'].unique()):  # If reached the last day, stop assigning visit orders
-                        break
-
-                # Get the location of the last assigned outlet
-                last_assigned_outlet = visit_orders[salesman][current_day][visit_order]['Coordinates']
-
-                # Initialize variables to track the nearest outlet and its distance
-                nearest_outlet = None
-                nearest_distance = float('inf')
-
-                # Find the nearest outlet relative to the last assigned outlet
-                for outlet in outlets_today:
-                    outlet_location = (group[group['NAMA TOKO'] == outlet]['Latitude'].iloc[0], group[group['NAMA TOKO'] == outlet]['Longitude'].iloc[0])
-                    distance = calculate_distance(last_assigned_outlet, outlet_location)
-
-                    # Update nearest outlet and distance if the current outlet is closer
-                    if distance < nearest_distance:
-                        nearest_outlet = outlet
-                        nearest_distance = distance
-
-                # Assign the nearest outlet to the current day and visit order
-                visit_orders[salesman][current_day][visit_order + 1] = {'NAMA TOKO': nearest_outlet, 'Distance': nearest_distance,
-                                                                       'Coordinates': (group[group['NAMA TOKO'] == nearest_outlet]['Latitude'].iloc[0],
-                                                                                       group[group['NAMA TOKO'] == nearest_outlet]['Longitude'].iloc[0])}
-                
-                # Remove the nearest outlet from the list of outlets
-                outlets_today.remove(nearest_outlet)
-
-                # Increment visit order
-                visit_order += 1
-
-            # Move to the next day
-            day_counter += 1
-
-    # Convert visit orders dictionary into a DataFrame
-    scheduling_data = []
-    for salesman, days_data in visit_orders.items():
-        for day, visit_orders in days_data.items():
-            for visit_order, data in visit_orders.items():
-                scheduling_data.append([salesman, day, visit_order, data['NAMA TOKO'], data['Distance'], data['Coordinates']])
-
-    scheduling_df = pd.DataFrame(scheduling_data, columns=['NAMA SALESMAN', 'Day', 'Visit Order', 'NAMA TOKO', 'Distance', 'Coordinates'])
-
-    # Merge scheduling_df with longitude and latitude columns
-    scheduling_df = pd.merge(scheduling_df, df[['NAMA TOKO', 'Latitude', 'Longitude']], on='NAMA TOKO')
-
-    return scheduling_df
-
-
 # Function to filter scheduling DataFrame by salesman
 def filter_schedule(scheduling_df, salesman):
     return scheduling_df[scheduling_df['NAMA SALESMAN'] == salesman]
 
-# Function to generate Folium map
-# Function to create a text-based icon for the visit order number
-def create_visit_order_icon(visit_order):
-    return folium.DivIcon(html=f'<div style="font-size: 12pt; color: white; background-color: #645440; border-radius: 50%; '
-                                f'width: 20px; height: 20px; line-height: 20px; text-align: center;">{visit_order}</div>')
-
-# Function to generate Folium map
-def generate_folium_map(df, filtered_schedule, office_latitude, office_longitude, map_width=800, map_height=600):
-    m = folium.Map(location=[office_latitude, office_longitude], zoom_start=10)
-
-    # Add marker for the office with emoji
-    folium.Marker(
-        location=[office_latitude, office_longitude],  # Corrected bracket placement
-        popup="PT. Rukun Mitra Sejati🏢",
-        icon=folium.Icon(color='green', icon='briefcase', prefix='fa')
-    ).add_to(m)
-
-    # Define colors for different days
-    day_colors = {'Monday': 'blue', 'Tuesday': 'green', 'Wednesday': 'red', 'Thursday': 'orange', 'Friday': 'purple'}
-
-    # Initialize variables to track previous outlet's day and visit order
-    prev_outlet_day = None
-    prev_outlet_visit_order = None
-    prev_outlet_location = None
-
-    # Add markers and connect with polyline
-    if not filtered_schedule.empty:
-        for _, row in filtered_schedule.iterrows():
-            outlet_name = row['NAMA TOKO']
-            outlet_lat = row['Latitude']
-            outlet_lon = row['Longitude']
-            day = row['Day']
-            visit_order = row['Visit Order']
-
-            # Assign color for marker and polyline based on day
-            marker_color = day_colors.get(day, 'navy')
-
-            # Create icon with visit order number
-            icon = create_visit_order_icon(visit_order)
-
-            # Add marker for outlet
-            popup_message = f"{outlet_name} \n Day: {day}"
-            folium.Marker(location=[outlet_lat, outlet_lon], popup=popup_message, icon=icon).add_to(m)
-
-            # Connect to previous outlet if in the same day and consecutive visit order
-            if prev_outlet_day == day and prev_outlet_visit_order == visit_order - 1:
-                # Get coordinates for the previous outlet
-                prev_outlet_lat = prev_outlet_location[0]
-                prev_outlet_lon = prev_outlet_location[1]
-
-                # Get route polyline from the previous outlet to the current outlet
-                locations = get_route_polyline((prev_outlet_lat, prev_outlet_lon), (outlet_lat, outlet_lon))
-
-                # If route is available, add polyline to the map
-                if locations:
-                    polyline_color = day_colors.get(day, 'navy')
-                    folium.PolyLine(locations=locations, color=polyline_color).add_to(m)
-
-            # Connect outlet with Visit Order 1 to office
-            if visit_order == 1:
-                polyline_color = marker_color
-                # Get route polyline from office to outlet
-                locations = get_route_polyline((office_latitude, office_longitude), (outlet_lat, outlet_lon))
-                if locations:
-                    folium.PolyLine(locations=locations, color=polyline_color).add_to(m)
-
-            # Update variables for next iteration
-            prev_outlet_day = day
-            prev_outlet_visit_order = visit_order
-            prev_outlet_location = (outlet_lat, outlet_lon)
-
-    else:  # If no outlets are visited
-        # Connect each standalone outlet to the office
-        for _, row in df.iterrows():
-            outlet_name = row['NAMA TOKO']
-            outlet_lat = row['Latitude']
-            outlet_lon = row['Longitude']
-            popup_message = f"{outlet_name} - Standalone Outlet"
-            folium.Marker(location=[outlet_lat, outlet_lon], popup=popup_message, icon=folium.Icon(color='gray')).add_to(m)
-            folium.PolyLine(locations=[(office_latitude, office_longitude), (outlet_lat, outlet_lon)], color='gray').add_to(m)
-
-    # Create HTML string for the map
-    m_html = m._repr_html_()
-
-    # Adjust map size using custom CSS
-    m_html = f'<div style="width: {map_width}px; height: {map_height}px">{m_html}</div>'
-
-    return m_html
-
-
-# Function to filter scheduling DataFrame by salesman
-def filter_schedule(scheduling_df, salesman):
-    return scheduling_df[scheduling_df['NAMA SALESMAN'] == salesman]
-
-# Function to create a text-based icon for the visit order number
-def create_visit_order_icon(visit_order):
-    return folium.DivIcon(html=f'<div style="font-size: 12pt; color: white; background-color: #645440; border-radius: 50%; '
-                                f'width: 20px; height: 20px; line-height: 20px; text-align: center;">{visit_order}</div>')
-
-# Function to generate Folium map
-def generate_folium_map(df, filtered_schedule, office_latitude, office_longitude, map_width=800, map_height=600):
-    m = folium.Map(location=[office_latitude, office_longitude], zoom_start=10)
-
-    # Add marker for the office with emoji
-    folium.Marker(
-        location=[office_latitude, office_longitude],
-        popup="PT. RMS BEKASI🏢",
-        icon=folium.Icon(color='green', icon='briefcase', prefix='fa')
-    ).add_to(m)
-
-    # Define colors for different days
-    day_colors = {'Monday': 'blue', 'Tuesday': 'green', 'Wednesday': 'red', 'Thursday': 'orange', 'Friday': 'purple'}
-
-    # Initialize variables to track previous outlet's day and visit order
-    prev_outlet_day = None
-    prev_outlet_visit_order = None
-    prev_outlet_location = None
-
-    # Add markers and connect with polyline
-    if not filtered_schedule.empty:
-        for _, row in filtered_schedule.iterrows():
-            outlet_name = row['NAMA TOKO']
-            outlet_lat = row['Latitude']
-            outlet_lon = row['Longitude']
-            day = row['Day']
-            visit_order = row['Visit Order']
-
-            # Assign color for marker and polyline based on day
-            marker_color = day_colors.get(day, 'navy')
-
-            # Create icon with visit order number
-            icon = create_visit_order_icon(visit_order)
-
-            # Add marker for outlet
-            popup_message = f"{outlet_name} \n Day: {day}"
-            folium.Marker(location=[outlet_lat, outlet_lon], popup=popup_message, icon=icon).add_to(m)
-
-            # Connect to previous outlet if in the same day and consecutive visit order
-            if prev_outlet_day == day and prev_outlet_visit_order == visit_order - 1:
-                # Get coordinates for the previous outlet
-                prev_outlet_lat = prev_outlet_location[0]
-                prev_outlet_lon = prev_outlet_location[1]
-
-                # Get route polyline from the previous outlet to the current outlet
-                locations = get_route_polyline((prev_outlet_lat, prev_outlet_lon), (outlet_lat, outlet_lon))
-
-                # If route is available, add polyline to the map
-                if locations:
-                    polyline_color = day_colors.get(day, 'navy')
-                    folium.PolyLine(locations=locations, color=polyline_color).add_to(m)
-
-            # Connect outlet with Visit Order 1 to office
-            if visit_order == 1:
-                polyline_color = marker_color
-                # Get route polyline from office to outlet
-                locations = get_route_polyline((office_latitude, office_longitude), (outlet_lat, outlet_lon))
-                if locations:
-                    folium.PolyLine(locations=locations, color=polyline_color).add_to(m)
-
-            # Update variables for next iteration
-            prev_outlet_day = day
-            prev_outlet_visit_order = visit_order
-            prev_outlet_location = (outlet_lat, outlet_lon)
-
-    else:  # If no outlets are visited
-        # Connect each standalone outlet to the office
-        for _, row in df.iterrows():
-            outlet_name = row['NAMA TOKO']
-            outlet_lat = row['Latitude']
-            outlet_lon = row['Longitude']
-            popup_message = f"{outlet_name} - Standalone Outlet"
-            folium.Marker(location=[outlet_lat, outlet_lon], popup=popup_message, icon=folium.Icon(color='gray')).add_to(m)
-            folium.PolyLine(locations=[(office_latitude, office_longitude), (outlet_lat, outlet_lon)], color='gray').add_to(m)
-
-    # Create HTML string for the map
-    m_html = m._repr_html_()
+# Cached pipeline stages, reused across Streamlit reruns so changing the filters only re-slices the schedule
+# The scheduling and map stages take frames as underscore (unhashed) arguments and are keyed on content hashes instead
+# The sheet source is shared by all sessions: it fetches once, then a background thread polls the sheet with
+# conditional requests and swaps in a new snapshot only when the content changed
+# The disk snapshot of a previous run is revalidated right away (a 304 when the sheet did not change) instead of
+# being served until the first poll
+@st.cache_resource(show_spinner="Loading Geotag Master Database...")
+def get_sheet_source(sheet_id):
+    source = SheetSource(sheet_csv_url(sheet_id))
+    source.fetch()
+    source.start()
+    return source
+
+@st.cache_data(max_entries=4, show_spinner="Reading uploaded file...")
+def load_upload(file_bytes, file_name):
+    return read_table(file_bytes, file_name)
+
+@st.cache_data(max_entries=8, show_spinner="Generating scheduling...")
+def cached_scheduling(_df, data_hash, office_coord, limit, optimize_routes, working_hours=None):
+    optimizer = RouteOptimizer() if optimize_routes else None
+    scheduling_df = generate_scheduling(_df, office_coord, limit, optimizer=optimizer, workers=DEFAULT_WORKERS,
+                                        planner=make_planner(working_hours))
+    return round_schedule(scheduling_df)
+
+# Function to get the balanced day planner for a working day length in hours, None keeps the days filled in order
+def make_planner(working_hours):
+    return BalancedDayPlanner(day_minutes=working_hours * 60) if working_hours else None
+
+# Function to round Latitude and Longitude columns to 6 decimal places
+def round_schedule(scheduling_df):
+    scheduling_df['Latitude'] = scheduling_df['Latitude'].round(6)
+    scheduling_df['Longitude'] = scheduling_df['Longitude'].round(6)
+    return scheduling_df
 
-    # Adjust map size using custom CSS
-    m_html = f'<div style="width: {map_width}px; height: {map_height}px">{m_html}</div>'
+# Function to get the schedule for the current data, repairing this session's previous schedule incrementally
+# when only some outlets of the same source changed, so salesmen whose territory did not change keep their
+# journey plan; another source, or a change touching most salesmen, is scheduled again in full
+# data_changes is (previous content hash, salesmen of the changed rows) when the source tracks its row changes (the
+# sheet); it is used when this session's previous schedule is of that previous version
+def get_schedule(df, data_source, data_hash, office_coord, limit, optimize_routes, working_hours=None, data_changes=None):
+    params = (office_coord, limit, optimize_routes, working_hours)
+    last_schedule = st.session_state.get('last_schedule')
+    if last_schedule is not None and last_schedule['params'] == params and last_schedule['data_hash'] == data_hash:
+        return last_schedule['schedule']
+    changed_salesmen = None
+    if last_schedule is not None and data_changes is not None and data_changes[0] == last_schedule['data_hash']:
+        changed_salesmen = data_changes[1]
+    if (last_schedule is not None and last_schedule['params'] == params and last_schedule['source'] == data_source
+            and changed_salesmen_share(last_schedule['df'], df, working_hours is not None,
+                                       changed_salesmen) <= INCREMENTAL_MAX_CHANGED):
+        optimizer = RouteOptimizer() if optimize_routes else None
+        scheduling_df = round_schedule(update_scheduling(last_schedule['df'], last_schedule['schedule'], df, office_coord, limit,
+                                                         optimizer=optimizer, planner=make_planner(working_hours),
+                                                         changed_salesmen=changed_salesmen))
+    else:
+        scheduling_df = cached_scheduling(df, data_hash, office_coord, limit, optimize_routes, working_hours)
+    st.session_state['last_schedule'] = {'params': params, 'source': data_source, 'data_hash': data_hash, 'df': df,
+                                         'schedule': scheduling_df}
+    return scheduling_df
 
-    return m_html
+# Function to drop every cached stage, the next run reloads the data and rebuilds the schedule and maps
+def clear_pipeline_cache():
+    load_upload.clear()
+    cached_scheduling.clear()
+    st.session_state.pop('last_schedule', None)
 
 
 # Streamlit UI
 st.title('📅Route Optimization for Salesman Scheduling Dashboard')
+metrics = start_run('schedule_app')
+metrics.watch('routing', get_routing_client())
+metrics.watch('route cache', get_routing_client().cache)
+metrics.watch('map store', get_map_store())
+
+reload_data = st.sidebar.button("🔄 Reload data and schedule")
+if reload_data:
+    clear_pipeline_cache()
 
 # Checkbox to choose between using sheet_id or uploaded file
 use_sheet_id = st.checkbox("Use Online Google Spreadshee Database 📊",value = True)
@@ -356,8 +103,16 @@ if use_sheet_id:
     #st.write("This App extracts data from Google Spreadsheet, visit <a href='https://docs.google.com/spreadsheets/d/1pGXaBlOSnzestjx5pz8YDhff4RvhbMR3B42MRg5AatY/edit?usp=sharing' target='_blank'>📋Geotag Master Database</a> to edit the entry", unsafe_allow_html=True)
     # Define default sheet_id
     sheet_id = '1pGXaBlOSnzestjx5pz8YDhff4RvhbMR3B42MRg5AatY'
-    df = pd.read_csv(f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv")
-    limit = df.shape[1]
+    with metrics.stage('sheet load'):
+        sheet_source = get_sheet_source(sheet_id)
+        metrics.watch('sheet', sheet_source)
+        sheet_snapshot = sheet_source.fetch() if reload_data else sheet_source.snapshot()
+        df = sheet_snapshot.frame()
+    data_source = sheet_source.url
+    data_source_hash = sheet_snapshot.content_hash
+    data_changes = (sheet_snapshot.previous_hash, sheet_snapshot.changed_values('NAMA SALESMAN'))
+    st.caption(sheet_snapshot.describe())
+    limit = default_limit(df)
 
     st.write("❗ Please REFRESH the page AFTER you set the filter")
     url = 'https://docs.google.com/spreadsheets/d/1pGXaBlOSnzestjx5pz8YDhff4RvhbMR3B42MRg5AatY/edit#gid=1239582729'
@@ -367,11 +122,13 @@ else:
     # Upload file
     uploaded_file = st.file_uploader("Upload CSV or Excel file", type=["csv", "xlsx"])
     if uploaded_file is not None:
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
-        limit = df.shape[1]
+        with metrics.stage('upload load'):
+            df = load_upload(uploaded_file.getvalue(), uploaded_file.name)
+        data_source = uploaded_file.name
+        data_source_hash = df.attrs['ingest']['hash']
+        data_changes = None
+        st.caption(ingest_summary(df))
+        limit = default_limit(df)
         #st.write(f"Limit visit per day = {limit} Outlet(s)")
 
 
@@ -381,19 +138,43 @@ else:
 
 if 'df' in locals():
     try:
-        df.dropna(subset=['Latitude'], inplace=True)
+        with metrics.stage('prepare outlets', rows=len(df)):
+            df = prepare_outlets(df)
+        metrics.count('rows', len(df))
         st.sidebar.write("Data Preview:")
         st.sidebar.write(df.head())
 
         # Generate scheduling
-        office_latitude = -6.558031
-        office_longitude = 106.691809
+        office_latitude, office_longitude = DEFAULT_OFFICE_COORD
         office_coord = (office_latitude, office_longitude)
-        scheduling_df = generate_scheduling(df, office_coord)
-
-        # Round Latitude and Longitude columns to 6 decimal places
-        scheduling_df['Latitude'] = scheduling_df['Latitude'].round(6)
-        scheduling_df['Longitude'] = scheduling_df['Longitude'].round(6)
+        optimize_routes = st.sidebar.checkbox("Optimize daily routes (geographic days + 2-opt)", value=False)
+        limit = int(st.sidebar.number_input("Visits per day (capacity):", min_value=1, value=int(limit), step=1))
+        # Balanced days: even visits and drive + service time per day, within the working day, honouring the
+        # optional FREQUENCY, SERVICE MINUTES, OPEN TIME / CLOSE TIME and VISIT DAYS columns
+        working_hours = None
+        if st.sidebar.checkbox("Balance days (capacity, time windows, visit frequency)", value=False):
+            working_hours = float(st.sidebar.number_input("Working day (hours):", min_value=1.0, max_value=24.0, value=8.0, step=0.5))
+        # The data is a function of the source content, so its hash keys the schedule without hashing the frame
+        data_hash = data_source_hash
+        with metrics.stage('scheduling', rows=len(df)):
+            scheduling_df = get_schedule(df, data_source, data_hash, office_coord, limit, optimize_routes, working_hours,
+                                         data_changes)
+            schedule_key = frame_hash(scheduling_df.drop(columns=['Coordinates']))
+
+        # Pre-render the map of every salesman and day of this schedule version in the background,
+        # the selected map is loaded from the artifact store (or rendered on demand until it is there)
+        with metrics.stage('map pre-render queue'):
+            start_background_render(scheduling_df, schedule_key, office_coord, workers=DEFAULT_WORKERS)
+
+        # Outlets that did not fit any day are listed instead of silently left out of the plan
+        unassigned = unassigned_outlets(scheduling_df)
+        if not unassigned.empty:
+            st.warning(f"⚠️ {len(unassigned)} outlet(s) could not be scheduled: "
+                       + ", ".join(f"{count} {reason}" for reason, count in unassigned['Reason'].value_counts().items()))
+            with st.expander("Unassigned outlets"):
+                st.dataframe(unassigned, hide_index=True)
+                st.download_button("Download unassigned outlets", unassigned.to_csv(index=False),
+                                   file_name="unassigned_outlets.csv", mime="text/csv")
 
         # Filter by salesman
         salesmen = scheduling_df['NAMA SALESMAN'].unique()
@@ -407,6 +188,19 @@ if 'df' in locals():
         filtered_schedule = filtered_schedule[filtered_schedule['Day'] == selected_day]
         
 
+        # Report the km saved by the route optimizer against the greedy plan
+        if optimize_routes:
+            salesman_report = scheduling_df.attrs['route_report'][selected_salesman]
+            saved_km = salesman_report['baseline_km'] - salesman_report['optimized_km']
+            st.write(f"🛣️ Route optimizer saves {round(saved_km, 3)} km for {selected_salesman} "
+                     f"({round(salesman_report['optimized_km'], 3)} km vs {round(salesman_report['baseline_km'], 3)} km with the greedy plan)")
+
+        # Visits, km and minutes of every day of the salesman with the balanced day planner
+        day_report = scheduling_df.attrs['route_report'].get(selected_salesman, {}).get('days')
+        if day_report:
+            st.write(f"🗓️ Day workload of {selected_salesman}")
+            st.dataframe(pd.DataFrame.from_dict(day_report, orient='index').round(1), use_container_width=False)
+
         # Display filtered scheduling
         st.write("Generated Scheduling for", selected_salesman, "on", selected_day)
         st.write(filtered_schedule, hide_index=True)
@@ -414,8 +208,11 @@ if 'df' in locals():
         # Display Folium map if schedule is not empty
         if not filtered_schedule.empty:
             st.markdown(f'<span style="font-size:16px;">📍 Map showing connections for {selected_salesman} on {selected_day} that need to visit {filtered_schedule["Distance"].count()} outlet(s) around <b>{round(filtered_schedule["Distance"].sum(), 3)} km<b></span>', unsafe_allow_html=True)
-            folium_map_html = generate_folium_map(df, filtered_schedule, office_latitude, office_longitude)
+            with metrics.stage('map load', rows=len(filtered_schedule)):
+                folium_map_html = load_schedule_map(scheduling_df, schedule_key, selected_salesman, selected_day, office_coord)
+            metrics.count('map payload bytes', len(folium_map_html.encode('utf-8')))
             st.components.v1.html(folium_map_html, width=750, height=550)
+            st.caption(f"Map payload: {payload_size(folium_map_html)}")
         else:
             st.write(f"{selected_salesman} Has No Visit Schedule on {selected_day}")
 
@@ -428,3 +225,5 @@ st.sidebar.write("""<p style='font-size: 13px;'>For any inquiries, error handlin
 <a href="mailto:Ananda.Cahyo@id.nestle.com">Ananda.Cahyo@id.nestle.com <br>
 <a href="mailto:Kemal.Ardaffa@id.nestle.com">Kemal.Ardaffa@id.nestle.com <br>
 <a href="mailto:Farah.Risha@id.nestle.com">Farah.Risha@id.nestle.com</a></p>""", unsafe_allow_html=True)
+
+show_debug_panel(metrics)
@@ -0,0 +1,148 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.neighbors import KDTree
+
+from clustering import EqualAreaProjection
+from distance_engine import as_coordinate_array, haversine_paired
+
+# Road graphs are prepared once from a GeoJSON road export (e.g. an OSM extract converted with ogr2ogr or osmnx)
+# and stored as a compact CSR adjacency: node coordinates, row pointers, neighbour ids and edge lengths (km)
+NODE_PRECISION = 6  # Decimals of the vertex coordinates that make two road vertices the same node (~0.1 m)
+ONEWAY_FORWARD = ('yes', 'true', '1')
+ONEWAY_REVERSE = ('-1', 'reverse')
+
+
+# Directed road graph in CSR form with a spatial index of its nodes
+class RoadGraph:
+    def __init__(self, node_coords, indptr, indices, weights):
+        self.node_coords = as_coordinate_array(node_coords)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.csr = csr_matrix((self.weights, self.indices, self.indptr), shape=(len(self.node_coords),) * 2)
+        self.projection = EqualAreaProjection(float(self.node_coords[:, 0].mean()) if len(self.node_coords) else 0.0)
+        self._tree = KDTree(self.projection.forward(self.node_coords)) if len(self.node_coords) else None
+
+    @property
+    def n_nodes(self):
+        return len(self.node_coords)
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    # Function to build a graph from directed edges (source node, target node), lengths default to the haversine km
+    # Duplicate edges keep the shortest length
+    @classmethod
+    def from_edges(cls, node_coords, sources, targets, weights=None):
+        node_coords = as_coordinate_array(node_coords)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if weights is None:
+            weights = haversine_paired(node_coords[sources], node_coords[targets])
+        weights = np.asarray(weights, dtype=np.float64)
+
+        keep = sources != targets
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+        order = np.lexsort((weights, targets, sources))
+        sources, targets, weights = sources[order], targets[order], weights[order]
+        first = np.ones(len(sources), dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        sources, targets, weights = sources[first], targets[first], weights[first]
+
+        indptr = np.zeros(len(node_coords) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(node_coords)), out=indptr[1:])
+        return cls(node_coords, indptr, targets, weights)
+
+    # Function to build a graph from GeoJSON LineString / MultiLineString roads, two-way unless the feature's
+    # 'oneway' property says otherwise; vertices shared by several roads become one node
+    @classmethod
+    def from_geojson(cls, path):
+        with open(path) as f:
+            features = json.load(f).get('features', [])
+
+        lines, directions = [], []
+        for feature in features:
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') == 'LineString':
+                parts = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiLineString':
+                parts = geometry['coordinates']
+            else:
+                continue
+            oneway = str((feature.get('properties') or {}).get('oneway', '')).lower()
+            direction = 1 if oneway in ONEWAY_FORWARD else -1 if oneway in ONEWAY_REVERSE else 0
+            for part in parts:
+                if len(part) >= 2:
+                    lines.append(np.asarray(part, dtype=np.float64)[:, [1, 0]])  # GeoJSON is lon, lat
+                    directions.append(direction)
+        if not lines:
+            return cls.from_edges(np.empty((0, 2)), [], [])
+
+        vertices = np.round(np.vstack(lines), NODE_PRECISION)
+        node_coords, vertex_nodes = np.unique(vertices, axis=0, return_inverse=True)
+        vertex_nodes = vertex_nodes.ravel()
+        sizes = np.array([len(line) for line in lines])
+        line_of_vertex = np.repeat(np.arange(len(lines)), sizes)
+        segment = np.ones(len(vertices), dtype=bool)
+        segment[np.cumsum(sizes) - 1] = False  # The last vertex of a line starts no segment
+        starts = np.flatnonzero(segment)
+        heads, tails = vertex_nodes[starts], vertex_nodes[starts + 1]
+        direction = np.asarray(directions)[line_of_vertex[starts]]
+
+        forward = direction >= 0
+        reverse = direction <= 0
+        sources = np.concatenate([heads[forward], tails[reverse]])
+        targets = np.concatenate([tails[forward], heads[reverse]])
+        return cls.from_edges(node_coords, sources, targets)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['node_coords'], data['indptr'], data['indices'], data['weights'])
+
+    def save(self, path):
+        np.savez_compressed(path, node_coords=self.node_coords, indptr=self.indptr, indices=self.indices, weights=self.weights)
+
+    # Function to snap (lat, lon) points to their nearest node, returns the node ids and the snapping distance (km)
+    def nearest_nodes(self, points):
+        points = as_coordinate_array(points)
+        if self._tree is None or not len(points):
+            return np.full(len(points), -1, dtype=np.int64), np.full(len(points), np.inf)
+        nodes = self._tree.query(self.projection.forward(points), k=1, return_distance=False)[:, 0]
+        return nodes.astype(np.int64), haversine_paired(points, self.node_coords[nodes])
+
+    # Function to cut the graph to the bounding box of some points grown by margin_km, so searches between
+    # nearby points do not scan the whole region; returns the kept node ids (sorted) and their CSR matrix
+    def subgraph(self, points, margin_km):
+        points = as_coordinate_array(points)
+        lat_margin = margin_km / 111.32
+        lon_margin = margin_km / (111.32 * max(np.cos(np.radians(np.abs(points[:, 0]).max())), 0.01))
+        low = points.min(axis=0) - (lat_margin, lon_margin)
+        high = points.max(axis=0) + (lat_margin, lon_margin)
+        inside = ((self.node_coords >= low) & (self.node_coords <= high)).all(axis=1)
+        nodes = np.flatnonzero(inside)
+        if len(nodes) == self.n_nodes:
+            return nodes, self.csr
+        return nodes, self.csr[nodes][:, nodes]
+
+
+# Function to convert a GeoJSON road export into the CSR road graph used by the local routing backend
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare the road graph of the local routing backend from GeoJSON roads.")
+    parser.add_argument('roads', help="GeoJSON file with LineString / MultiLineString roads")
+    parser.add_argument('output', nargs='?', default='road_graph.npz', help="graph file to write (default: road_graph.npz)")
+    args = parser.parse_args(argv)
+
+    graph = RoadGraph.from_geojson(args.roads)
+    graph.save(args.output)
+    print(f"{args.output}: {graph.n_nodes} nodes, {graph.n_edges} edges")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
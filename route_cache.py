@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.environ.get('ROUTE_CACHE_PATH', os.path.join('.cache', 'routes.sqlite'))
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600  # Road geometry rarely changes, keep routes for a week
+DEFAULT_MEMORY_ENTRIES = 4096
+DEFAULT_DISK_ENTRIES = 200000
+DEFAULT_PRECISION = 5  # 5 decimals is roughly 1 meter, close enough to reuse a route
+
+
+# Two-tier cache for OSRM routes: an in-memory LRU in front of a SQLite table with TTL and size eviction
+# Each entry stores the decoded polyline (list of (lat, lon)) and the road distance in kilometers
+class RouteCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_memory_entries=DEFAULT_MEMORY_ENTRIES, max_disk_entries=DEFAULT_DISK_ENTRIES,
+                 precision=DEFAULT_PRECISION):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.precision = precision
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS routes ("
+                "key TEXT PRIMARY KEY, polyline TEXT NOT NULL, distance REAL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS routes_accessed_at ON routes (accessed_at)")
+            self._conn.commit()
+
+    # Function to build the cache key from rounded origin/destination coordinates and the routing profile
+    def key(self, origin, destination, profile='driving'):
+        p = self.precision
+        return f"{profile}:{origin[0]:.{p}f},{origin[1]:.{p}f};{destination[0]:.{p}f},{destination[1]:.{p}f}"
+
+    # Function to look up a route, returns {'polyline': [...], 'distance': km} or None
+    def get(self, origin, destination, profile='driving'):
+        key = self.key(origin, destination, profile)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT polyline, distance, created_at FROM routes WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[2] <= self.ttl_seconds:
+                    self._conn.execute("UPDATE routes SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._conn.commit()
+                    route = {'polyline': [tuple(point) for point in json.loads(row[0])], 'distance': row[1]}
+                    self._remember(key, row[2], route)
+                    self.counters['disk_hits'] += 1
+                    return route
+                if row is not None:
+                    self._conn.execute("DELETE FROM routes WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self.counters['misses'] += 1
+            return None
+
+    # Function to store a route in both tiers
+    def set(self, origin, destination, route, profile='driving'):
+        key = self.key(origin, destination, profile)
+        now = time.time()
+        route = {'polyline': [tuple(point) for point in route['polyline']], 'distance': route['distance']}
+        with self._lock:
+            self._remember(key, now, route)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO routes (key, polyline, distance, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, json.dumps(route['polyline']), route['distance'], now, now),
+                )
+                self._conn.commit()
+                self._writes_since_eviction += 1
+                if self._writes_since_eviction >= 100:
+                    self._evict_disk(now)
+            self.counters['writes'] += 1
+
+    # Function to return hit/miss counters for monitoring
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+            if self._conn is not None:
+                stats['disk_entries'] = self._conn.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    # Function to drop every cached route
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM routes")
+                self._conn.commit()
+
+    def _remember(self, key, created_at, route):
+        self._memory[key] = (created_at, route)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    # Remove expired routes, then the least recently used ones above max_disk_entries
+    def _evict_disk(self, now):
+        self._writes_since_eviction = 0
+        cursor = self._conn.execute("DELETE FROM routes WHERE created_at < ?", (now - self.ttl_seconds,))
+        evicted = cursor.rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM routes").fetchone()[0] - self.max_disk_entries
+        if overflow > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM routes WHERE key IN (SELECT key FROM routes ORDER BY accessed_at LIMIT ?)", (overflow,)
+            )
+            evicted += cursor.rowcount
+        self._conn.commit()
+        self.counters['evictions'] += evicted
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide route cache, shared across Streamlit reruns
+def get_route_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = RouteCache()
+        return _default_cache
@@ -0,0 +1,196 @@
+import math
+import time
+
+import numpy as np
+
+from distance_engine import haversine_matrix
+
+IMPROVEMENT_EPS = 1e-9  # Ignore moves that improve a tour by less than a millimeter
+
+
+# Function to build the current greedy plan: outlets in row order chunked by limit,
+# starting from the outlet nearest to the office and continuing with the nearest neighbour
+# Returns a list of day tours, each a list of outlet row ids in visit order
+def greedy_plan(office_distances, outlet_distance_matrix, limit):
+    outlets = list(range(len(office_distances)))
+    tours = []
+    while outlets:
+        outlets_today = outlets[:limit]
+        outlets = outlets[limit:]
+        tour = [min(outlets_today, key=lambda outlet: office_distances[outlet])]
+        outlets_today.remove(tour[0])
+        while outlets_today:
+            last = tour[-1]
+            nearest = min(outlets_today, key=lambda outlet: outlet_distance_matrix[last, outlet])
+            tour.append(nearest)
+            outlets_today.remove(nearest)
+        tours.append(tour)
+    return tours
+
+
+# Function to calculate the km of a day tour: office to the first outlet, then outlet to outlet
+def tour_length(tour, office_distances, outlet_distance_matrix):
+    if not tour:
+        return 0.0
+    tour = np.asarray(tour)
+    return float(office_distances[tour[0]] + outlet_distance_matrix[tour[:-1], tour[1:]].sum())
+
+
+# Function to split outlets into groups of at most `capacity` by geography
+# Starts from a sweep around the office and refines with capacity-constrained k-means assignment
+# Returns a list of groups, each a list of outlet row ids
+def capacitated_clusters(outlet_coords, office_coord, capacity, n_clusters=None, max_iter=20):
+    outlet_coords = np.asarray(outlet_coords, dtype=np.float64).reshape(-1, 2)
+    n = len(outlet_coords)
+    if n == 0:
+        return []
+    if n_clusters is None:
+        n_clusters = math.ceil(n / capacity)
+
+    # Sweep: order outlets by bearing from the office and cut the sweep into equal chunks
+    dlat = outlet_coords[:, 0] - office_coord[0]
+    dlon = (outlet_coords[:, 1] - office_coord[1]) * math.cos(math.radians(office_coord[0]))
+    sweep = np.argsort(np.arctan2(dlat, dlon), kind='stable')
+    labels = np.empty(n, dtype=np.int64)
+    for cluster, chunk in enumerate(np.array_split(sweep, n_clusters)):
+        labels[chunk] = cluster
+
+    for _ in range(max_iter):
+        centres = np.array([outlet_coords[labels == cluster].mean(axis=0) if (labels == cluster).any()
+                            else outlet_coords[sweep[cluster % n]] for cluster in range(n_clusters)])
+        cost = haversine_matrix(outlet_coords, centres)
+
+        # Assign the cheapest (outlet, centre) pairs first while the centre has capacity left
+        new_labels = np.full(n, -1, dtype=np.int64)
+        load = np.zeros(n_clusters, dtype=np.int64)
+        assigned = 0
+        for flat in np.argsort(cost, axis=None, kind='stable'):
+            outlet, cluster = divmod(int(flat), n_clusters)
+            if new_labels[outlet] == -1 and load[cluster] < capacity:
+                new_labels[outlet] = cluster
+                load[cluster] += 1
+                assigned += 1
+                if assigned == n:
+                    break
+
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    groups = [np.flatnonzero(labels == cluster).tolist() for cluster in range(n_clusters)]
+    return [group for group in groups if group]
+
+
+# Function to improve a closed tour (node 0 first) in place with 2-opt segment reversals
+# Works for asymmetric distances by pricing the reversed segment with backward cumulative costs
+def two_opt(path, D, deadline):
+    improved = False
+    n = len(path)
+    while time.perf_counter() < deadline:
+        p = np.asarray(path)
+        nxt = np.roll(p, -1)
+        forward = np.concatenate([[0.0], np.cumsum(D[p, nxt])])
+        backward = np.concatenate([[0.0], np.cumsum(D[nxt, p])])
+        best = None
+        for i in range(1, n - 1):
+            j = np.arange(i + 1, n)
+            after = nxt[j]
+            delta = (D[p[i - 1], p[j]] + D[p[i], after] - D[p[i - 1], p[i]] - D[p[j], after]
+                     + (backward[j] - backward[i]) - (forward[j] - forward[i]))
+            k = int(np.argmin(delta))
+            if delta[k] < -IMPROVEMENT_EPS:
+                best = (i, int(j[k]))
+                break
+        if best is None:
+            break
+        i, j = best
+        path[i:j + 1] = path[i:j + 1][::-1]
+        improved = True
+    return improved
+
+
+# Function to improve a closed tour (node 0 first) in place by moving segments of 1 to 3 stops (Or-opt)
+def or_opt(path, D, deadline):
+    improved = False
+    n = len(path)
+    moved = True
+    while moved and time.perf_counter() < deadline:
+        moved = False
+        for length in (1, 2, 3):
+            for i in range(1, n - length + 1):
+                p = np.asarray(path)
+                first, last = p[i], p[i + length - 1]
+                before, after = p[i - 1], p[(i + length) % n]
+                removal_gain = D[before, first] + D[last, after] - D[before, after]
+
+                rest = np.concatenate([p[:i], p[i + length:]])
+                rest_next = np.roll(rest, -1)
+                insertion_cost = D[rest, first] + D[last, rest_next] - D[rest, rest_next]
+                insertion_cost[i - 1] = np.inf  # Same position as before
+                k = int(np.argmin(insertion_cost))
+                if insertion_cost[k] - removal_gain < -IMPROVEMENT_EPS:
+                    segment = path[i:i + length]
+                    del path[i:i + length]
+                    path[k + 1:k + 1] = segment
+                    improved = moved = True
+                    break
+            if moved or time.perf_counter() >= deadline:
+                break
+    return improved
+
+
+# Function to improve a day tour that starts at the office with 2-opt and Or-opt until no move helps
+# The tour is open (no return leg), modelled as a closed tour whose edges back to the office cost 0
+def improve_tour(tour, office_distances, outlet_distance_matrix, deadline):
+    if len(tour) < 3:
+        return list(tour)
+    tour = np.asarray(tour)
+    D = np.zeros((len(tour) + 1, len(tour) + 1))
+    D[0, 1:] = office_distances[tour]
+    D[1:, 1:] = outlet_distance_matrix[np.ix_(tour, tour)]
+
+    path = list(range(len(tour) + 1))
+    while time.perf_counter() < deadline:
+        improved = two_opt(path, D, deadline)
+        improved = or_opt(path, D, deadline) or improved
+        if not improved:
+            break
+    return [int(tour[node - 1]) for node in path[1:]]
+
+
+# Route optimiser stage for generate_scheduling: capacity-constrained geographic clustering into days,
+# nearest-neighbour construction, then 2-opt/Or-opt local search within a time budget per salesman
+class RouteOptimizer:
+    def __init__(self, time_budget=2.0, cluster=True, max_cluster_iter=20):
+        self.time_budget = time_budget
+        self.cluster = cluster
+        self.max_cluster_iter = max_cluster_iter
+
+    # Function to plan the day tours of one salesman, same output as greedy_plan
+    def plan(self, office_distances, outlet_distance_matrix, outlet_coords, office_coord, limit):
+        deadline = time.perf_counter() + self.time_budget
+        if self.cluster:
+            groups = capacitated_clusters(outlet_coords, office_coord, limit, max_iter=self.max_cluster_iter)
+        else:
+            groups = [list(range(start, min(start + limit, len(office_distances))))
+                      for start in range(0, len(office_distances), limit)]
+
+        tours = []
+        for group in groups:
+            # Nearest-neighbour construction inside the group
+            tour = [min(group, key=lambda outlet: office_distances[outlet])]
+            remaining = [outlet for outlet in group if outlet != tour[0]]
+            while remaining:
+                nearest = min(remaining, key=lambda outlet: outlet_distance_matrix[tour[-1], outlet])
+                tour.append(nearest)
+                remaining.remove(nearest)
+            tours.append(tour)
+
+        for index, tour in enumerate(tours):
+            # Share the remaining budget evenly between the tours still to improve
+            tour_deadline = time.perf_counter() + max(0.0, deadline - time.perf_counter()) / (len(tours) - index)
+            tours[index] = improve_tour(tour, office_distances, outlet_distance_matrix, tour_deadline)
+
+        # Visit the days nearest to the office first, as the greedy plan tends to
+        tours.sort(key=lambda tour: office_distances[tour[0]])
+        return tours
@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from distance_engine import as_coordinate_array, haversine_matrix, haversine_paired
+from road_graph import RoadGraph
+from route_cache import get_route_cache
+from routing_client import OSRMClient
+
+# Routing backends share the OSRMClient interface used by the pages and the scheduler:
+# route / route_many / route_legs / route_legs_many return {'polyline': [(lat, lon), ...], 'distance': km} or None,
+# table returns a km matrix with NaN for unreachable pairs, stats returns counters
+# ROUTING_BACKENDS lists the backends tried in order, each answering what the previous ones could not
+ROUTING_BACKENDS = os.environ.get('ROUTING_BACKENDS', 'osrm,local,haversine')
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH', 'road_graph.npz')  # Prepared with road_graph.py
+
+MAX_SNAP_KM = 1.0  # Points farther than this from the road graph are left to the next backend
+SEARCH_MARGIN_KM = 5.0  # Roads kept around the queried points, detours leaving this box are not found
+DETOUR_LIMIT = 3.0  # A route search stops at this multiple of the straight-line distance
+MIN_SEARCH_KM = 2.0
+TABLE_BATCH = 64  # Sources searched per Dijkstra call of a distance table
+
+FAILURE_THRESHOLD = 3  # Consecutive failed calls before a backend is skipped
+FAILURE_COOLDOWN_SECONDS = 60
+
+
+# In-process routing on a prepared road graph: every query runs scipy's Dijkstra on the roads around its points,
+# route searches are also bounded by DETOUR_LIMIT times the straight-line distance
+class LocalRouter:
+    name = 'local'
+
+    def __init__(self, graph, max_snap_km=MAX_SNAP_KM, margin_km=SEARCH_MARGIN_KM):
+        self.graph = graph
+        self.max_snap_km = max_snap_km
+        self.margin_km = margin_km
+        self.cache = None
+        self.counters = {'routes': 0, 'tables': 0, 'unreachable': 0}
+        self._counters_lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path=ROAD_GRAPH_PATH):
+        return cls(RoadGraph.load(path))
+
+    def route(self, origin, destination):
+        return self.route_legs([origin, destination])[0]
+
+    def route_many(self, pairs):
+        return [self.route(origin, destination) for origin, destination in pairs]
+
+    # Function to route every leg of an ordered waypoint list on one subgraph around the waypoints
+    def route_legs(self, waypoints):
+        waypoints = as_coordinate_array(waypoints)
+        if len(waypoints) < 2:
+            return []
+        nodes, snap_km, subgraph_nodes, subgraph = self._prepare(waypoints)
+        legs = []
+        for i in range(len(waypoints) - 1):
+            origin, destination = nodes[i], nodes[i + 1]
+            route = None
+            if origin >= 0 and destination >= 0:
+                leg_coords = self.graph.node_coords[subgraph_nodes[[origin, destination]]]
+                straight = haversine_paired(leg_coords[:1], leg_coords[1:])[0]
+                distances, predecessors = dijkstra(subgraph, indices=origin, return_predecessors=True,
+                                                   limit=DETOUR_LIMIT * straight + MIN_SEARCH_KM)
+                if np.isfinite(distances[destination]):
+                    path = [destination]
+                    while path[-1] != origin:
+                        path.append(predecessors[path[-1]])
+                    points = [tuple(waypoints[i])] + [tuple(point) for point in self.graph.node_coords[subgraph_nodes[path[::-1]]]]
+                    points.append(tuple(waypoints[i + 1]))
+                    route = {'polyline': [point for k, point in enumerate(points) if k == 0 or point != points[k - 1]],
+                             'distance': float(snap_km[i] + distances[destination] + snap_km[i + 1])}
+            self._count('routes')
+            if route is None:
+                self._count('unreachable')
+            legs.append(route)
+        return legs
+
+    def route_legs_many(self, waypoint_lists):
+        return [self.route_legs(waypoints) for waypoints in waypoint_lists]
+
+    # Function to get the road distance matrix (km) between sources and destinations, NaN when unreachable
+    def table(self, sources, destinations=None):
+        sources = as_coordinate_array(sources)
+        destinations = sources if destinations is None else as_coordinate_array(destinations)
+        matrix = np.full((len(sources), len(destinations)), np.nan)
+        if not len(sources) or not len(destinations):
+            return matrix
+        self._count('tables')
+        nodes, snap_km, _, subgraph = self._prepare(np.vstack([sources, destinations]))
+        source_nodes, destination_nodes = nodes[:len(sources)], nodes[len(sources):]
+        source_snap, destination_snap = snap_km[:len(sources)], snap_km[len(sources):]
+        reachable = destination_nodes >= 0
+        if not reachable.any():
+            return matrix
+
+        unique_sources = np.unique(source_nodes[source_nodes >= 0])
+        for start in range(0, len(unique_sources), TABLE_BATCH):
+            batch = unique_sources[start:start + TABLE_BATCH]
+            distances = dijkstra(subgraph, indices=batch)[:, destination_nodes[reachable]]
+            rows = np.flatnonzero(np.isin(source_nodes, batch))
+            block = distances[np.searchsorted(batch, source_nodes[rows])]
+            block = source_snap[rows, None] + block + destination_snap[None, reachable]
+            matrix[np.ix_(rows, np.flatnonzero(reachable))] = np.where(np.isfinite(block), block, np.nan)
+        return matrix
+
+    def stats(self):
+        with self._counters_lock:
+            return dict(self.counters)
+
+    def close(self):
+        pass
+
+    # Snap the points to the graph and cut the subgraph around them, node ids are subgraph positions (-1 when too far)
+    def _prepare(self, points):
+        nodes, snap_km = self.graph.nearest_nodes(points)
+        nodes[snap_km > self.max_snap_km] = -1
+        subgraph_nodes, subgraph = self.graph.subgraph(points, self.margin_km + self.max_snap_km)
+        snapped = nodes >= 0
+        nodes[snapped] = np.searchsorted(subgraph_nodes, nodes[snapped])
+        return nodes, snap_km, subgraph_nodes, subgraph
+
+    def _count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+
+# Last-resort backend: straight lines with the haversine distance, so a route is always drawn and every
+# pair has a distance even offline
+class HaversineRouter:
+    name = 'haversine'
+
+    def __init__(self):
+        self.cache = None
+        self.counters = {'routes': 0, 'tables': 0}
+        self._counters_lock = threading.Lock()
+
+    def route(self, origin, destination):
+        return self.route_many([(origin, destination)])[0]
+
+    def route_many(self, pairs):
+        if not pairs:
+            return []
+        origins = as_coordinate_array([origin for origin, _ in pairs])
+        destinations = as_coordinate_array([destination for _, destination in pairs])
+        self._count('routes', len(pairs))
+        return [{'polyline': [tuple(origin), tuple(destination)], 'distance': float(distance)}
+                for origin, destination, distance in zip(origins, destinations, haversine_paired(origins, destinations))]
+
+    def route_legs(self, waypoints):
+        waypoints = [tuple(point) for point in waypoints]
+        return self.route_many(list(zip(waypoints[:-1], waypoints[1:])))
+
+    def route_legs_many(self, waypoint_lists):
+        return [self.route_legs(waypoints) for waypoints in waypoint_lists]
+
+    def table(self, sources, destinations=None):
+        self._count('tables')
+        return haversine_matrix(sources, sources if destinations is None else destinations)
+
+    def stats(self):
+        with self._counters_lock:
+            return dict(self.counters)
+
+    def close(self):
+        pass
+
+    def _count(self, name, value=1):
+        with self._counters_lock:
+            self.counters[name] += value
+
+
+# Chain of routing backends: each query goes to the first backend and whatever it leaves unanswered (no route,
+# NaN distances) to the next one. A backend failing FAILURE_THRESHOLD calls in a row (e.g. the public OSRM server
+# while offline) is skipped for FAILURE_COOLDOWN_SECONDS instead of retrying every leg
+# Routes answered by a later backend carry 'fallback': True, so callers can avoid keeping them
+class FallbackRouter:
+    name = 'fallback'
+
+    def __init__(self, backends, failure_threshold=FAILURE_THRESHOLD, cooldown_seconds=FAILURE_COOLDOWN_SECONDS):
+        self.backends = list(backends)
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        # The route cache of the first backend that has one, reported by the debug panel
+        self.cache = next((backend.cache for backend in self.backends if getattr(backend, 'cache', None) is not None), None)
+        self.counters = {'fallbacks': 0, 'skipped': 0}
+        self._failures = [0] * len(self.backends)
+        self._skip_until = [0.0] * len(self.backends)
+        self._lock = threading.Lock()
+
+    def route(self, origin, destination):
+        return self.route_many([(origin, destination)])[0]
+
+    def route_many(self, pairs):
+        pairs = [(tuple(origin), tuple(destination)) for origin, destination in pairs]
+        routes = [None] * len(pairs)
+        for backend, pending in self._backends(lambda: [i for i, route in enumerate(routes) if route is None]):
+            answered = backend.route_many([pairs[i] for i in pending])
+            for i, route in zip(pending, answered):
+                routes[i] = self._tag(backend, route)
+            self._record(backend, any(route is not None for route in answered))
+        return routes
+
+    def route_legs(self, waypoints):
+        return self.route_legs_many([waypoints])[0]
+
+    # Function to route several waypoint lists, lists with missing legs are routed again by the next backend
+    # and only their missing legs are replaced
+    def route_legs_many(self, waypoint_lists):
+        waypoint_lists = [[tuple(point) for point in waypoints] for waypoints in waypoint_lists]
+        all_legs = [[None] * max(len(waypoints) - 1, 0) for waypoints in waypoint_lists]
+        for backend, pending in self._backends(lambda: [i for i, legs in enumerate(all_legs) if None in legs]):
+            answered = backend.route_legs_many([waypoint_lists[i] for i in pending])
+            for i, legs in zip(pending, answered):
+                all_legs[i] = [leg if leg is not None else self._tag(backend, route) for leg, route in zip(all_legs[i], legs)]
+            self._record(backend, any(route is not None for legs in answered for route in legs))
+        return all_legs
+
+    def table(self, sources, destinations=None):
+        sources = [tuple(point) for point in sources]
+        destinations = None if destinations is None else [tuple(point) for point in destinations]
+        matrix = np.full((len(sources), len(sources if destinations is None else destinations)), np.nan)
+        for backend, _ in self._backends(lambda: np.isnan(matrix).any()):
+            table = backend.table(sources, destinations)
+            missing = np.isnan(matrix)
+            matrix[missing] = table[missing]
+            self._record(backend, not np.isnan(table).all())
+        return matrix
+
+    # Function to return the chain's counters and every backend's counters prefixed with its name
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        for backend in self.backends:
+            stats.update({f"{getattr(backend, 'name', type(backend).__name__)} {key}": value
+                          for key, value in backend.stats().items()})
+        return stats
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+
+    # Yield the available backends with the work still pending (a list of positions, or a flag), in order,
+    # until nothing is pending
+    def _backends(self, pending):
+        for k, backend in enumerate(self.backends):
+            work = pending()
+            if not (len(work) if isinstance(work, list) else work):
+                return
+            if time.monotonic() < self._skip_until[k]:
+                with self._lock:
+                    self.counters['skipped'] += 1
+                continue
+            if k > 0:
+                with self._lock:
+                    self.counters['fallbacks'] += 1
+            yield backend, work
+
+    def _tag(self, backend, route):
+        if route is None or backend is self.backends[0]:
+            return route
+        return dict(route, fallback=True)
+
+    def _record(self, backend, answered):
+        k = self.backends.index(backend)
+        with self._lock:
+            if answered:
+                self._failures[k] = 0
+                return
+            self._failures[k] += 1
+            if self._failures[k] >= self.failure_threshold:
+                self._failures[k] = 0
+                self._skip_until[k] = time.monotonic() + self.cooldown_seconds
+
+
+# Function to build the routing client from a comma-separated backend list ('osrm', 'local', 'haversine')
+# The local backend is left out when no road graph has been prepared; a single backend is used without a chain
+def build_routing_client(backends=ROUTING_BACKENDS, graph_path=ROAD_GRAPH_PATH):
+    clients = []
+    for name in [name.strip() for name in backends.split(',') if name.strip()]:
+        if name == 'osrm':
+            clients.append(OSRMClient(cache=get_route_cache()))
+        elif name == 'local':
+            if os.path.exists(graph_path):
+                clients.append(LocalRouter.from_file(graph_path))
+        elif name == 'haversine':
+            clients.append(HaversineRouter())
+        else:
+            raise ValueError(f"Unknown routing backend '{name}', expected osrm, local or haversine")
+    if not clients:
+        clients.append(HaversineRouter())
+    return clients[0] if len(clients) == 1 else FallbackRouter(clients)
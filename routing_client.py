@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from polyline import decode
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_OSRM_URL = os.environ.get('OSRM_BASE_URL', 'http://router.project-osrm.org')
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+MAX_ROUTE_WAYPOINTS = 100  # Waypoints per /route request
+MAX_TABLE_SIZE = 100  # Coordinates per /table request, the demo server rejects larger tables
+
+
+# OSRM HTTP client with a bounded worker pool, keep-alive connection pooling,
+# per-request timeouts and retry with exponential backoff on 429/5xx
+# Batch methods always return results in the same order as their input
+class OSRMClient:
+    name = 'osrm'
+
+    def __init__(self, base_url=DEFAULT_OSRM_URL, profile='driving', max_workers=8, timeout=10,
+                 max_retries=3, backoff_factor=0.5, cache=None, session=None,
+                 max_route_waypoints=MAX_ROUTE_WAYPOINTS, max_table_size=MAX_TABLE_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.profile = profile
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.cache = cache
+        self.max_route_waypoints = max(2, max_route_waypoints)
+        self.max_table_size = max(2, max_table_size)
+        self.counters = {'requests': 0, 'retries': 0, 'failures': 0}
+        self._counters_lock = threading.Lock()
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='osrm')
+
+    # Function to GET a JSON document with retries, returns None when the request keeps failing
+    def get_json(self, url):
+        for attempt in range(self.max_retries + 1):
+            self._count('requests')
+            retry_after = None
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+                retry_after = response.headers.get('Retry-After')
+            except (requests.RequestException, ValueError):
+                pass
+
+            if attempt < self.max_retries:
+                self._count('retries')
+                delay = self.backoff_factor * (2 ** attempt)
+                if retry_after is not None and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                time.sleep(delay)
+
+        self._count('failures')
+        return None
+
+    # Function to GET several JSON documents through the worker pool, in input order
+    def get_json_many(self, urls):
+        return list(self._executor.map(self.get_json, urls))
+
+    # Function to build the /route URL for an ordered list of (lat, lon) waypoints
+    def route_url(self, waypoints):
+        coordinates = ';'.join(f"{lon},{lat}" for lat, lon in waypoints)
+        return f"{self.base_url}/route/v1/{self.profile}/{coordinates}"
+
+    # Function to get the route between two points
+    # Returns {'polyline': [(lat, lon), ...], 'distance': km} or None when no route is available
+    def route(self, origin, destination):
+        if self.cache is not None:
+            route = self.cache.get(origin, destination, self.profile)
+            if route is not None:
+                return route
+
+        route_data = self.get_json(self.route_url([origin, destination]))
+        if route_data and route_data.get('routes'):
+            route = {'polyline': decode(route_data['routes'][0]['geometry']),
+                     'distance': route_data['routes'][0]['distance'] / 1000}  # Convert meters to kilometers
+            if self.cache is not None:
+                self.cache.set(origin, destination, route, self.profile)
+            return route
+        return None
+
+    # Function to get the routes for a list of (origin, destination) pairs in one batch, in input order
+    # Identical pairs are only requested once
+    def route_many(self, pairs):
+        pairs = [(tuple(origin), tuple(destination)) for origin, destination in pairs]
+        unique_pairs = list(dict.fromkeys(pairs))
+        routes = dict(zip(unique_pairs, self._executor.map(lambda pair: self.route(*pair), unique_pairs)))
+        return [routes[pair] for pair in pairs]
+
+    # Function to get every leg of an ordered waypoint list with one /route request per chunk of waypoints
+    # Returns one route per consecutive waypoint pair (None for legs without a route), in order
+    def route_legs(self, waypoints):
+        waypoints = [tuple(point) for point in waypoints]
+        pairs = list(zip(waypoints[:-1], waypoints[1:]))
+        if self.cache is not None:
+            cached = [self.cache.get(origin, destination, self.profile) for origin, destination in pairs]
+            if all(route is not None for route in cached):
+                return cached
+
+        legs = []
+        step = self.max_route_waypoints - 1
+        for start in range(0, len(pairs), step):
+            legs.extend(self._fetch_route_legs(waypoints[start:start + step + 1]))
+        return legs
+
+    # Function to get the legs of several waypoint lists through the worker pool, in input order
+    def route_legs_many(self, waypoint_lists):
+        return list(self._executor.map(self.route_legs, waypoint_lists))
+
+    # Function to get the road distance matrix (km) between sources and destinations with the /table service
+    # Large inputs are split into tiles of at most max_table_size coordinates; unreachable pairs are NaN
+    def table(self, sources, destinations=None):
+        sources = [tuple(point) for point in sources]
+        symmetric = destinations is None
+        destinations = sources if symmetric else [tuple(point) for point in destinations]
+        matrix = np.full((len(sources), len(destinations)), np.nan)
+        if not sources or not destinations:
+            return matrix
+
+        tiles = []
+        if symmetric and len(sources) <= self.max_table_size:
+            coordinates = ';'.join(f"{lon},{lat}" for lat, lon in sources)
+            tiles.append((0, 0, len(sources), len(sources), f"{self.base_url}/table/v1/{self.profile}/{coordinates}?annotations=distance"))
+        else:
+            block = self.max_table_size // 2
+            for i in range(0, len(sources), block):
+                for j in range(0, len(destinations), block):
+                    tile_sources = sources[i:i + block]
+                    tile_destinations = destinations[j:j + block]
+                    coordinates = ';'.join(f"{lon},{lat}" for lat, lon in tile_sources + tile_destinations)
+                    source_ids = ';'.join(str(k) for k in range(len(tile_sources)))
+                    destination_ids = ';'.join(str(k) for k in range(len(tile_sources), len(tile_sources) + len(tile_destinations)))
+                    tiles.append((i, j, len(tile_sources), len(tile_destinations),
+                                  f"{self.base_url}/table/v1/{self.profile}/{coordinates}"
+                                  f"?sources={source_ids}&destinations={destination_ids}&annotations=distance"))
+
+        results = self.get_json_many([url for *_, url in tiles])
+        for (i, j, rows, columns, _), table_data in zip(tiles, results):
+            if table_data and table_data.get('distances'):
+                distances = np.array(table_data['distances'], dtype=float)  # null (no route) becomes NaN
+                matrix[i:i + rows, j:j + columns] = distances / 1000  # Convert meters to kilometers
+        return matrix
+
+    # Function to return request counters for monitoring
+    def stats(self):
+        with self._counters_lock:
+            return dict(self.counters)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    # Request one /route for a chunk of waypoints and split its geometry back into per-leg polylines
+    def _fetch_route_legs(self, waypoints):
+        route_data = self.get_json(self.route_url(waypoints) + '?overview=full&steps=true')
+        if not route_data or not route_data.get('routes'):
+            return [None] * (len(waypoints) - 1)
+
+        route = route_data['routes'][0]
+        if all(leg.get('steps') for leg in route['legs']):
+            leg_polylines = []
+            for leg in route['legs']:
+                points = []
+                for step in leg['steps']:
+                    for point in decode(step['geometry']):
+                        if not points or points[-1] != point:
+                            points.append(point)
+                leg_polylines.append(points)
+        else:
+            leg_polylines = self._split_geometry(decode(route['geometry']), route_data.get('waypoints', []), len(route['legs']))
+
+        legs = []
+        for (origin, destination), leg, points in zip(zip(waypoints[:-1], waypoints[1:]), route['legs'], leg_polylines):
+            leg_route = {'polyline': points, 'distance': leg['distance'] / 1000}  # Convert meters to kilometers
+            if self.cache is not None:
+                self.cache.set(origin, destination, leg_route, self.profile)
+            legs.append(leg_route)
+        return legs
+
+    # Split an overview geometry at the vertices closest to the snapped waypoints, searching forward
+    @staticmethod
+    def _split_geometry(points, snapped_waypoints, num_legs):
+        if len(snapped_waypoints) != num_legs + 1:
+            return [list(points)] if num_legs == 1 else [[] for _ in range(num_legs)]
+        coords = np.array(points, dtype=float)
+        cuts = [0]
+        for waypoint in snapped_waypoints[1:-1]:
+            lon, lat = waypoint['location']
+            offset = cuts[-1]
+            cuts.append(offset + int(np.argmin(((coords[offset:] - (lat, lon)) ** 2).sum(axis=1))))
+        cuts.append(len(points) - 1)
+        return [list(points[cuts[k]:cuts[k + 1] + 1]) for k in range(num_legs)]
+
+    def _count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+# Function to get the process-wide routing client: the ROUTING_BACKENDS chain (OSRM with the shared route cache,
+# then the local road graph and straight lines as fallbacks)
+def get_routing_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            # Imported here, the backends module builds on this one
+            from routing_backends import build_routing_client
+            _default_client = build_routing_client()
+        return _default_client
+
+
+# Function to replace the process-wide routing client, e.g. with a client of a local or stubbed OSRM server
+def set_routing_client(client):
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
@@ -0,0 +1,132 @@
+import hashlib
+import importlib.util
+import os
+import re
+
+from scheduling import SCHEDULE_CHUNK_ROWS, SCHEDULE_COLUMNS
+
+# Streaming export of a CompactSchedule: every format is written chunk by chunk from the visit arrays,
+# so exporting a large plan never builds the full row-per-visit frame
+EXPORT_FORMATS = ('parquet', 'csv', 'xlsx')
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+DOCX_AVAILABLE = importlib.util.find_spec('docxtpl') is not None
+
+# Parquet cannot store the (lat, lon) tuples of 'Coordinates', Latitude and Longitude carry the same data
+PARQUET_COLUMNS = [column for column in SCHEDULE_COLUMNS if column != 'Coordinates']
+EXCEL_MAX_ROWS = 1048576  # Rows per worksheet, the header included; longer plans continue on a new sheet
+
+
+# Function to write a schedule as Parquet, one row group per chunk
+def write_parquet(schedule, path, chunk_rows=SCHEDULE_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for frame in schedule.iter_frames(chunk_rows, PARQUET_COLUMNS):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        if writer is None:  # Empty schedule, still write the columns
+            table = pa.Table.from_pandas(schedule.to_frame(columns=PARQUET_COLUMNS), preserve_index=False)
+            writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+# Function to write a schedule as CSV, appending one chunk at a time
+def write_csv(schedule, path, chunk_rows=SCHEDULE_CHUNK_ROWS):
+    with open(path, 'w', newline='') as f:
+        header = True
+        for frame in schedule.iter_frames(chunk_rows):
+            frame.to_csv(f, index=False, header=header)
+            header = False
+        if header:
+            schedule.to_frame().to_csv(f, index=False)
+    return path
+
+
+# Function to write a schedule as an Excel workbook with a write-only (streaming) openpyxl workbook
+# 'Coordinates' is written as text, like pandas does
+def write_excel(schedule, path, chunk_rows=SCHEDULE_CHUNK_ROWS):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows = None, EXCEL_MAX_ROWS
+    for frame in schedule.iter_frames(chunk_rows):
+        frame['Coordinates'] = frame['Coordinates'].astype(str)
+        for row in frame.itertuples(index=False, name=None):
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet('Sheet1' if sheet is None else f"Sheet{len(workbook.worksheets) + 1}")
+                sheet.append(SCHEDULE_COLUMNS)
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet('Sheet1').append(SCHEDULE_COLUMNS)
+    workbook.save(path)
+    return path
+
+
+# Function to write a schedule in one of EXPORT_FORMATS
+def write_schedule(schedule, path, export_format, chunk_rows=SCHEDULE_CHUNK_ROWS):
+    if export_format == 'parquet':
+        if not PARQUET_AVAILABLE:
+            raise ImportError("Parquet export needs pyarrow")
+        return write_parquet(schedule, path, chunk_rows)
+    if export_format == 'csv':
+        return write_csv(schedule, path, chunk_rows)
+    if export_format == 'xlsx':
+        return write_excel(schedule, path, chunk_rows)
+    raise ValueError(f"Unknown export format '{export_format}', expected one of {EXPORT_FORMATS}")
+
+
+# Function to get the template context of one salesman's journey plan:
+# {'salesman', 'outlets', 'km', 'days': [{'day', 'outlets', 'km', 'visits': [{'order', 'outlet', 'distance',
+# 'latitude', 'longitude'}, ...]}, ...]}
+def journey_context(salesman, frame):
+    days = []
+    for day, visits in frame.groupby('Day', sort=False):
+        days.append({
+            'day': day,
+            'outlets': len(visits),
+            'km': round(float(visits['Distance'].sum()), 3),
+            'visits': [{'order': order, 'outlet': outlet, 'distance': round(distance, 3), 'latitude': round(latitude, 6),
+                        'longitude': round(longitude, 6)}
+                       for order, outlet, distance, latitude, longitude in visits[
+                           ['Visit Order', 'NAMA TOKO', 'Distance', 'Latitude', 'Longitude']].itertuples(index=False, name=None)],
+        })
+    return {'salesman': salesman, 'outlets': len(frame), 'km': round(float(frame['Distance'].sum()), 3), 'days': days}
+
+
+# Function to get a file name for a salesman's document, names that clash once sanitised (or only differ in case)
+# get a short hash of the salesman so no document overwrites another
+def journey_file_name(salesman, used_names):
+    file_name = re.sub(r'[^\w\- ]', '_', str(salesman)).strip() or 'salesman'
+    if file_name.lower() in used_names:
+        file_name = f"{file_name}-{hashlib.sha1(str(salesman).encode()).hexdigest()[:8]}"
+    used_names.add(file_name.lower())
+    return file_name
+
+
+# Function to render one docxtpl journey-plan document per salesman from a .docx template (see journey_context
+# for the template variables), one salesman's visits at a time; returns the written paths
+def write_journey_documents(schedule, template_path, output_dir):
+    if not DOCX_AVAILABLE:
+        raise ImportError("Journey-plan documents need docxtpl")
+    from docxtpl import DocxTemplate
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    used_names = set()
+    for salesman, frame in schedule.salesman_frames(PARQUET_COLUMNS):
+        document = DocxTemplate(template_path)
+        document.render(journey_context(salesman, frame))
+        path = os.path.join(output_dir, f"{journey_file_name(salesman, used_names)}.docx")
+        document.save(path)
+        written.append(path)
+    return written
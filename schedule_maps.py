@@ -0,0 +1,369 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import folium
+
+from map_layers import (COLORED_MARKER_CALLBACK, VISIT_ORDER_MARKER_CALLBACK, add_fast_markers, add_grouped_lines,
+                        use_high_volume)
+from routing_client import get_routing_client
+from scheduling import frame_hash, get_process_pool
+
+# Define colors for different days
+DAY_COLORS = {'Monday': 'blue', 'Tuesday': 'green', 'Wednesday': 'red', 'Thursday': 'orange', 'Friday': 'purple'}
+
+# Rendered maps are stored gzipped and keyed on their inputs here, with one manifest per schedule version
+MAP_ARTIFACT_DIR = os.environ.get('MAP_ARTIFACT_DIR', os.path.join('.cache', 'maps'))
+MAP_COLUMNS = ['NAMA TOKO', 'Day', 'Visit Order', 'Latitude', 'Longitude']  # The schedule columns a map is drawn from
+MAP_TTL_SECONDS = 7 * 24 * 3600  # Like the route cache, maps and manifests not used for a week are removed
+MAP_MAX_BYTES = 512 * 1024 * 1024  # Above this, the least recently used maps are removed
+MAP_PRUNE_EVERY = 100  # Stored maps between two prunes
+
+
+# Function to create a text-based icon for the visit order number
+def create_visit_order_icon(visit_order):
+    return folium.DivIcon(html=f'<div style="font-size: 12pt; color: white; background-color: #645440; border-radius: 50%; '
+                                f'width: 20px; height: 20px; line-height: 20px; text-align: center;">{visit_order}</div>')
+
+
+# Function to collect each day route of a schedule as (color, ordered waypoint list), the office first
+# Consecutive visit orders of the same day are connected, the first visit of a day starts at the office
+def day_route_waypoints(filtered_schedule, office_latitude, office_longitude):
+    # Initialize variables to track previous outlet's day and visit order
+    prev_outlet_day = None
+    prev_outlet_visit_order = None
+
+    day_routes = []
+    for outlet_lat, outlet_lon, day, visit_order in filtered_schedule[['Latitude', 'Longitude', 'Day', 'Visit Order']].itertuples(index=False):
+        # Assign color for polyline based on day
+        marker_color = DAY_COLORS.get(day, 'navy')
+
+        if visit_order == 1:
+            # Connect outlet with Visit Order 1 to office
+            day_routes.append((marker_color, [(office_latitude, office_longitude), (outlet_lat, outlet_lon)]))
+        elif prev_outlet_day == day and prev_outlet_visit_order == visit_order - 1:
+            # Connect to previous outlet if in the same day and consecutive visit order
+            day_routes[-1][1].append((outlet_lat, outlet_lon))
+        else:
+            day_routes.append((marker_color, [(outlet_lat, outlet_lon)]))
+
+        # Update variables for next iteration
+        prev_outlet_day = day
+        prev_outlet_visit_order = visit_order
+
+    return [(color, waypoints) for color, waypoints in day_routes if len(waypoints) > 1]
+
+
+# Function to generate Folium map
+# day_legs are the routed legs of every day route (as returned by route_legs_many), fetched here when not given
+def generate_folium_map(df, filtered_schedule, office_latitude, office_longitude, map_width=800, map_height=600, day_legs=None):
+    m = folium.Map(location=[office_latitude, office_longitude], zoom_start=10)
+
+    # Add marker for the office with emoji
+    folium.Marker(
+        location=[office_latitude, office_longitude],
+        popup="PT. RMS BEKASI🏢",
+        icon=folium.Icon(color='green', icon='briefcase', prefix='fa')
+    ).add_to(m)
+
+    # Large schedules are drawn in high-volume mode, with all outlet markers in one client-side styled payload
+    high_volume = use_high_volume(len(filtered_schedule) if not filtered_schedule.empty else len(df))
+
+    if not filtered_schedule.empty:
+        # Add marker for each outlet with its visit order number
+        if high_volume:
+            popup_messages = filtered_schedule['NAMA TOKO'].astype(str) + " \n Day: " + filtered_schedule['Day'].astype(str)
+            add_fast_markers(m, filtered_schedule[['Latitude', 'Longitude']], popup_messages, filtered_schedule['Visit Order'],
+                             callback=VISIT_ORDER_MARKER_CALLBACK)
+        else:
+            for _, row in filtered_schedule.iterrows():
+                popup_message = f"{row['NAMA TOKO']} \n Day: {row['Day']}"
+                folium.Marker(location=[row['Latitude'], row['Longitude']], popup=popup_message,
+                              icon=create_visit_order_icon(row['Visit Order'])).add_to(m)
+
+        # Fetch every day route with one request each and draw the per-leg polylines
+        day_routes = day_route_waypoints(filtered_schedule, office_latitude, office_longitude)
+        if day_legs is None:
+            day_legs = get_routing_client().route_legs_many([waypoints for _, waypoints in day_routes])
+        for (polyline_color, _), legs in zip(day_routes, day_legs):
+            for route in legs:
+                if route and route['polyline']:
+                    folium.PolyLine(locations=route['polyline'], color=polyline_color).add_to(m)
+
+    else:  # If no outlets are visited
+        # Connect each standalone outlet to the office
+        if high_volume:
+            outlet_coords = df[['Latitude', 'Longitude']].to_numpy(dtype=float)
+            popup_messages = df['NAMA TOKO'].astype(str) + " - Standalone Outlet"
+            add_fast_markers(m, outlet_coords, popup_messages, ['gray'] * len(df), callback=COLORED_MARKER_CALLBACK)
+            add_grouped_lines(m, [(office_latitude, office_longitude)] * len(df), outlet_coords, ['Standalone'] * len(df),
+                              {'Standalone': 'gray'}, weight=3, opacity=1.0)
+        else:
+            for _, row in df.iterrows():
+                outlet_name = row['NAMA TOKO']
+                outlet_lat = row['Latitude']
+                outlet_lon = row['Longitude']
+                popup_message = f"{outlet_name} - Standalone Outlet"
+                folium.Marker(location=[outlet_lat, outlet_lon], popup=popup_message, icon=folium.Icon(color='gray')).add_to(m)
+                folium.PolyLine(locations=[(office_latitude, office_longitude), (outlet_lat, outlet_lon)], color='gray').add_to(m)
+
+    # Create HTML string for the map
+    m_html = m._repr_html_()
+
+    # Adjust map size using custom CSS
+    m_html = f'<div style="width: {map_width}px; height: {map_height}px">{m_html}</div>'
+
+    return m_html
+
+
+# Store of rendered maps: each map is stored once under the hash of its inputs (see map_key), as the HTML itself
+# differs on every render (Folium's random element ids), and a manifest per schedule version maps every
+# (salesman, day) pair to the key of its map, so pairs that did not change between versions share one map
+# Files are pruned by age (ttl_seconds since their last use) and total map size (max_bytes, least recently used first)
+class MapArtifactStore:
+    def __init__(self, directory=MAP_ARTIFACT_DIR, ttl_seconds=MAP_TTL_SECONDS, max_bytes=MAP_MAX_BYTES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._manifests = {}
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    # Function to store a rendered map under its key, returns the key
+    def put(self, digest, html):
+        path = self._artifact_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.{os.getpid()}.{threading.get_ident()}.tmp", 'wb') as f:
+                f.write(gzip.compress(html.encode('utf-8'), compresslevel=6))
+            os.replace(f.name, path)
+            with self._lock:
+                self._puts_since_prune += 1
+                prune = self._puts_since_prune >= MAP_PRUNE_EVERY
+            if prune:
+                self.prune()
+        return digest
+
+    # Function to check whether a map is stored under a key
+    def contains(self, digest):
+        return os.path.exists(self._artifact_path(digest))
+
+    # Function to load a rendered map by key, None when it is not stored
+    # A loaded map counts as used: its modification time is the last use the pruning goes by
+    def get(self, digest):
+        try:
+            with open(self._artifact_path(digest), 'rb') as f:
+                html = gzip.decompress(f.read()).decode('utf-8')
+            os.utime(f.name)
+            return html
+        except OSError:
+            return None
+
+    # Function to get the {pair key: map key} manifest of a schedule version
+    def manifest(self, schedule_key):
+        with self._lock:
+            if schedule_key not in self._manifests:
+                try:
+                    with open(self._manifest_path(schedule_key)) as f:
+                        self._manifests[schedule_key] = json.load(f)
+                except (OSError, ValueError):
+                    return {}
+            return dict(self._manifests[schedule_key])
+
+    # Function to add entries to the manifest of a schedule version, merged with what other writers recorded
+    def record(self, schedule_key, entries):
+        with self._lock:
+            manifest = dict(self._manifests.get(schedule_key, {}))
+            try:
+                with open(self._manifest_path(schedule_key)) as f:
+                    manifest.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+            manifest.update(entries)
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._manifest_path(schedule_key)
+            with open(f"{path}.{threading.get_ident()}.tmp", 'w') as f:
+                json.dump(manifest, f)
+            os.replace(f.name, path)
+            self._manifests[schedule_key] = manifest
+
+    # Function to load the map of a (salesman, day) pair of a schedule version, None when it is not rendered yet
+    def lookup(self, schedule_key, salesman, day):
+        digest = self.manifest(schedule_key).get(pair_key(salesman, day))
+        html = self.get(digest) if digest else None
+        with self._lock:
+            self.counters['hits' if html is not None else 'misses'] += 1
+        return html
+
+    # Function to remove the maps and manifests unused for ttl_seconds, then the least recently used maps
+    # above max_bytes; returns the number of files removed
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._puts_since_prune = 0
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        removed = []
+        kept_bytes = 0
+        for modified, size, path in sorted(files, reverse=True):  # Most recently used first
+            is_map = path.endswith('.html.gz')
+            if modified < now - self.ttl_seconds or (is_map and kept_bytes + size > self.max_bytes):
+                removed.append(path)
+            elif is_map:
+                kept_bytes += size
+        for path in removed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            for path in removed:
+                if path.endswith('.json'):
+                    self._manifests.pop(os.path.basename(path)[:-len('.json')], None)
+            self.counters['evictions'] += len(removed)
+        return len(removed)
+
+    # Function to return hit/miss counters for monitoring
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def _artifact_path(self, digest):
+        return os.path.join(self.directory, digest[:2], f"{digest}.html.gz")
+
+    def _manifest_path(self, schedule_key):
+        return os.path.join(self.directory, f"{schedule_key}.json")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+# Function to get the process-wide map artifact store
+def get_map_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = MapArtifactStore()
+        return _default_store
+
+
+# Function to get the manifest key of a (salesman, day) pair
+def pair_key(salesman, day):
+    return f"{salesman}\t{day}"
+
+
+# Function to get the artifact key of a map: the hash of the visits it draws and the office
+def map_key(filtered_schedule, office_latitude, office_longitude):
+    return hashlib.sha1(f"{frame_hash(filtered_schedule[MAP_COLUMNS])}-{office_latitude}-{office_longitude}".encode()).hexdigest()
+
+
+# Function to render the map of one (salesman, day) pair and store it, runs in the worker processes
+# task is (map key, schedule rows of the pair, office latitude, office longitude, routed day legs, artifact directory)
+# The legs are routed by the parent, so the workers never build routing clients of their own
+def render_map_artifact(task):
+    key, filtered_schedule, office_latitude, office_longitude, day_legs, directory = task
+    html = generate_folium_map(filtered_schedule.iloc[:0], filtered_schedule, office_latitude, office_longitude,
+                               day_legs=day_legs)
+    return MapArtifactStore(directory).put(key, html)
+
+
+# Function to check whether routed day legs can be kept: every leg routed, none by a fallback backend
+# (a straight-line or local-graph map stored while OSRM is down would be served once it is back)
+def complete_legs(day_legs):
+    return all(leg is not None and not leg.get('fallback') for legs in day_legs for leg in legs)
+
+
+# Function to pre-render the map of every (salesman, day) pair of a schedule version
+# The routes of all pairs are fetched first in one batch through the routing client (and its fallbacks), then the
+# maps are rendered on the shared process pool when workers > 1; pairs already in the manifest are skipped, and
+# pairs whose map is already stored (unchanged since an earlier version) are only recorded. Pairs with legs
+# missing or answered by a fallback backend are not stored, they are rendered on demand until routing recovers
+def render_schedule_maps(scheduling_df, schedule_key, office_coord, store=None, workers=1):
+    store = store or get_map_store()
+    office_latitude, office_longitude = office_coord
+    done = store.manifest(schedule_key)
+    entries, pending = {}, {}
+    for (salesman, day), rows in scheduling_df.groupby(['NAMA SALESMAN', 'Day'], sort=False):
+        if pair_key(salesman, day) in done:
+            continue
+        key = map_key(rows, office_latitude, office_longitude)
+        entries[pair_key(salesman, day)] = key
+        if key not in pending and not store.contains(key):
+            pending[key] = rows
+    if not entries:
+        return done
+
+    day_routes = {key: [waypoints for _, waypoints in day_route_waypoints(rows, office_latitude, office_longitude)]
+                  for key, rows in pending.items()}
+    all_legs = iter(get_routing_client().route_legs_many([waypoints for routes in day_routes.values() for waypoints in routes]))
+    tasks = []
+    for key, rows in pending.items():
+        day_legs = [next(all_legs) for _ in day_routes[key]]
+        if complete_legs(day_legs):
+            tasks.append((key, rows, office_latitude, office_longitude, day_legs, store.directory))
+    unrouted = set(pending) - {task[0] for task in tasks}
+
+    if workers > 1 and len(tasks) > 1:
+        list(get_process_pool(workers).map(render_map_artifact, tasks))
+    else:
+        for task in tasks:
+            render_map_artifact(task)
+    entries = {pair: key for pair, key in entries.items() if key not in unrouted}
+    if entries:
+        store.record(schedule_key, entries)
+    store.prune()
+    return store.manifest(schedule_key)
+
+
+_renders = {}
+_renders_lock = threading.Lock()
+
+
+# Function to start pre-rendering a schedule version in a background thread, once per schedule version at a time
+# Returns the thread, the UI keeps serving (and rendering on demand) while it runs; finished renders are dropped,
+# starting a finished schedule version again only renders what its manifest is missing
+def start_background_render(scheduling_df, schedule_key, office_coord, store=None, workers=1):
+    with _renders_lock:
+        for key in [key for key, thread in _renders.items() if not thread.is_alive()]:
+            del _renders[key]
+        thread = _renders.get(schedule_key)
+        if thread is None:
+            thread = threading.Thread(target=render_schedule_maps, args=(scheduling_df, schedule_key, office_coord, store, workers),
+                                      name='map-render', daemon=True)
+            _renders[schedule_key] = thread
+            thread.start()
+        return thread
+
+
+# Function to get the map of a (salesman, day) pair: loaded from the store when pre-rendered, rendered and stored otherwise
+# (a map routed by a fallback backend is rendered but not stored)
+def load_schedule_map(scheduling_df, schedule_key, salesman, day, office_coord, store=None):
+    store = store or get_map_store()
+    html = store.lookup(schedule_key, salesman, day)
+    if html is None:
+        filtered_schedule = scheduling_df[(scheduling_df['NAMA SALESMAN'] == salesman) & (scheduling_df['Day'] == day)]
+        key = map_key(filtered_schedule, office_coord[0], office_coord[1])
+        html = store.get(key)
+        if html is None:
+            day_routes = day_route_waypoints(filtered_schedule, office_coord[0], office_coord[1])
+            day_legs = get_routing_client().route_legs_many([waypoints for _, waypoints in day_routes])
+            html = generate_folium_map(filtered_schedule.iloc[:0], filtered_schedule, office_coord[0], office_coord[1],
+                                       day_legs=day_legs)
+            if not complete_legs(day_legs):
+                return html
+            store.put(key, html)
+        store.record(schedule_key, {pair_key(salesman, day): key})
+    return html
@@ -0,0 +1,487 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from day_assignment import CONSTRAINT_COLUMNS, outlet_constraints
+from distance_engine import salesman_distance_matrices
+from outlet_index import OutletIndex
+from route_optimizer import greedy_plan, improve_tour, tour_length
+
+SCHEDULE_COLUMNS = ['NAMA SALESMAN', 'Day', 'Visit Order', 'NAMA TOKO', 'Distance', 'Coordinates', 'Latitude', 'Longitude']
+UNASSIGNED_COLUMNS = ['NAMA SALESMAN', 'NAMA TOKO', 'Latitude', 'Longitude', 'Reason']
+
+# Head office the journey plans start from when no distributor office is given (PT. RMS Bekasi)
+DEFAULT_OFFICE_COORD = (-6.558031, 106.691809)
+
+# Number of worker processes used by default, overridable with SCHEDULING_WORKERS
+DEFAULT_WORKERS = int(os.environ.get('SCHEDULING_WORKERS', os.cpu_count() or 1))
+
+# Below this many outlets the process start-up costs more than it saves, schedule serially
+MIN_PARALLEL_OUTLETS = 2000
+
+# update_scheduling repairs the changed salesmen one by one; when more than this share of the salesmen changed,
+# scheduling everything again (in parallel) is faster
+INCREMENTAL_MAX_CHANGED = 0.5
+
+# Visits per frame when a schedule is exported chunk by chunk
+SCHEDULE_CHUNK_ROWS = 50000
+
+
+# Function to get a content hash of a DataFrame (values and column names), used to key cached results
+def frame_hash(df):
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(repr(list(df.columns)).encode())
+    return digest.hexdigest()
+
+
+# Function to get the default number of outlets visited per day for an outlet table (one per sheet column)
+def default_limit(df):
+    return df.shape[1]
+
+
+# Function to drop the outlets that cannot be scheduled because they have no coordinates
+def prepare_outlets(df):
+    return df.dropna(subset=['Latitude'])
+
+
+# Function to summarise a schedule (frame or CompactSchedule) per salesman: outlets, days, scheduled km and
+# the greedy baseline km
+def salesman_totals(scheduling_df):
+    if isinstance(scheduling_df, CompactSchedule):
+        totals = _compact_totals(scheduling_df)
+    else:
+        totals = scheduling_df.groupby('NAMA SALESMAN', sort=False).agg(
+            Outlets=('NAMA TOKO', 'size'), Days=('Day', 'nunique'), Km=('Distance', 'sum')).reset_index()
+    route_report = scheduling_df.attrs.get('route_report', {})
+    totals['Baseline Km'] = [route_report.get(salesman, {}).get('baseline_km') for salesman in totals['NAMA SALESMAN']]
+    return totals
+
+
+# Columnar schedule: one entry per visit with integer outlet ids into a shared outlet table, categorical
+# salesman and day, and the visit order and leg km as numeric arrays. Rows are grouped by salesman in schedule
+# order; to_frame() builds the SCHEDULE_COLUMNS frame for any slice of visits, so large plans can be exported
+# chunk by chunk (see schedule_export) without ever holding the full row-per-visit frame
+class CompactSchedule:
+    def __init__(self, salesmen, days, visit_order, outlet_ids, distances, outlet_names, latitudes, longitudes, attrs=None):
+        self.salesmen = salesmen  # pd.Categorical per visit
+        self.days = days  # pd.Categorical per visit
+        self.visit_order = visit_order  # int32 per visit
+        self.outlet_ids = outlet_ids  # int32 per visit, position of the outlet in the scheduled outlet table
+        self.distances = distances  # float64 km per visit, from the office or the previous outlet
+        self.outlet_names = outlet_names  # Outlet table: object array of names
+        self.latitudes = latitudes  # Outlet table: coordinates in the requested coordinate dtype
+        self.longitudes = longitudes
+        self.attrs = attrs if attrs is not None else {}
+
+    def __len__(self):
+        return len(self.outlet_ids)
+
+    # Function to build the schedule frame (SCHEDULE_COLUMNS or a subset) of the visits start:stop
+    def to_frame(self, start=0, stop=None, columns=SCHEDULE_COLUMNS):
+        rows = slice(start, stop)
+        outlet_ids = self.outlet_ids[rows]
+        latitudes = self.latitudes[outlet_ids].astype(np.float64)
+        longitudes = self.longitudes[outlet_ids].astype(np.float64)
+        values = {
+            'NAMA SALESMAN': lambda: np.asarray(self.salesmen[rows], dtype=object),
+            'Day': lambda: np.asarray(self.days[rows], dtype=object),
+            'Visit Order': lambda: self.visit_order[rows].astype(np.int64),
+            'NAMA TOKO': lambda: self.outlet_names[outlet_ids],
+            'Distance': lambda: self.distances[rows],
+            'Coordinates': lambda: list(zip(latitudes.tolist(), longitudes.tolist())),
+            'Latitude': lambda: latitudes,
+            'Longitude': lambda: longitudes,
+        }
+        frame = pd.DataFrame({column: values[column]() for column in columns}, columns=list(columns))
+        frame.attrs = dict(self.attrs)
+        return frame
+
+    # Function to iterate over the schedule as frames of at most chunk_rows visits
+    def iter_frames(self, chunk_rows=SCHEDULE_CHUNK_ROWS, columns=SCHEDULE_COLUMNS):
+        for start in range(0, len(self), chunk_rows):
+            yield self.to_frame(start, start + chunk_rows, columns)
+
+    # Function to iterate over (salesman, frame of the salesman's visits), in schedule order
+    def salesman_frames(self, columns=SCHEDULE_COLUMNS):
+        codes = self.salesmen.codes
+        starts = np.flatnonzero(np.diff(codes, prepend=-1) != 0)
+        for start, stop in zip(starts, list(starts[1:]) + [len(codes)]):
+            yield self.salesmen.categories[codes[start]], self.to_frame(start, stop, columns)
+
+
+# Function to aggregate the salesman totals straight from the visit arrays of a CompactSchedule
+def _compact_totals(schedule):
+    codes = schedule.salesmen.codes.astype(np.int64)
+    n_salesmen, n_days = len(schedule.salesmen.categories), max(len(schedule.days.categories), 1)
+    present = pd.unique(codes)  # Salesmen with visits, in schedule order
+    outlets = np.bincount(codes, minlength=n_salesmen)
+    km = np.bincount(codes, weights=schedule.distances, minlength=n_salesmen)
+    days = np.bincount(np.unique(codes * n_days + schedule.days.codes) // n_days, minlength=n_salesmen)
+    return pd.DataFrame({'NAMA SALESMAN': np.asarray(schedule.salesmen.categories, dtype=object)[present],
+                         'Outlets': outlets[present], 'Days': days[present], 'Km': km[present]})
+
+
+# Function to schedule one salesman from compact arrays, runs in the worker processes
+# task is (salesman, outlet names, (n, 2) lat/lon array, days, office coord, limit, distance mode, optimizer,
+# planner, outlet constraints); planner (e.g. BalancedDayPlanner) replaces the split of the outlets into days
+# Returns the visits as arrays (outlet position in the task, day position in the day labels, visit order, leg km)
+# with the ordered day labels of the plan (e.g. 'Monday (Week 1)' for a biweekly planner), and the report of the salesman: km, and the outlets that could not be scheduled
+def schedule_salesman(task):
+    salesman, names, coords, days, office_location, limit, distance_mode, optimizer, planner, constraints = task
+
+    # Build an array-backed outlet index once per salesman, duplicate outlet names keep their own rows
+    outlet_index = OutletIndex(names, coords[:, 0], coords[:, 1])
+
+    # Calculate office-to-outlet and outlet-to-outlet distances for the salesman in one batch
+    office_distances, outlet_distance_matrix = salesman_distance_matrices(office_location, outlet_index.coords, mode=distance_mode)
+
+    # Split outlets into days of up to limit outlets, starting from the outlet nearest to the office
+    # and visiting the nearest outlet next (greedy baseline)
+    tours = greedy_plan(office_distances, outlet_distance_matrix, limit)
+    baseline_km = sum(tour_length(tour, office_distances, outlet_distance_matrix) for tour in tours)
+    day_report = None
+    if planner is not None:
+        day_tours, unassigned, day_report = planner.plan(office_distances, outlet_distance_matrix, outlet_index.coords,
+                                                         office_location, days, limit, constraints, optimizer=optimizer)
+    else:
+        if optimizer is not None:
+            tours = optimizer.plan(office_distances, outlet_distance_matrix, outlet_index.coords, office_location, limit)
+        # Tours beyond the salesman's last day have no day to go to, their outlets are reported as unassigned
+        day_tours = list(zip(days, tours))
+        unassigned = [(outlet, 'no day left') for tour in tours[len(days):] for outlet in tour]
+    report = {'baseline_km': baseline_km,
+              'optimized_km': sum(tour_length(tour, office_distances, outlet_distance_matrix) for _, tour in day_tours),
+              'unassigned': [[salesman, outlet_index.names[outlet], *outlet_index.coordinate(outlet), reason]
+                             for outlet, reason in unassigned]}
+    if day_report is not None:
+        report['days'] = day_report
+
+    # Flatten the day tours into visit arrays; outlets are referenced by position, so repeated outlet names
+    # keep their own row and only numbers travel back from the worker process
+    sizes = [len(tour) for _, tour in day_tours]
+    outlets = np.fromiter((outlet for _, tour in day_tours for outlet in tour), dtype=np.int32, count=sum(sizes))
+    day_labels = list(dict.fromkeys(day for day, _ in day_tours))
+    day_position = {day: position for position, day in enumerate(day_labels)}
+    day_ids = np.repeat(np.array([day_position[day] for day, _ in day_tours], dtype=np.int16), sizes)
+    visit_order = np.concatenate([np.arange(1, size + 1, dtype=np.int32) for size in sizes]) if sizes else np.empty(0, dtype=np.int32)
+    distances = np.where(visit_order == 1, office_distances[outlets], outlet_distance_matrix[np.roll(outlets, 1), outlets])
+
+    return (outlets, day_ids, visit_order, distances, day_labels), report
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+# Function to get the shared process pool, kept alive across calls so workers only start once
+# The pool is shared by the script thread and the background map renders: a pool at least as large as asked for
+# is reused, so a smaller request never shuts down a pool another thread is submitting to
+def get_process_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn instead of fork: the calling process (Streamlit) runs threads that must not be forked
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+# Function to drop a pool whose worker died, the next get_process_pool starts a new one
+def _discard_process_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+# Function to run the salesman tasks on the process pool, results come back in task order
+# Larger salesmen are submitted first so one big territory does not finish last on its own
+def _run_parallel(tasks, workers):
+    pool = get_process_pool(workers)
+    order = sorted(range(len(tasks)), key=lambda index: -len(tasks[index][1]))
+    try:
+        futures = {index: pool.submit(schedule_salesman, tasks[index]) for index in order}
+        return [futures[index].result() for index in range(len(tasks))]
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        raise
+
+
+# Function to generate scheduling with balanced visit orders across days, as a schedule frame (see
+# generate_compact_schedule for the arguments)
+def generate_scheduling(df, office_coord, limit, distance_mode='geodesic', optimizer=None, workers=1, planner=None):
+    return generate_compact_schedule(df, office_coord, limit, distance_mode=distance_mode, optimizer=optimizer,
+                                     workers=workers, planner=planner, coordinate_dtype='float64').to_frame()
+
+
+# Function to generate scheduling with balanced visit orders across days, as a CompactSchedule
+# limit is the maximum number of outlets visited per day
+# distance_mode selects the distance engine: 'geodesic' (exact), 'haversine' (fast) or 'road' (OSRM road distances)
+# optimizer is an optional route optimiser stage (e.g. RouteOptimizer) replacing the greedy day plan;
+# the km of both plans per salesman are reported in scheduling_df.attrs['route_report']
+# planner is an optional day planner (e.g. BalancedDayPlanner) that assigns the outlets to days by capacity,
+# time windows and visit frequency instead of filling the days in order
+# Outlets that could not be scheduled are listed in scheduling_df.attrs['unassigned'] (see unassigned_outlets)
+# workers > 1 schedules the salesmen in parallel processes, falling back to serial when a pool cannot be used
+# coordinate_dtype is the dtype of the outlet coordinates kept by the schedule, by default the dtype of df
+# (see ingestion.read_table); float32 halves them but rounds coordinates to ~1 m
+def generate_compact_schedule(df, office_coord, limit, distance_mode='geodesic', optimizer=None, workers=1, planner=None,
+                              coordinate_dtype=None):
+    # The outlet table of the schedule, visits refer to its rows by position
+    df = df.set_axis(pd.RangeIndex(len(df)))
+    outlet_names = df['NAMA TOKO'].astype(str).to_numpy(dtype=object)
+    latitudes = df['Latitude'].to_numpy(dtype=coordinate_dtype or df['Latitude'].dtype)
+    longitudes = df['Longitude'].to_numpy(dtype=coordinate_dtype or df['Longitude'].dtype)
+
+    # Sort dataframe by 'NAMA SALESMAN' and 'NAMA TOKO' columns (stable, so duplicate outlet names keep their sheet order)
+    df = df.sort_values(by=['NAMA SALESMAN', 'NAMA TOKO'], kind='stable')
+
+    # One compact task per salesman: names, a float lat/lon array and the salesman's days
+    tasks = []
+    positions = []
+    for salesman, group in df.groupby('NAMA SALESMAN', observed=True):
+        tasks.append(_salesman_task(salesman, group, office_coord, limit, distance_mode, optimizer, planner))
+        positions.append(group.index.to_numpy(dtype=np.int32))
+
+    results = None
+    if workers > 1 and len(tasks) > 1 and len(df) >= MIN_PARALLEL_OUTLETS:
+        try:
+            results = _run_parallel(tasks, workers)
+        except (BrokenProcessPool, OSError, PermissionError):
+            results = None
+    if results is None:
+        results = [schedule_salesman(task) for task in tasks]
+
+    # Merge the per-salesman visit arrays in salesman order, so the schedule does not depend on the worker count
+    # The day table is built from the planned day labels, which are not always the outlet table's days
+    day_codes = {}
+    for (*_, day_labels), _ in results:
+        day_codes.update((day, len(day_codes)) for day in day_labels if day not in day_codes)
+    route_report = {}
+    columns = ([], [], [], [], [])
+    for code, (task, task_positions, ((outlets, day_ids, visit_order, distances, day_labels), report)) in enumerate(
+            zip(tasks, positions, results)):
+        task_day_codes = np.array([day_codes[day] for day in day_labels], dtype=np.int16)
+        for values, column in zip(columns, (np.full(len(outlets), code, dtype=np.int16), task_day_codes[day_ids],
+                                            visit_order, task_positions[outlets], distances)):
+            values.append(column)
+        route_report[task[0]] = report
+
+    salesman_codes, day_ids, visit_order, outlet_ids, distances = [
+        np.concatenate(values).astype(dtype, copy=False) if values else np.empty(0, dtype=dtype)
+        for values, dtype in zip(columns, (np.int16, np.int16, np.int32, np.int32, np.float64))]
+    attrs = {'route_report': route_report, 'unassigned': _unassigned_rows(route_report)}
+    return CompactSchedule(pd.Categorical.from_codes(salesman_codes, categories=[task[0] for task in tasks]),
+                           pd.Categorical.from_codes(day_ids, categories=list(day_codes)),
+                           visit_order, outlet_ids, distances, outlet_names, latitudes, longitudes, attrs)
+
+
+# Function to build the schedule_salesman task of one salesman's outlet rows
+def _salesman_task(salesman, group, office_coord, limit, distance_mode, optimizer, planner):
+    days = list(group['DAY'].unique())
+    constraints = outlet_constraints(group, days, planner.service_minutes) if planner is not None else None
+    return (salesman, group['NAMA TOKO'].astype(str).tolist(), group[['Latitude', 'Longitude']].to_numpy(dtype='float64'),
+            days, office_coord, limit, distance_mode, optimizer, planner, constraints)
+
+
+# Function to convert the visit arrays of a schedule_salesman result into schedule rows
+def _visit_rows(task, visits):
+    salesman, names, coords = task[:3]
+    *arrays, day_labels = visits
+    rows = []
+    for outlet, day_id, visit_order, distance in zip(*arrays):
+        latitude, longitude = float(coords[outlet, 0]), float(coords[outlet, 1])
+        rows.append([salesman, day_labels[day_id], int(visit_order), names[outlet], float(distance), (latitude, longitude), latitude, longitude])
+    return rows
+
+
+# Function to collect the unassigned outlets of every salesman's report as rows of UNASSIGNED_COLUMNS
+def _unassigned_rows(route_report):
+    return [dict(zip(UNASSIGNED_COLUMNS, row)) for report in route_report.values() for row in report.get('unassigned', [])]
+
+
+# Function to get the outlets a schedule could not fit (no day, capacity, visit days or time window) as a table
+def unassigned_outlets(scheduling_df):
+    return pd.DataFrame(scheduling_df.attrs.get('unassigned', []), columns=UNASSIGNED_COLUMNS)
+
+
+# Function to get the identity of an outlet row: salesman, name and coordinates rounded to 6 decimals
+def _outlet_key(salesman, name, latitude, longitude):
+    return (salesman, str(name), round(float(latitude), 6), round(float(longitude), 6))
+
+
+# Function to get the outlet keys of every row of an outlet table, as a Counter (names may repeat)
+# with_constraints adds the visit constraint columns (frequency, service time, window, visit days) to the keys
+def _outlet_keys(df, with_constraints=False):
+    keys = [_outlet_key(*row) for row in df[['NAMA SALESMAN', 'NAMA TOKO', 'Latitude', 'Longitude']].itertuples(index=False)]
+    columns = [column for column in CONSTRAINT_COLUMNS if column in df.columns] if with_constraints else []
+    if columns:
+        keys = [key + tuple(str(value) for value in values)
+                for key, values in zip(keys, df[columns].itertuples(index=False))]
+    return Counter(keys)
+
+
+# Function to calculate the cost of inserting outlet x at every position of a day tour (office first)
+def _insertion_costs(tour, x, office_distances, outlet_distance_matrix):
+    tour = np.asarray(tour, dtype=np.int64)
+    if len(tour) == 0:
+        return np.array([office_distances[x]])
+    costs = np.empty(len(tour) + 1)
+    costs[0] = office_distances[x] + outlet_distance_matrix[x, tour[0]] - office_distances[tour[0]]
+    costs[1:-1] = outlet_distance_matrix[tour[:-1], x] + outlet_distance_matrix[x, tour[1:]] - outlet_distance_matrix[tour[:-1], tour[1:]]
+    costs[-1] = outlet_distance_matrix[tour[-1], x]
+    return costs
+
+
+# Function to update the schedule of one salesman whose outlets changed, keeping the untouched days as they are
+# Removed outlets are dropped from their day, added (or moved) outlets are placed by cheapest insertion
+# Returns (rows, report), or None when the outlets no longer fit the salesman's days and a full reschedule is needed
+def _update_salesman(salesman, group, previous_rows, office_location, limit, distance_mode, optimizer):
+    days = list(group['DAY'].unique())
+    outlet_index = OutletIndex.from_frame(group)
+    office_distances, outlet_distance_matrix = salesman_distance_matrices(office_location, outlet_index.coords, mode=distance_mode)
+
+    # Match the previous rows to the new outlet rows by outlet key, whatever is left over was added
+    free_rows = {}
+    for row_id, (name, latitude, longitude) in enumerate(zip(outlet_index.names, outlet_index.latitudes, outlet_index.longitudes)):
+        free_rows.setdefault(_outlet_key(salesman, name, latitude, longitude), []).append(row_id)
+    tours = {}
+    changed_days = set()
+    previous_rows = previous_rows.sort_values('Visit Order', kind='stable')
+    for day, day_rows in previous_rows.groupby('Day', sort=False):
+        tours[day] = []
+        for row in day_rows[['NAMA TOKO', 'Latitude', 'Longitude']].itertuples(index=False):
+            matches = free_rows.get(_outlet_key(salesman, *row))
+            if matches:
+                tours[day].append(matches.pop(0))
+            else:
+                changed_days.add(day)  # Outlet removed or moved away
+    added = sorted(row_id for rows in free_rows.values() for row_id in rows)
+
+    if any(day not in days for day in tours):
+        return None
+
+    for outlet in added:
+        best = None
+        for day, tour in tours.items():
+            if len(tour) < limit:
+                costs = _insertion_costs(tour, outlet, office_distances, outlet_distance_matrix)
+                position = int(np.argmin(costs))
+                if best is None or costs[position] < best[0]:
+                    best = (costs[position], day, position)
+        if best is None:
+            unused_days = [day for day in days if day not in tours]
+            if not unused_days:
+                return None
+            tours[unused_days[0]] = [outlet]
+            changed_days.add(unused_days[0])
+        else:
+            tours[best[1]].insert(best[2], outlet)
+            changed_days.add(best[1])
+
+    if optimizer is not None and changed_days:
+        deadline = time.perf_counter() + getattr(optimizer, 'time_budget', 1.0)
+        for day in changed_days:
+            tours[day] = improve_tour(tours[day], office_distances, outlet_distance_matrix, deadline)
+
+    rows = []
+    for day in days:
+        previous_outlet = None
+        for visit_order, outlet in enumerate(tours.get(day, []), start=1):
+            if previous_outlet is None:
+                distance = float(office_distances[outlet])
+            else:
+                distance = float(outlet_distance_matrix[previous_outlet, outlet])
+            latitude, longitude = outlet_index.coordinate(outlet)
+            rows.append([salesman, day, visit_order, outlet_index.names[outlet], distance, (latitude, longitude), latitude, longitude])
+            previous_outlet = outlet
+
+    baseline_km = sum(tour_length(tour, office_distances, outlet_distance_matrix)
+                      for tour in greedy_plan(office_distances, outlet_distance_matrix, limit))
+    report = {'baseline_km': baseline_km,
+              'optimized_km': sum(tour_length(tour, office_distances, outlet_distance_matrix) for tour in tours.values())}
+    return rows, report
+
+
+# Function to get the share of salesmen (of both tables) whose outlets were added, removed or moved
+# changed_salesmen, when already known (e.g. from the row changes of a sheet version), skips comparing the outlets
+def changed_salesmen_share(previous_df, df, with_constraints=False, changed_salesmen=None):
+    if changed_salesmen is not None:
+        salesmen = set(previous_df['NAMA SALESMAN'].dropna()) | set(df['NAMA SALESMAN'].dropna())
+        return len(salesmen & set(changed_salesmen)) / len(salesmen) if salesmen else 0.0
+    previous_keys = _outlet_keys(previous_df, with_constraints)
+    keys = _outlet_keys(df, with_constraints)
+    salesmen = {key[0] for key in previous_keys} | {key[0] for key in keys}
+    if not salesmen:
+        return 0.0
+    changed = {key[0] for key in (previous_keys - keys) + (keys - previous_keys)}
+    return len(changed) / len(salesmen)
+
+
+# Function to update a previously generated schedule after the outlet table changed
+# Only salesmen whose outlets were added, removed or moved are touched: their changed days are repaired
+# by cheapest insertion, every other salesman keeps the exact same rows. Salesmen that no longer fit
+# their days, and new salesmen, are scheduled from scratch. Must use the same office, limit, distance mode and
+# planner as the previous schedule. With a day planner every changed salesman is planned again from scratch,
+# as one changed outlet can move the balance of all days. What happened per salesman is reported in
+# scheduling_df.attrs['incremental']. changed_salesmen, when already known (e.g. from the row changes of a sheet
+# version), lists the salesmen whose rows changed: the others keep their rows without comparing their outlets
+def update_scheduling(previous_df, previous_schedule, df, office_coord, limit, distance_mode='geodesic', optimizer=None,
+                      planner=None, changed_salesmen=None):
+    previous_df = previous_df.sort_values(by=['NAMA SALESMAN', 'NAMA TOKO'], kind='stable')
+    df = df.sort_values(by=['NAMA SALESMAN', 'NAMA TOKO'], kind='stable')
+    previous_groups = dict(tuple(previous_df.groupby('NAMA SALESMAN', observed=True)))
+    previous_schedule_groups = dict(tuple(previous_schedule.groupby('NAMA SALESMAN', sort=False)))
+    previous_report = previous_schedule.attrs.get('route_report', {})
+
+    scheduling_data = []
+    route_report = {}
+    incremental = {'unchanged': [], 'updated': [], 'rescheduled': []}
+    for salesman, group in df.groupby('NAMA SALESMAN', observed=True):
+        previous_group = previous_groups.get(salesman)
+        previous_rows = previous_schedule_groups.get(salesman)
+        result = None
+        if previous_group is not None and previous_rows is not None:
+            with_constraints = planner is not None
+            if changed_salesmen is not None and salesman not in changed_salesmen:
+                unchanged = True
+            else:
+                unchanged = (_outlet_keys(group, with_constraints) == _outlet_keys(previous_group, with_constraints)
+                             and list(group['DAY'].unique()) == list(previous_group['DAY'].unique()))
+            if unchanged and salesman in previous_report:
+                scheduling_data.extend(previous_rows[SCHEDULE_COLUMNS].values.tolist())
+                route_report[salesman] = previous_report[salesman]
+                incremental['unchanged'].append(salesman)
+                continue
+            if planner is None:
+                result = _update_salesman(salesman, group, previous_rows, office_coord, limit, distance_mode, optimizer)
+            if result is not None:
+                incremental['updated'].append(salesman)
+
+        if result is None:
+            task = _salesman_task(salesman, group, office_coord, limit, distance_mode, optimizer, planner)
+            visits, report = schedule_salesman(task)
+            result = _visit_rows(task, visits), report
+            incremental['rescheduled'].append(salesman)
+
+        rows, report = result
+        scheduling_data.extend(rows)
+        route_report[salesman] = report
+
+    scheduling_df = pd.DataFrame(scheduling_data, columns=SCHEDULE_COLUMNS)
+    scheduling_df.attrs['route_report'] = route_report
+    scheduling_df.attrs['unassigned'] = _unassigned_rows(route_report)
+    scheduling_df.attrs['incremental'] = incremental
+
+    return scheduling_df
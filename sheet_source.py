@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from ingestion import read_table
+
+# Raw sheet snapshots and their validators (ETag / Last-Modified) are kept on disk between restarts
+SHEET_CACHE_DIR = os.environ.get('SHEET_CACHE_DIR', os.path.join('.cache', 'sheets'))
+DEFAULT_POLL_SECONDS = int(os.environ.get('SHEET_POLL_SECONDS', 60))
+
+
+# Function to build the CSV export URL of a Google Sheet
+def sheet_csv_url(sheet_id):
+    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
+
+
+# Function to diff two versions of a table row by row (rows are compared by the hash of all their values)
+# Returns the positions of the rows added in df, of the rows removed from previous_df, and the unchanged count
+def row_changes(previous_df, df):
+    new_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    if previous_df is None:
+        return {'added': np.arange(len(df)), 'removed': np.empty(0, dtype=np.int64), 'unchanged': 0}
+    old_hashes = pd.util.hash_pandas_object(previous_df, index=False).to_numpy()
+
+    # Multiset difference: the k-th copy of a row is unchanged if the other version has at least k copies
+    def unmatched(hashes, other):
+        occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+        available = pd.Series(other).value_counts().reindex(hashes, fill_value=0).to_numpy()
+        return np.flatnonzero(occurrence >= available)
+
+    added = unmatched(new_hashes, old_hashes)
+    removed = unmatched(old_hashes, new_hashes)
+    return {'added': added, 'removed': removed, 'unchanged': len(df) - len(added)}
+
+
+# One immutable version of a sheet: readers get the same snapshot object until a newer version is fetched
+# changes are relative to the version with content hash previous_hash (None for the first version)
+class SheetSnapshot:
+    def __init__(self, df, content_hash, etag=None, last_modified=None, version=0, changes=None, removed_rows=None,
+                 previous_hash=None):
+        self.df = df
+        self.content_hash = content_hash
+        self.previous_hash = previous_hash
+        self.etag = etag
+        self.last_modified = last_modified
+        self.version = version
+        self.changes = changes if changes is not None else row_changes(None, df)
+        self.removed_rows = removed_rows if removed_rows is not None else df.iloc[:0]
+        self.fetched_at = time.time()
+
+    # Function to get a private copy of the data for a reader that modifies it
+    def frame(self):
+        return self.df.copy()
+
+    # Function to get the values of a column in the rows added or removed by this version, e.g. the salesmen to reschedule
+    def changed_values(self, column):
+        added = self.df[column].iloc[self.changes['added']] if column in self.df.columns else pd.Series(dtype=object)
+        removed = self.removed_rows[column] if column in self.removed_rows.columns else pd.Series(dtype=object)
+        return set(added.dropna()) | set(removed.dropna())
+
+    # Function to describe the snapshot in one line for the UI
+    def describe(self):
+        fetched = time.strftime('%H:%M:%S', time.localtime(self.fetched_at))
+        return (f"Sheet version {self.version} ({len(self.df)} rows, checked {fetched}): "
+                f"{len(self.changes['added'])} added, {len(self.changes['removed'])} removed, "
+                f"{self.changes['unchanged']} unchanged rows")
+
+
+# Sheet source adapter: conditional fetches (ETag / Last-Modified) over HTTP or a local file, a local snapshot
+# cache, a background refresher that polls on an interval, and row-level change detection between versions
+class SheetSource:
+    def __init__(self, url, cache_dir=SHEET_CACHE_DIR, poll_seconds=DEFAULT_POLL_SECONDS, session=None, timeout=30):
+        self.url = url
+        self.cache_dir = cache_dir
+        self.poll_seconds = poll_seconds
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.counters = {'checks': 0, 'not_modified': 0, 'downloads': 0, 'unchanged_content': 0, 'errors': 0}
+        self._counters_lock = threading.Lock()
+        self.last_error = None
+
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load_local_snapshot()
+
+    # Function to get the latest snapshot, None before the first successful fetch
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot
+
+    # Function to check the source for a newer version and swap in a new snapshot when the content changed
+    # An unchanged source costs one conditional request; fetch errors keep the current snapshot when there is one
+    def fetch(self):
+        with self._fetch_lock:
+            current = self.snapshot()
+            self._count('checks')
+            try:
+                content, etag, last_modified = self._request(current)
+            except (requests.RequestException, OSError) as error:
+                self._count('errors')
+                self.last_error = error
+                if current is None:
+                    raise
+                return current
+
+            if content is None:
+                self._count('not_modified')
+                return current
+
+            self._count('downloads')
+            content_hash = hashlib.sha1(content).hexdigest()
+            if current is not None and current.content_hash == content_hash:
+                # Validators changed but the data did not, keep the parsed frame and report no changes
+                self._count('unchanged_content')
+                snapshot = SheetSnapshot(current.df, content_hash, etag, last_modified, current.version,
+                                         {'added': np.empty(0, dtype=np.int64), 'removed': np.empty(0, dtype=np.int64),
+                                          'unchanged': len(current.df)}, previous_hash=current.content_hash)
+            else:
+                df = read_table(content, 'sheet.csv', source=self.url)
+                previous_df = current.df if current is not None else None
+                changes = row_changes(previous_df, df)
+                removed_rows = previous_df.iloc[changes['removed']] if previous_df is not None else None
+                snapshot = SheetSnapshot(df, content_hash, etag, last_modified,
+                                         current.version + 1 if current is not None else 1, changes, removed_rows,
+                                         current.content_hash if current is not None else None)
+            self._save_local_snapshot(content, snapshot)
+            with self._lock:
+                self._snapshot = snapshot
+            return snapshot
+
+    # Function to start the background refresher thread
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll, name='sheet-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        with self._counters_lock:
+            return dict(self.counters)
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.fetch()
+            except Exception as error:  # Keep polling, the readers still have the last snapshot
+                self.last_error = error
+
+    def _count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    # Request the source, returns (content, etag, last_modified) with content None when not modified
+    def _request(self, current):
+        path = self._local_path()
+        if path is not None:
+            stat = os.stat(path)
+            etag = f"{stat.st_mtime_ns}-{stat.st_size}"
+            if current is not None and current.etag == etag:
+                return None, current.etag, current.last_modified
+            with open(path, 'rb') as f:
+                return f.read(), etag, None
+
+        headers = {}
+        if current is not None and current.etag:
+            headers['If-None-Match'] = current.etag
+        if current is not None and current.last_modified:
+            headers['If-Modified-Since'] = current.last_modified
+        response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None, current.etag, current.last_modified
+        response.raise_for_status()
+        return response.content, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+    def _local_path(self):
+        if self.url.startswith('file://'):
+            return self.url[len('file://'):]
+        if '://' not in self.url:
+            return self.url
+        return None
+
+    def _cache_paths(self):
+        key = hashlib.sha1(self.url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.csv"), os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_local_snapshot(self):
+        if not self.cache_dir:
+            return
+        data_path, meta_path = self._cache_paths()
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(data_path, 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return
+        if hashlib.sha1(content).hexdigest() == meta.get('content_hash'):
+            self._snapshot = SheetSnapshot(read_table(content, 'sheet.csv', source=self.url), meta['content_hash'],
+                                           meta.get('etag'), meta.get('last_modified'), meta.get('version', 0))
+
+    def _save_local_snapshot(self, content, snapshot):
+        if not self.cache_dir:
+            return
+        data_path, meta_path = self._cache_paths()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(data_path + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(data_path + '.tmp', data_path)
+            with open(meta_path + '.tmp', 'w') as f:
+                json.dump({'content_hash': snapshot.content_hash, 'etag': snapshot.etag,
+                           'last_modified': snapshot.last_modified, 'version': snapshot.version}, f)
+            os.replace(meta_path + '.tmp', meta_path)
+        except OSError:
+            pass  # The local snapshot is only an optimisation
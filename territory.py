@@ -0,0 +1,162 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+from clustering import EqualAreaProjection
+
+# Workloads territories can be balanced on:
+# 'outlets' - number of outlets (visits) of each salesman
+# 'km'      - km from every outlet to the centre of its territory, a proxy for the drive of the territory
+WORKLOAD_METRICS = ('outlets', 'km')
+DEFAULT_TOLERANCE = 0.05  # A salesman within 5% of the target counts as balanced
+BOUNDARY_NEIGHBOURS = 8  # Nearest outlets looked at to find the outlets on a territory boundary
+MIN_IMPROVEMENT = 1e-9
+
+
+# Function to get the workload of every territory: outlet count, centre (projected km) and km to the centre
+def territory_workloads(points, codes, n_salesmen):
+    assigned = codes >= 0
+    counts = np.bincount(codes[assigned], minlength=n_salesmen).astype(np.float64)
+    centres = np.column_stack([np.bincount(codes[assigned], weights=points[assigned, axis], minlength=n_salesmen)
+                               for axis in range(2)]) / np.maximum(counts, 1)[:, None]
+    distances = np.zeros(len(codes))
+    distances[assigned] = np.hypot(*(points[assigned] - centres[codes[assigned]]).T)
+    km = np.bincount(codes[assigned], weights=distances[assigned], minlength=n_salesmen)
+    return counts, centres, km, distances
+
+
+# Proposed split of the outlets between salesmen: the new salesman of every outlet, the outlets that move
+# and the workload of every salesman before and after
+class TerritoryPlan:
+    def __init__(self, salesmen, previous_salesmen, stats, iterations, seconds, metric):
+        self.salesmen = salesmen
+        self.previous_salesmen = previous_salesmen
+        self.moved = np.asarray(previous_salesmen != salesmen) & pd.notna(previous_salesmen)
+        self.stats = stats
+        self.iterations = iterations
+        self.seconds = seconds
+        self.metric = metric
+
+    # Function to list the reassigned outlets: row position, optional outlet name, old and new salesman
+    def diff(self, outlets=None):
+        rows = np.flatnonzero(self.moved)
+        diff = pd.DataFrame({'Row': rows, 'From': self.previous_salesmen[rows], 'To': self.salesmen[rows]})
+        if outlets is not None:
+            diff.insert(1, 'Outlet', np.asarray(outlets, dtype=object)[rows])
+        return diff
+
+    # Function to describe the plan in one line for the UI
+    def describe(self):
+        column = 'Outlets' if self.metric == 'outlets' else 'Km'
+        before, after = self.stats[f'{column} Before'], self.stats[f'{column} After']
+        return (f"{int(self.moved.sum())} outlet(s) reassigned in {self.iterations} iteration(s), {self.seconds:.2f} s - "
+                f"largest / smallest {column.lower()}: {before.max():.1f} / {before.min():.1f} before, "
+                f"{after.max():.1f} / {after.min():.1f} after")
+
+
+# Function to propose a better split of the outlets ((n, 2) lat/lon) between their salesmen
+# Iterative boundary swaps: every round, outlets on the boundary between two territories (an outlet with one of its
+# nearest outlets in the other territory) move out of territories above their target, or into territories below it,
+# when it narrows the gap between the two workloads, cheapest moves (least extra distance to the new centre) first,
+# until every salesman is within tolerance of the target or no move helps. Outlets without a salesman are left alone
+# targets is the workload per salesman: None for an even share, a number for every salesman, or {salesman: target}
+def rebalance_territories(coords, salesmen, metric='outlets', targets=None, tolerance=DEFAULT_TOLERANCE, max_iter=100,
+                          neighbours=BOUNDARY_NEIGHBOURS):
+    if metric not in WORKLOAD_METRICS:
+        raise ValueError(f"Unknown workload metric '{metric}', expected one of {WORKLOAD_METRICS}")
+    start = time.perf_counter()
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    previous_salesmen = np.asarray(salesmen, dtype=object)
+    codes, names = pd.factorize(pd.Series(previous_salesmen))
+    codes = codes.astype(np.int64)
+    n_salesmen = len(names)
+
+    points = EqualAreaProjection(float(coords[:, 0].mean()) if len(coords) else 0.0).forward(coords)
+    counts, centres, km, distances = territory_workloads(points, codes, n_salesmen)
+    before = (counts.copy(), km.copy())
+    load = (counts if metric == 'outlets' else km).copy()
+    target = _targets(targets, names, load)
+
+    # Nearest outlets of every outlet, a pair of outlets in different territories marks a boundary
+    iterations = 0
+    if n_salesmen > 1 and len(coords) > 1:
+        k = min(neighbours + 1, len(coords))
+        nearest = KDTree(points).query(points, k=k, return_distance=False)[:, 1:]
+        outlet_of_pair = np.repeat(np.arange(len(coords)), k - 1)
+        neighbour_of_pair = nearest.ravel()
+
+    while n_salesmen > 1 and len(coords) > 1 and iterations < max_iter:
+        over = load > target * (1 + tolerance)
+        under = load < target * (1 - tolerance)
+        if not over.any() and not under.any():
+            break
+        iterations += 1
+
+        # Candidate moves (outlet, receiving territory) across the boundaries of the unbalanced territories
+        donor = codes[outlet_of_pair]
+        receiver = codes[neighbour_of_pair]
+        candidate = (donor >= 0) & (receiver >= 0) & (donor != receiver)
+        candidate[candidate] = over[donor[candidate]] | under[receiver[candidate]]
+        pairs = np.unique(outlet_of_pair[candidate] * n_salesmen + receiver[candidate])
+        outlets, receivers = np.divmod(pairs, n_salesmen)
+        donors = codes[outlets]
+
+        # Moving costs the extra distance to the new centre; with the km workload it also carries the outlet's km
+        new_distances = np.hypot(*(points[outlets] - centres[receivers]).T)
+        cost = new_distances - distances[outlets]
+        removed = np.ones(len(outlets)) if metric == 'outlets' else distances[outlets]
+        added = np.ones(len(outlets)) if metric == 'outlets' else new_distances
+
+        moved = np.zeros(len(coords), dtype=bool)
+        moves = 0
+        for index in np.argsort(cost, kind='stable'):
+            outlet, a, b = outlets[index], donors[index], receivers[index]
+            if moved[outlet] or not (over[a] or under[b]):
+                continue
+            new_a, new_b = load[a] - removed[index], load[b] + added[index]
+            # Narrow the gap: the larger of the two relative workloads must go down
+            if max(new_a / target[a], new_b / target[b]) < max(load[a] / target[a], load[b] / target[b]) - MIN_IMPROVEMENT:
+                load[a], load[b] = new_a, new_b
+                codes[outlet] = b
+                moved[outlet] = True
+                moves += 1
+                # A territory back inside the tolerance band stops giving (or taking) outlets this round
+                for c in (a, b):
+                    over[c] = load[c] > target[c] * (1 + tolerance)
+                    under[c] = load[c] < target[c] * (1 - tolerance)
+        if not moves:
+            break
+
+        counts, centres, km, distances = territory_workloads(points, codes, n_salesmen)
+        load = (counts if metric == 'outlets' else km).copy()
+        # Compact territories drive less, the even km share follows the total
+        target = _targets(targets, names, load)
+
+    new_salesmen = previous_salesmen.copy()
+    assigned = codes >= 0
+    new_salesmen[assigned] = np.asarray(names, dtype=object)[codes[assigned]]
+    stats = pd.DataFrame({
+        'Salesman': list(names),
+        'Target': target,
+        'Outlets Before': before[0].astype(np.int64),
+        'Outlets After': counts.astype(np.int64),
+        'Km Before': before[1],
+        'Km After': km,
+    })
+    stats['Outlets Moved In'] = [int(((new_salesmen == name) & (previous_salesmen != name)).sum()) for name in names]
+    stats['Outlets Moved Out'] = [int(((previous_salesmen == name) & (new_salesmen != name)).sum()) for name in names]
+    return TerritoryPlan(new_salesmen, previous_salesmen, stats, iterations, time.perf_counter() - start, metric)
+
+
+# Function to resolve the target workload of every salesman, missing salesmen get an even share
+def _targets(targets, names, load):
+    even_share = load.sum() / max(len(names), 1)
+    if targets is None:
+        target = np.full(len(names), even_share)
+    elif isinstance(targets, dict):
+        target = np.array([float(targets.get(name, even_share)) for name in names])
+    else:
+        target = np.full(len(names), float(targets))
+    return np.maximum(target, MIN_IMPROVEMENT)
@@ -0,0 +1,74 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import synthetic_outlets
+from day_assignment import BalancedDayPlanner, outlet_constraints, parse_clock, parse_frequency
+from distance_engine import salesman_distance_matrices
+
+OFFICE = (-6.558031, 106.691809)
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+
+def plan(outlets, limit, planner=None, days=DAYS):
+    coords = outlets[['Latitude', 'Longitude']].to_numpy()
+    office_distances, matrix = salesman_distance_matrices(OFFICE, coords, mode='haversine')
+    planner = planner or BalancedDayPlanner()
+    constraints = outlet_constraints(outlets.reset_index(drop=True), days, planner.service_minutes)
+    return planner.plan(office_distances, matrix, coords, OFFICE, days, limit, constraints)
+
+
+@pytest.fixture
+def outlets():
+    return synthetic_outlets(40, 1)
+
+
+def test_weekly_outlets_are_visited_once_within_capacity(outlets):
+    planner = BalancedDayPlanner()
+    day_tours, unassigned, report = plan(outlets, 10, planner)
+    visits = Counter(outlet for _, tour in day_tours for outlet in tour)
+    assert not unassigned
+    assert sorted(visits) == list(range(len(outlets)))
+    assert set(visits.values()) == {1}
+    assert [day for day, _ in day_tours] == [day for day in DAYS if report[day]['visits']]
+    assert all(day['visits'] <= 10 and day['minutes'] <= planner.day_minutes for day in report.values())
+    counts = [day['visits'] for day in report.values()]
+    assert max(counts) - min(counts) <= 2
+
+
+def test_frequencies_set_the_visits_and_the_plan_length(outlets):
+    outlets = outlets.assign(FREQUENCY=np.resize(['weekly', 'twice weekly', 'biweekly'], len(outlets)))
+    day_tours, unassigned, report = plan(outlets, 20)
+    visits = Counter(outlet for _, tour in day_tours for outlet in tour)
+    assert not unassigned
+    assert set(report) == {f"{day} (Week {week})" for week in (1, 2) for day in DAYS}
+    for outlet, frequency in enumerate(outlets['FREQUENCY']):
+        # Over the two-week cycle: weekly twice, twice weekly four times, biweekly once
+        assert visits[outlet] == {'weekly': 2, 'twice weekly': 4, 'biweekly': 1}[frequency]
+
+
+def test_visit_days_are_honoured(outlets):
+    outlets = outlets.assign(**{'VISIT DAYS': ['Tuesday, Thursday' if i % 4 == 0 else '' for i in range(len(outlets))]})
+    day_tours, unassigned, _ = plan(outlets, 10)
+    assert not unassigned
+    for day, tour in day_tours:
+        for outlet in tour:
+            if outlet % 4 == 0:
+                assert day in ('Tuesday', 'Thursday')
+
+
+def test_outlets_beyond_capacity_are_reported(outlets):
+    day_tours, unassigned, _ = plan(outlets, 5, days=DAYS[:2])
+    assert sum(len(tour) for _, tour in day_tours) == 10
+    assert len(unassigned) == len(outlets) - 10
+    assert {reason for _, reason in unassigned} == {'capacity'}
+
+
+def test_parsers():
+    assert parse_clock('09:30') == 570
+    assert parse_clock(0.5) == 720
+    assert np.isnan(parse_clock('late'))
+    assert parse_frequency('Bi-Weekly') == 'biweekly'
+    assert parse_frequency(pd.NA) == 'weekly'
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+
+from benchmark import synthetic_outlets
+from distance_engine import (HAVERSINE_TOLERANCE, distance_matrix, geodesic_matrix, haversine_matrix, haversine_paired,
+                             salesman_distance_matrices)
+
+
+@pytest.fixture
+def coords():
+    return synthetic_outlets(60, 4)[['Latitude', 'Longitude']].to_numpy()
+
+
+def test_geodesic_matrix_matches_geopy(coords):
+    matrix = geodesic_matrix(coords[:10], coords[10:20])
+    expected = np.array([[geodesic(a, b).kilometers for b in coords[10:20]] for a in coords[:10]])
+    np.testing.assert_allclose(matrix, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_haversine_is_within_the_stated_tolerance_of_geodesic(coords):
+    exact = geodesic_matrix(coords, coords)
+    fast = haversine_matrix(coords, coords)
+    off_diagonal = ~np.eye(len(coords), dtype=bool)
+    relative = np.abs(fast - exact)[off_diagonal] / exact[off_diagonal]
+    assert relative.max() <= HAVERSINE_TOLERANCE
+
+
+def test_haversine_paired_is_the_matrix_diagonal(coords):
+    np.testing.assert_allclose(haversine_paired(coords[:-1], coords[1:]), np.diag(haversine_matrix(coords[:-1], coords[1:])))
+
+
+def test_salesman_matrices_split_the_office_row(coords):
+    office = (-6.558031, 106.691809)
+    office_distances, outlet_matrix = salesman_distance_matrices(office, coords, mode='haversine')
+    np.testing.assert_allclose(office_distances, haversine_matrix([office], coords)[0])
+    np.testing.assert_allclose(outlet_matrix, haversine_matrix(coords, coords))
+
+
+def test_unknown_mode_is_rejected(coords):
+    with pytest.raises(ValueError):
+        distance_matrix(coords, mode='manhattan')
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from benchmark import synthetic_outlets
+from day_assignment import BalancedDayPlanner
+from scheduling import (DEFAULT_OFFICE_COORD, SCHEDULE_COLUMNS, changed_salesmen_share, generate_scheduling,
+                        prepare_outlets, update_scheduling)
+
+LIMIT = 10
+
+
+def schedule(outlets, planner=None):
+    return generate_scheduling(outlets, DEFAULT_OFFICE_COORD, LIMIT, distance_mode='haversine', planner=planner)
+
+
+def update(previous, previous_schedule, outlets, planner=None, changed_salesmen=None):
+    return update_scheduling(previous, previous_schedule, outlets, DEFAULT_OFFICE_COORD, LIMIT, distance_mode='haversine',
+                             planner=planner, changed_salesmen=changed_salesmen)
+
+
+def salesman_rows(scheduling_df, salesman):
+    return scheduling_df[scheduling_df['NAMA SALESMAN'] == salesman][SCHEDULE_COLUMNS].reset_index(drop=True)
+
+
+@pytest.fixture
+def outlets():
+    return prepare_outlets(synthetic_outlets(150, 4, days=('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')))
+
+
+@pytest.fixture
+def edited(outlets):
+    # One outlet of the first salesman moves and a new salesman takes three outlets
+    edited = outlets.copy()
+    moved = edited.index[edited['NAMA SALESMAN'] == 'SALESMAN 000'][0]
+    edited.loc[moved, 'Latitude'] += 0.01
+    new = outlets.iloc[:3].assign(**{'NAMA SALESMAN': 'SALESMAN 099', 'NAMA TOKO': ['NEW 1', 'NEW 2', 'NEW 3']})
+    return pd.concat([edited, new], ignore_index=True)
+
+
+def test_unchanged_outlets_keep_the_schedule(outlets):
+    previous = schedule(outlets)
+    updated = update(outlets, previous, outlets)
+    pd.testing.assert_frame_equal(updated[SCHEDULE_COLUMNS].reset_index(drop=True), previous[SCHEDULE_COLUMNS].reset_index(drop=True))
+    assert not updated.attrs['incremental']['updated'] and not updated.attrs['incremental']['rescheduled']
+
+
+def test_update_matches_a_full_schedule_for_untouched_and_new_salesmen(outlets, edited):
+    updated = update(outlets, schedule(outlets), edited)
+    full = schedule(edited)
+    report = updated.attrs['incremental']
+    assert 'SALESMAN 000' in report['updated'] + report['rescheduled']
+    assert 'SALESMAN 099' in report['rescheduled']
+    for salesman in report['unchanged'] + report['rescheduled']:
+        pd.testing.assert_frame_equal(salesman_rows(updated, salesman), salesman_rows(full, salesman))
+
+    # The repaired salesman still visits each of its outlets once, within the daily capacity
+    repaired = salesman_rows(updated, 'SALESMAN 000')
+    assert sorted(repaired['NAMA TOKO']) == sorted(edited.loc[edited['NAMA SALESMAN'] == 'SALESMAN 000', 'NAMA TOKO'])
+    assert repaired.groupby('Day').size().max() <= LIMIT
+
+
+def test_update_with_a_planner_matches_a_full_schedule(outlets, edited):
+    planner = BalancedDayPlanner()
+    updated = update(outlets, schedule(outlets, planner), edited, planner)
+    full = schedule(edited, planner)
+    pd.testing.assert_frame_equal(updated[SCHEDULE_COLUMNS].reset_index(drop=True), full[SCHEDULE_COLUMNS].reset_index(drop=True))
+
+
+def test_known_changed_salesmen_give_the_same_update(outlets, edited):
+    previous = schedule(outlets)
+    changed = {'SALESMAN 000', 'SALESMAN 099'}
+    assert changed_salesmen_share(outlets, edited, changed_salesmen=changed) == changed_salesmen_share(outlets, edited)
+    pd.testing.assert_frame_equal(update(outlets, previous, edited, changed_salesmen=changed), update(outlets, previous, edited))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from road_graph import RoadGraph
+from routing_backends import FallbackRouter, HaversineRouter, LocalRouter, build_routing_client
+
+A, B, C = (-6.20, 106.80), (-6.21, 106.81), (-6.22, 106.82)
+
+
+# Backend answering only the legs that start at one of its known points, and the tables of those points
+class PartialRouter:
+    name = 'partial'
+
+    def __init__(self, known, distance=1.0):
+        self.known = set(known)
+        self.distance = distance
+        self.cache = None
+        self.calls = 0
+
+    def route_many(self, pairs):
+        self.calls += 1
+        return [{'polyline': [origin, destination], 'distance': self.distance} if origin in self.known else None
+                for origin, destination in pairs]
+
+    def route_legs_many(self, waypoint_lists):
+        return [self.route_many(list(zip(waypoints[:-1], waypoints[1:]))) for waypoints in waypoint_lists]
+
+    def table(self, sources, destinations=None):
+        self.calls += 1
+        destinations = sources if destinations is None else destinations
+        return np.array([[self.distance if source in self.known else np.nan for _ in destinations] for source in sources])
+
+    def stats(self):
+        return {'calls': self.calls}
+
+    def close(self):
+        pass
+
+
+def test_missing_legs_come_from_the_next_backend_and_are_tagged():
+    primary = PartialRouter({A})
+    router = FallbackRouter([primary, HaversineRouter()])
+    legs = router.route_legs([A, B, C])
+    assert legs[0]['distance'] == 1.0 and 'fallback' not in legs[0]
+    assert legs[1]['fallback'] and legs[1]['distance'] > 0
+    assert router.stats()['fallbacks'] == 1
+
+
+def test_table_fills_unreachable_pairs():
+    router = FallbackRouter([PartialRouter({A}), PartialRouter({A, B, C}, distance=2.0)])
+    matrix = router.table([A, B])
+    np.testing.assert_array_equal(matrix, [[1.0, 1.0], [2.0, 2.0]])
+
+
+def test_failing_backend_is_skipped_during_the_cooldown():
+    offline = PartialRouter(set())
+    router = FallbackRouter([offline, HaversineRouter()], failure_threshold=2, cooldown_seconds=3600)
+    for _ in range(5):
+        assert router.route(A, B) is not None
+    assert offline.calls == 2
+    assert router.stats()['skipped'] == 3
+
+
+def test_local_router_follows_the_road_graph():
+    # A - B - C road without the A - C shortcut: the route goes through B
+    graph = RoadGraph.from_edges([A, B, C], [0, 1, 1, 2], [1, 0, 2, 1])
+    router = LocalRouter(graph)
+    route = router.route(A, C)
+    assert route['polyline'] == [A, B, C]
+    np.testing.assert_allclose(route['distance'], graph.weights.sum() / 2)
+    assert np.isnan(router.table([A], [(-7.5, 110.0)])[0, 0])
+
+
+def test_build_routing_client():
+    assert isinstance(build_routing_client('haversine'), HaversineRouter)
+    assert isinstance(build_routing_client('local,haversine', graph_path='missing.npz'), HaversineRouter)
+    with pytest.raises(ValueError):
+        build_routing_client('haversine,teleport')
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from benchmark import synthetic_outlets
+from schedule_export import PARQUET_AVAILABLE, PARQUET_COLUMNS, journey_file_name, write_schedule
+from scheduling import DEFAULT_OFFICE_COORD, generate_compact_schedule, prepare_outlets
+
+
+@pytest.fixture(scope='module')
+def schedule():
+    outlets = prepare_outlets(synthetic_outlets(120, 3))
+    return generate_compact_schedule(outlets, DEFAULT_OFFICE_COORD, 8, distance_mode='haversine',
+                                     coordinate_dtype='float64')
+
+
+def expected_frame(schedule):
+    return schedule.to_frame(columns=PARQUET_COLUMNS)
+
+
+@pytest.mark.skipif(not PARQUET_AVAILABLE, reason="Parquet export needs pyarrow")
+def test_parquet_round_trip(schedule, tmp_path):
+    path = write_schedule(schedule, tmp_path / 'plan.parquet', 'parquet', chunk_rows=25)
+    pd.testing.assert_frame_equal(pd.read_parquet(path), expected_frame(schedule), check_dtype=False, check_categorical=False)
+
+
+def test_csv_round_trip(schedule, tmp_path):
+    path = write_schedule(schedule, tmp_path / 'plan.csv', 'csv', chunk_rows=25)
+    frame = pd.read_csv(path)
+    assert list(frame.columns) == list(schedule.to_frame().columns)
+    pd.testing.assert_frame_equal(frame[PARQUET_COLUMNS], expected_frame(schedule), check_dtype=False,
+                                  check_categorical=False)
+
+
+def test_excel_round_trip(schedule, tmp_path):
+    path = write_schedule(schedule, tmp_path / 'plan.xlsx', 'xlsx', chunk_rows=25)
+    frame = pd.read_excel(path)
+    pd.testing.assert_frame_equal(frame[PARQUET_COLUMNS], expected_frame(schedule), check_dtype=False,
+                                  check_categorical=False)
+
+
+def test_unknown_format_is_rejected(schedule, tmp_path):
+    with pytest.raises(ValueError):
+        write_schedule(schedule, tmp_path / 'plan.json', 'json')
+
+
+def test_journey_file_names_do_not_collide():
+    used_names = set()
+    names = [journey_file_name(salesman, used_names) for salesman in ('A/B', 'A?B', 'a_b', 'C')]
+    assert len({name.lower() for name in names}) == len(names)
+    assert names[0] == 'A_B' and names[3] == 'C'
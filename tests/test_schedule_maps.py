@@ -0,0 +1,40 @@
+import os
+
+from benchmark import synthetic_outlets
+from schedule_maps import MapArtifactStore, complete_legs, map_key, pair_key
+from scheduling import DEFAULT_OFFICE_COORD, generate_scheduling, prepare_outlets
+
+
+def test_map_key_depends_on_the_drawn_visits_only():
+    scheduling_df = generate_scheduling(prepare_outlets(synthetic_outlets(30, 1)), DEFAULT_OFFICE_COORD, 10,
+                                        distance_mode='haversine')
+    rows = scheduling_df[scheduling_df['Day'] == scheduling_df['Day'].iloc[0]]
+    assert map_key(rows, *DEFAULT_OFFICE_COORD) == map_key(rows.reset_index(drop=True).copy(), *DEFAULT_OFFICE_COORD)
+    assert map_key(rows, *DEFAULT_OFFICE_COORD) != map_key(rows.iloc[::-1], *DEFAULT_OFFICE_COORD)
+    assert map_key(rows, *DEFAULT_OFFICE_COORD) != map_key(rows, -6.2, 106.8)
+
+
+def test_fallback_or_missing_legs_are_not_kept():
+    leg = {'polyline': [(0, 0), (1, 1)], 'distance': 1.0}
+    assert complete_legs([[leg, leg]])
+    assert not complete_legs([[leg, None]])
+    assert not complete_legs([[leg], [dict(leg, fallback=True)]])
+
+
+def test_store_prunes_by_age_and_size(tmp_path):
+    store = MapArtifactStore(str(tmp_path), ttl_seconds=100, max_bytes=10 ** 9)
+    for key in ('aa01', 'bb02', 'cc03'):
+        store.put(key, f"<div>{key}</div>" * 100)
+    store.record('v1', {pair_key('S', 'Monday'): 'aa01'})
+    assert store.lookup('v1', 'S', 'Monday').startswith('<div>aa01')
+
+    old = os.path.getmtime(store._artifact_path('bb02')) - 1000
+    os.utime(store._artifact_path('bb02'), (old, old))
+    assert store.prune() == 1
+    assert store.get('bb02') is None and store.get('aa01') is not None
+
+    store.max_bytes = os.path.getsize(store._artifact_path('aa01'))
+    os.utime(store._artifact_path('cc03'), (old + 950, old + 950))  # Least recently used
+    assert store.prune() == 1
+    assert store.contains('aa01') and not store.contains('cc03')
+    assert store.stats()['evictions'] == 2
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from benchmark import synthetic_outlets
+from territory import DEFAULT_TOLERANCE, rebalance_territories
+
+
+@pytest.fixture
+def outlets():
+    return synthetic_outlets(300, 4)
+
+
+def test_stats_report_the_workload_before_rebalancing(outlets):
+    plan = rebalance_territories(outlets[['Latitude', 'Longitude']].to_numpy(), outlets['NAMA SALESMAN'])
+    counts = outlets['NAMA SALESMAN'].value_counts()
+    before = plan.stats.set_index('Salesman')['Outlets Before']
+    assert (before == counts.reindex(before.index)).all()
+    after = plan.stats.set_index('Salesman')['Outlets After']
+    assert after.sum() == len(outlets)
+    assert f"{counts.max():.1f} / {counts.min():.1f} before" in plan.describe()
+
+
+def test_donor_stops_inside_the_tolerance_band(outlets):
+    plan = rebalance_territories(outlets[['Latitude', 'Longitude']].to_numpy(), outlets['NAMA SALESMAN'])
+    stats = plan.stats.set_index('Salesman')
+    # The overloaded salesman gives outlets until it is inside the band, not until it is level with a neighbour
+    donor = stats['Outlets Before'].idxmax()
+    band_top = stats.loc[donor, 'Target'] * (1 + DEFAULT_TOLERANCE)
+    assert band_top - 1 < stats.loc[donor, 'Outlets After'] <= band_top
+    assert (stats['Outlets Moved In'] - stats['Outlets Moved Out'] == stats['Outlets After'] - stats['Outlets Before']).all()
+
+
+def test_balanced_territories_are_left_alone():
+    coords = np.array([[-6.2, 106.8], [-6.21, 106.81], [-6.5, 107.0], [-6.51, 107.01]])
+    plan = rebalance_territories(coords, ['A', 'A', 'B', 'B'])
+    assert not plan.moved.any()
+    assert plan.iterations == 0
+    assert plan.diff().empty
+
+
+def test_unknown_metric_is_rejected():
+    with pytest.raises(ValueError):
+        rebalance_territories([[-6.2, 106.8]], ['A'], metric='hours')